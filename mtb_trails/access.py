@@ -0,0 +1,101 @@
+"""
+Precomputed trail access points.
+
+TrailAccessPoint holds, for each end of each trail, the nearest POI of each
+``ACCESS_TYPES`` type within ``MAX_DISTANCE_M`` and how far away it is.
+``refresh`` recomputes them with one spatial join: every trail end is
+matched to its nearest POI of each type by a KNN (``<->``) scan of the
+POI geography index inside a LATERAL subquery, so trail detail responses
+read a handful of rows instead of searching.
+
+The rows only change when a trail's path or a POI's type or location
+does. The signal handlers in signals.py recompute a saved trail, and for a
+saved POI only the trails it could now be nearest to or was nearest to
+(``refresh_for_pois``); ``bulk_write_finished`` does the same after imports
+and ``manage.py refresh_access_points`` rebuilds everything.
+"""
+from django.db import connection, transaction
+
+from .models import Trail, POI, TrailAccessPoint
+
+ACCESS_TYPES = ['parking', 'trailhead', 'toilets']
+MAX_DISTANCE_M = 20_000
+
+ACCESS_TABLE = TrailAccessPoint._meta.db_table
+
+# Both ends of each trail ``t``, as geography
+TRAIL_ENDS = """
+    CROSS JOIN LATERAL (VALUES
+        ('start', ST_StartPoint(t.path)::geography),
+        ('end', ST_EndPoint(t.path)::geography)
+    ) e (endpoint, point)
+"""
+
+REFRESH_SQL = f"""
+    INSERT INTO {ACCESS_TABLE} (trail_id, endpoint, type, poi_id, distance_m)
+    SELECT t.id, e.endpoint, k.type, n.id, n.distance_m
+    FROM {Trail._meta.db_table} t
+    {TRAIL_ENDS}
+    CROSS JOIN unnest(%s::text[]) k (type)
+    CROSS JOIN LATERAL (
+        SELECT p.id, ST_Distance(p.location_geography, e.point) AS distance_m
+        FROM {POI._meta.db_table} p
+        WHERE p.type = k.type AND ST_DWithin(p.location_geography, e.point, %s)
+        ORDER BY p.location_geography <-> e.point
+        LIMIT 1
+    ) n
+    WHERE {{condition}}
+"""
+
+# Trails whose access points the POIs ``ids`` may change: those they are
+# nearest to now, and those with an end closer to them than its current
+# nearest POI of that type (or with none within MAX_DISTANCE_M)
+AFFECTED_SQL = f"""
+    SELECT trail_id FROM {ACCESS_TABLE} WHERE poi_id = ANY(%s)
+    UNION
+    SELECT t.id
+    FROM {POI._meta.db_table} p
+    JOIN {Trail._meta.db_table} t
+        ON ST_DWithin(t.path_geography, p.location_geography, %s)
+    {TRAIL_ENDS}
+    LEFT JOIN {ACCESS_TABLE} a
+        ON a.trail_id = t.id AND a.endpoint = e.endpoint AND a.type = p.type
+    WHERE p.id = ANY(%s) AND p.type = ANY(%s)
+      AND ST_DWithin(e.point, p.location_geography, COALESCE(a.distance_m, %s))
+"""
+
+
+def _where(column, ids):
+    """SQL condition and params restricting ``column`` to ``ids`` (None = all rows)"""
+    if ids is None:
+        return 'TRUE', []
+    return f'{column} = ANY(%s)', [ids]
+
+
+def refresh(trail_ids=None):
+    """Recompute the access points of ``trail_ids`` (None = every trail)"""
+    if trail_ids is not None:
+        trail_ids = sorted(set(trail_ids))
+        if not trail_ids:
+            return
+    with transaction.atomic(), connection.cursor() as cursor:
+        condition, params = _where('trail_id', trail_ids)
+        cursor.execute(f"DELETE FROM {ACCESS_TABLE} WHERE {condition}", params)
+        condition, params = _where('t.id', trail_ids)
+        cursor.execute(
+            REFRESH_SQL.format(condition=condition),
+            [ACCESS_TYPES, MAX_DISTANCE_M] + params,
+        )
+
+
+def refresh_for_pois(poi_ids):
+    """Recompute the access points of the trails affected by new or changed POIs"""
+    poi_ids = sorted(set(poi_ids))
+    if not poi_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(AFFECTED_SQL, [
+            poi_ids, MAX_DISTANCE_M, poi_ids, ACCESS_TYPES, MAX_DISTANCE_M,
+        ])
+        trail_ids = [trail_id for trail_id, in cursor.fetchall()]
+    refresh(trail_ids)
@@ -0,0 +1,160 @@
+"""
+Async versions of the read-heavy spatial endpoints, under ``/api/async/``.
+
+Served by an ASGI server (``uvicorn webmapping_ca_project.asgi:application``,
+see the README), a request waiting on PostGIS suspends a coroutine instead
+of holding a worker thread, so one process keeps many slow map requests in
+flight. The queries, response bodies, ETags and cache entries match the
+sync views in views.py; only the I/O is different: the async ORM (``async
+for``, ``aaggregate``, ``aiterator``), async cache calls and async
+streaming responses. Rows are fetched with everything the serializers read
+(``with_park()``, ``select_related('stats')``), so serializing them runs
+no queries. Raw-SQL helpers without an async API run in ``sync_to_async``.
+
+DRF's ``@api_view`` is sync-only, so these are plain Django views
+rendering with DRF's JSONRenderer. Under WSGI they still work, wrapped in
+``async_to_sync`` by Django.
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.renderers import JSONRenderer
+
+from .models import Trail, POI, Park
+from .serializers import TrailSerializer, TrailDistanceSerializer, POISerializer, ParkSerializer
+from . import clustering, timing
+from .cache import cached_response
+from .conditional import versioned
+from .geojson import (
+    TRAIL_LAYOUT, POI_LAYOUT, PARK_LAYOUT,
+    afeature_collection, astream_feature_collection, wants_stream, geometry_level,
+    coordinate_precision,
+)
+from .views import (
+    nearest_trails_query, trails_within_radius_query, trails_in_park_query,
+    radius_feature_collection,
+)
+
+
+def _json(data, status=200):
+    with timing.measure('render'):
+        content = JSONRenderer().render(data)
+    return HttpResponse(content, status=status, content_type='application/json')
+
+
+async def _list(queryset):
+    return [row async for row in queryset]
+
+
+@versioned(Park)
+@cached_response(Park)
+@require_GET
+async def parks_geojson(request):
+    """Async views.parks_geojson"""
+    parks = Park.objects.all()
+    level = geometry_level(request)
+    precision = coordinate_precision(request)
+    if wants_stream(request):
+        return astream_feature_collection(parks, PARK_LAYOUT, level, precision=precision)
+    return _json(await afeature_collection(parks, PARK_LAYOUT, level, precision))
+
+
+@versioned(Trail, Park)
+@cached_response(Trail, Park)
+@require_GET
+async def trails_geojson(request):
+    """Async views.trails_geojson"""
+    trails = Trail.objects.all()
+    level = geometry_level(request)
+    precision = coordinate_precision(request)
+    if wants_stream(request):
+        return astream_feature_collection(trails, TRAIL_LAYOUT, level, precision=precision)
+    if precision is not None:
+        return _json(await afeature_collection(trails, TRAIL_LAYOUT, level, precision))
+    rows = await _list(trails.with_park().at_level(level))
+    return _json(TrailSerializer(rows, many=True, context={'geometry_level': level}).data)
+
+
+@versioned(POI, Park)
+@cached_response(POI, Park)
+@require_GET
+async def pois_geojson(request):
+    """Async views.pois_geojson, including ?zoom=&bbox= clustering"""
+    if 'zoom' in request.GET:
+        try:
+            zoom = clustering.parse_zoom(request.GET['zoom'])
+            bbox = clustering.parse_bbox(request.GET.get('bbox'))
+        except ValueError as exc:
+            return _json({'error': str(exc)}, status=400)
+        return _json(await sync_to_async(clustering.pois_in_view)(zoom, bbox))
+    pois = POI.objects.all()
+    precision = coordinate_precision(request)
+    if wants_stream(request):
+        return astream_feature_collection(pois, POI_LAYOUT, precision=precision)
+    if precision is not None:
+        return _json(await afeature_collection(pois, POI_LAYOUT, precision=precision))
+    return _json(POISerializer(await _list(pois.with_park()), many=True).data)
+
+
+@require_GET
+async def nearest_trails(request):
+    """Async views.nearest_trails"""
+    try:
+        trails = nearest_trails_query(request)
+    except ValueError as exc:
+        return _json({'error': str(exc)}, status=400)
+    return _json(TrailDistanceSerializer(await _list(trails), many=True).data)
+
+
+@require_GET
+async def trails_within_radius(request):
+    """Async views.trails_within_radius"""
+    try:
+        trails, lat, lng, radius_km = trails_within_radius_query(request)
+    except ValueError as exc:
+        return _json({'error': str(exc)}, status=400)
+    return _json(radius_feature_collection(await _list(trails), lat, lng, radius_km))
+
+
+@require_GET
+async def trails_in_park(request):
+    """Async views.trails_in_park"""
+    try:
+        trails = trails_in_park_query(request)
+    except ValueError as exc:
+        return _json({'error': str(exc)}, status=400)
+    return _json(TrailSerializer(await _list(trails), many=True).data)
+
+
+@versioned(Park, Trail, POI)
+@cached_response(Park, Trail, POI)
+@require_GET
+async def park_trails(request, park_id):
+    """Async views.park_trails"""
+    level = geometry_level(request)
+    context = {'geometry_level': level}
+    park = await Park.objects.select_related('stats').at_level(level).filter(id=park_id).afirst()
+    if park is None:
+        return _json({'error': 'Park not found'}, status=404)
+    trails = await _list(Trail.objects.filter(park=park).with_park().at_level(level))
+    return _json({
+        'park': ParkSerializer(park, context=context).data,
+        'trails': TrailSerializer(trails, many=True, context=context).data,
+        'count': len(trails),
+    })
+
+
+@versioned(Park, Trail, POI)
+@cached_response(Park, Trail, POI)
+@require_GET
+async def park_pois(request, park_id):
+    """Async views.park_pois"""
+    park = await Park.objects.select_related('stats').filter(id=park_id).afirst()
+    if park is None:
+        return _json({'error': 'Park not found'}, status=404)
+    pois = await _list(POI.objects.filter(park=park).with_park())
+    return _json({
+        'park': ParkSerializer(park).data,
+        'pois': POISerializer(pois, many=True).data,
+        'count': len(pois),
+    })
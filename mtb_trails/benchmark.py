@@ -0,0 +1,232 @@
+"""
+Per-endpoint benchmarks (``manage.py benchmark``).
+
+Every URL in urls.py is requested with representative parameters, taken
+from the rows in the database (see Sample), through Django's test client,
+so the numbers are the view, ORM, PostGIS and serialization time without
+the network or server in front. Each endpoint is requested ``repeat`` times
+after ``warmup`` unmeasured requests; cached responses are invalidated before
+every request unless ``warm`` is set, so by default these are cold
+(uncached) responses. Run it against a generate_synthetic database for
+numbers that show how endpoints scale.
+
+A run is saved as a JSON baseline: per endpoint the p50/p95/p99/max
+latency in milliseconds, the number of SQL queries, the response size and
+status. compare() checks a run against an earlier baseline.
+"""
+import json
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import cache
+from .models import Trail, POI, Park
+
+DEFAULT_REPEAT = 20
+DEFAULT_WARMUP = 2
+# p95 growth (a share of the baseline) that counts as a regression...
+DEFAULT_TOLERANCE = 0.2
+# ... unless it is below this many milliseconds, which is noise
+MIN_REGRESSION_MS = 2
+TILE_ZOOM = 12
+
+
+@dataclass
+class Sample:
+    """Rows and places the endpoint parameters are taken from"""
+    park: Park
+    trail: Trail
+    poi: POI
+    lng: float
+    lat: float
+    end_lng: float
+    end_lat: float
+
+    @classmethod
+    def from_database(cls):
+        """The first trail in a park, its park, start and end, and the first POI"""
+        trail = Trail.objects.filter(park__isnull=False).select_related('park').order_by('pk').first()
+        if trail is None:
+            trail = Trail.objects.select_related('park').order_by('pk').first()
+        poi = POI.objects.order_by('pk').first()
+        if trail is None or poi is None:
+            raise ValueError('The benchmarks need at least one trail and one POI')
+        park = trail.park or Park.objects.order_by('pk').first()
+        (lng, lat), (end_lng, end_lat) = trail.path[0], trail.path[-1]
+        return cls(park, trail, poi, lng, lat, end_lng, end_lat)
+
+    def bbox(self, size=0.3):
+        return f'{self.lng - size:.4f},{self.lat - size:.4f},{self.lng + size:.4f},{self.lat + size:.4f}'
+
+    def polygon(self, size=0.3):
+        x0, y0, x1, y1 = self.lng - size, self.lat - size, self.lng + size, self.lat + size
+        return f'POLYGON(({x0:.4f} {y0:.4f}, {x1:.4f} {y0:.4f}, {x1:.4f} {y1:.4f}, {x0:.4f} {y1:.4f}, {x0:.4f} {y0:.4f}))'
+
+    def point(self):
+        return {'lat': f'{self.lat:.5f}', 'lng': f'{self.lng:.5f}'}
+
+    def tile(self, z=TILE_ZOOM):
+        """The web mercator tile (z, x, y) of the trail start"""
+        n = 2 ** z
+        x = int((self.lng + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(self.lat))) / math.pi) / 2 * n)
+        return {'z': z, 'x': x, 'y': y}
+
+
+# (url name, reverse kwargs, query params); callables receive the Sample
+ENDPOINTS = [
+    ('park-list', {}, {}),
+    ('park-list', {}, {'format': 'fgb'}),
+    ('park-detail', lambda s: {'pk': s.park.pk}, {}),
+    ('parks-geojson', {}, {}),
+    ('parks-geojson', {}, {'zoom': '7'}),
+    ('parks-geojson', {}, {'format': 'topojson', 'zoom': '10'}),
+    ('park-trails', lambda s: {'park_id': s.park.pk}, {}),
+    ('park-pois', lambda s: {'park_id': s.park.pk}, {}),
+    ('park-stats', {}, {}),
+    ('parks-containing', {}, lambda s: s.point()),
+    ('trail-list', {}, {}),
+    ('trail-list', {}, lambda s: {'in_bbox': s.bbox()}),
+    ('trail-list', {}, {'format': 'fgb'}),
+    ('trail-detail', lambda s: {'pk': s.trail.pk}, {}),
+    ('trail-profile', lambda s: {'pk': s.trail.pk}, {}),
+    ('trails-geojson', {}, {}),
+    ('trails-geojson', {}, {'zoom': '7'}),
+    ('trails-geojson', {}, {'stream': '1'}),
+    ('trails-geojson', {}, {'format': 'fgb'}),
+    ('trails-geojson', {}, {'format': 'topojson', 'zoom': '7'}),
+    ('search-trails', {}, lambda s: {'q': s.trail.name.split()[0]}),
+    ('autocomplete-trails', {}, lambda s: {'q': s.trail.name[:3]}),
+    ('nearest-trails', {}, lambda s: {**s.point(), 'radius': '20'}),
+    ('trails-within-radius', {}, lambda s: {**s.point(), 'radius_km': '10'}),
+    ('trails-in-park', {}, lambda s: {'polygon': s.polygon()}),
+    ('trails-in-park', {}, lambda s: {'park': str(s.park.pk)}),
+    ('routes', {}, lambda s: {'from': f'{s.lat},{s.lng}', 'to': f'{s.end_lat},{s.end_lng}'}),
+    ('loop-route', {}, lambda s: {'from': f'{s.lat},{s.lng}', 'distance_km': '10'}),
+    ('poi-list', {}, {}),
+    ('poi-list', {}, lambda s: {'dist': '5000', 'point': f'{s.lng},{s.lat}'}),
+    ('poi-detail', lambda s: {'pk': s.poi.pk}, {}),
+    ('pois-geojson', {}, {}),
+    ('pois-geojson', {}, {'format': 'geobuf'}),
+    ('pois-geojson', {}, lambda s: {'zoom': '8', 'bbox': s.bbox(1.0)}),
+    ('pois-geojson', {}, lambda s: {'zoom': '14', 'bbox': s.bbox(0.05)}),
+    ('async-parks-geojson', {}, {}),
+    ('async-park-trails', lambda s: {'park_id': s.park.pk}, {}),
+    ('async-park-pois', lambda s: {'park_id': s.park.pk}, {}),
+    ('async-trails-geojson', {}, {}),
+    ('async-nearest-trails', {}, lambda s: {**s.point(), 'radius': '20'}),
+    ('async-trails-within-radius', {}, lambda s: {**s.point(), 'radius_km': '10'}),
+    ('async-trails-in-park', {}, lambda s: {'polygon': s.polygon()}),
+    ('async-pois-geojson', {}, {}),
+    ('vector-tile', lambda s: {'layer': 'trails', **s.tile()}, {}),
+    ('vector-tile', lambda s: {'layer': 'pois', **s.tile()}, {}),
+    ('trail-map', {}, {}),
+    ('trails-list', {}, {}),
+    ('home', {}, {}),
+]
+# Writes; not benchmarked, since they would change the data being measured
+SKIPPED = {'trails-bulk', 'pois-bulk'}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of ``values``"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _get(client, url, params):
+    with CaptureQueriesContext(connection) as ctx:
+        started = time.perf_counter()
+        response = client.get(url, params)
+        if getattr(response, 'streaming', False):
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        elapsed = time.perf_counter() - started
+    return response.status_code, elapsed * 1000, len(ctx.captured_queries), size
+
+
+def run(repeat=DEFAULT_REPEAT, warmup=DEFAULT_WARMUP, warm=False, only=None):
+    """
+    Benchmark every endpoint (or the url names in ``only``) and return the
+    baseline document
+    """
+    sample = Sample.from_database()
+    client = Client()
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for name, kwargs, params in ENDPOINTS:
+            if only and name not in only:
+                continue
+            kwargs = kwargs(sample) if callable(kwargs) else kwargs
+            params = params(sample) if callable(params) else params
+            url = reverse(f'mtb_trails:{name}', kwargs=kwargs)
+            timings = []
+            for i in range(warmup + repeat):
+                if not warm:
+                    cache.invalidate(Trail, POI, Park)
+                status, ms, queries, size = _get(client, url, params)
+                if i >= warmup:
+                    timings.append(ms)
+            key = f'{name}?{urlencode(params)}' if params else name
+            results[key] = {
+                'url': f'{url}?{urlencode(params)}' if params else url,
+                'status': status,
+                'queries': queries,
+                'bytes': size,
+                'p50_ms': round(percentile(timings, 50), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'p99_ms': round(percentile(timings, 99), 2),
+                'max_ms': round(max(timings), 2),
+            }
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'repeat': repeat,
+        'warm': warm,
+        'rows': {
+            'parks': Park.objects.count(),
+            'trails': Trail.objects.count(),
+            'pois': POI.objects.count(),
+        },
+        'endpoints': results,
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE, min_ms=MIN_REGRESSION_MS):
+    """
+    Regressions of ``current`` against ``baseline`` (both run() documents),
+    as messages: a p95 more than ``tolerance`` (and ``min_ms``) slower, more
+    queries, or a different status
+    """
+    regressions = []
+    for key, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(key)
+        if before is None:
+            continue
+        if now['status'] != before['status']:
+            regressions.append(f"{key}: status {before['status']} -> {now['status']}")
+        if now['queries'] > before['queries']:
+            regressions.append(f"{key}: {before['queries']} -> {now['queries']} queries")
+        slower = now['p95_ms'] - before['p95_ms']
+        if slower > min_ms and slower > before['p95_ms'] * tolerance:
+            regressions.append(f"{key}: p95 {before['p95_ms']:.1f}ms -> {now['p95_ms']:.1f}ms")
+    return regressions
+
+
+def save(document, path):
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+        f.write('\n')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,187 @@
+"""
+Bulk writes (``/api/trails/bulk/`` and ``/api/pois/bulk/``).
+
+A request carries up to ``MAX_ITEMS`` GeoJSON features, each a full
+representation of a trail or POI. All of them are validated first (the
+parks they refer to are fetched in one query for the whole batch), then
+the valid ones are written in one transaction: existing rows are matched
+on the feature ``id`` or on ``(source, source_id)`` in one query, changed
+with one ``bulk_update`` and the rest inserted with one ``bulk_create``.
+Invalid items are skipped and reported; the result says what happened to
+each item, in request order.
+
+Bulk writes send no model signals, so ``bulk_write_finished`` runs the
+derived-data hooks (search, membership, stats, access points, caches,
+snapshots) once for the whole batch.
+"""
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import stats
+from .models import Trail, POI, Park
+from .serializers import TrailBulkSerializer, POIBulkSerializer
+from .signals import bulk_write_finished
+
+MAX_ITEMS = 1000
+
+SERIALIZERS = {
+    Trail: TrailBulkSerializer,
+    POI: POIBulkSerializer,
+}
+
+
+class BulkError(ValueError):
+    """The request body as a whole can't be used"""
+
+
+@dataclass
+class Item:
+    index: int
+    values: dict
+    id: int = None
+    key: tuple = None
+    result: dict = field(default_factory=dict)
+
+
+def features_from(data):
+    """The features of a request body: a FeatureCollection or a bare array"""
+    if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
+        data = data.get('features')
+    if not isinstance(data, list):
+        raise BulkError('Expected a FeatureCollection or an array of GeoJSON features')
+    if len(data) > MAX_ITEMS:
+        raise BulkError(f'At most {MAX_ITEMS} features per request')
+    return data
+
+
+def _referenced_parks(features):
+    park_ids = set()
+    for feature in features:
+        properties = feature.get('properties') if isinstance(feature, dict) else None
+        park_id = properties.get('park') if isinstance(properties, dict) else None
+        if isinstance(park_id, int) and not isinstance(park_id, bool):
+            park_ids.add(park_id)
+        elif isinstance(park_id, str) and park_id.isdigit():
+            park_ids.add(int(park_id))
+    return Park.objects.only('id').in_bulk(park_ids) if park_ids else {}
+
+
+def _validate(model, features):
+    """(valid Items, result dicts of the invalid ones)"""
+    serializer_class = SERIALIZERS[model]
+    geometry_field = serializer_class.Meta.geo_field
+    geom_type = model._meta.get_field(geometry_field).geom_type
+    context = {'parks': _referenced_parks(features)}
+    valid, invalid = [], []
+    for index, feature in enumerate(features):
+        if not isinstance(feature, dict) or not isinstance(feature.get('properties'), dict):
+            invalid.append({'index': index, 'status': 'invalid', 'errors': ['Not a GeoJSON feature']})
+            continue
+        feature_id = feature.get('id')
+        if feature_id is not None and (isinstance(feature_id, bool) or not isinstance(feature_id, int)):
+            invalid.append({'index': index, 'status': 'invalid', 'errors': {'id': ['Must be an integer']}})
+            continue
+        serializer = serializer_class(data=feature, context=context)
+        if not serializer.is_valid():
+            invalid.append({'index': index, 'status': 'invalid', 'errors': serializer.errors})
+            continue
+        values = dict(serializer.validated_data)
+        if values[geometry_field].geom_type.upper() != geom_type:
+            invalid.append({'index': index, 'status': 'invalid', 'errors': {
+                geometry_field: [f'Expected a {geom_type.title()} geometry'],
+            }})
+            continue
+        source_id = values.get('source_id')
+        key = (values.get('source', 'manual'), source_id) if source_id else None
+        valid.append(Item(index, values, feature_id, key))
+    return valid, invalid
+
+
+def _match(model, items):
+    """
+    Resolve which row each item writes; returns (creates, updates, failed
+    result dicts, ids of the parks the updated rows were in)
+    """
+    ids = [item.id for item in items if item.id is not None]
+    source_ids = [item.key[1] for item in items if item.id is None and item.key]
+    existing = []
+    if ids or source_ids:
+        existing = model.objects.filter(
+            Q(pk__in=ids) | (Q(source_id__in=source_ids) & ~Q(source_id=''))
+        ).values_list('pk', 'source', 'source_id', 'park_id')
+    by_id = {pk: park_id for pk, _, _, park_id in existing}
+    by_key = {(source, source_id): pk for pk, source, source_id, _ in existing if source_id}
+
+    creates, updates, failed = [], [], []
+    targets = {}
+    for item in items:
+        if item.id is not None:
+            if item.id not in by_id:
+                failed.append({'index': item.index, 'status': 'invalid',
+                               'errors': {'id': [f'{model.__name__} {item.id} does not exist']}})
+                continue
+            target = item.id
+        elif item.key in by_key:
+            target = by_key[item.key]
+        else:
+            target = item.key
+        if target is not None and target in targets:
+            failed.append({'index': item.index, 'status': 'invalid',
+                           'errors': [f'Same {model.__name__} as item {targets[target]}']})
+            continue
+        if target is not None:
+            targets[target] = item.index
+        if isinstance(target, int):
+            item.id = target
+            updates.append(item)
+        else:
+            creates.append(item)
+    previous_parks = {by_id[item.id] for item in updates}
+    return creates, updates, failed, previous_parks
+
+
+def _update_fields(model):
+    """The columns a full representation sets: every writable serializer field"""
+    serializer = SERIALIZERS[model]()
+    return ['updated_at'] + [f.source for f in serializer.fields.values() if not f.read_only]
+
+
+def write(model, data):
+    """Validate and write the features in ``data``; returns the per-item results"""
+    features = features_from(data)
+    items, results = _validate(model, features)
+    creates, updates, failed, previous_parks = _match(model, items)
+    results += failed
+    if not creates and not updates:
+        return sorted(results, key=lambda result: result['index'])
+
+    try:
+        with transaction.atomic():
+            created = model.objects.bulk_create([model(**item.values) for item in creates])
+            for item, row in zip(creates, created):
+                item.result = {'index': item.index, 'status': 'created', 'id': row.pk}
+            if updates:
+                now = timezone.now()
+                model.objects.bulk_update(
+                    [model(pk=item.id, updated_at=now, **item.values) for item in updates],
+                    _update_fields(model),
+                )
+                for item in updates:
+                    item.result = {'index': item.index, 'status': 'updated', 'id': item.id}
+            # In the same transaction, so the derived rows commit (or roll
+            # back) with the write. By id: bulk_create/bulk_update stamp
+            # updated_at with the app clock, which need not agree with the
+            # database's
+            written = [row.pk for row in created] + [item.id for item in updates]
+            bulk_write_finished(model, changed_ids={model: written})
+            # Rows moved to another park also change the stats of the park they left
+            stats.refresh(previous_parks)
+    except IntegrityError:
+        # e.g. an update moving a row onto another row's (source, source_id)
+        raise BulkError('The features conflict with existing rows; nothing was written')
+
+    results += [item.result for item in creates + updates]
+    return sorted(results, key=lambda result: result['index'])
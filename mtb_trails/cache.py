@@ -0,0 +1,154 @@
+"""
+Server-side cache for rendered read responses.
+
+Cache keys combine the request (full path and Accept header) with a
+generation token for every model the response is built from. Saving or
+deleting a Park, Trail or POI replaces that model's token once the
+transaction commits (see signals.py), which orphans every cached response
+that depended on it in one step. No
+key scanning or pattern deletes are needed, so this works the same on the
+local-memory and file-based backends; orphaned entries simply time out.
+
+With the local-memory backend each process has its own cache, so a write
+only invalidates the process that handled it. Set ``CACHE_DIR`` (see
+settings.py) to share one file-based cache when running several workers.
+"""
+import hashlib
+import uuid
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from . import timing
+
+KEY_PREFIX = 'mtb_trails'
+
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _generation_key(model):
+    return f'{KEY_PREFIX}:generation:{model._meta.label_lower}'
+
+
+def generations(*models):
+    """Current generation token of each model, creating missing ones"""
+    cache = response_cache()
+    keys = [_generation_key(model) for model in models]
+    tokens = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in tokens}
+    if missing:
+        cache.set_many(missing, None)
+        tokens.update(missing)
+    return [tokens[key] for key in keys]
+
+
+async def agenerations(*models):
+    """generations() for async views"""
+    cache = response_cache()
+    keys = [_generation_key(model) for model in models]
+    tokens = await cache.aget_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in tokens}
+    if missing:
+        await cache.aset_many(missing, None)
+        tokens.update(missing)
+    return [tokens[key] for key in keys]
+
+
+def invalidate(*models):
+    """Orphan every cached response built from any of ``models``"""
+    response_cache().set_many(
+        {_generation_key(model): uuid.uuid4().hex for model in models}, None
+    )
+
+
+def _response_key(request, tokens):
+    parts = tokens + [request.get_full_path(), request.headers.get('Accept', '')]
+    digest = hashlib.md5('|'.join(parts).encode()).hexdigest()
+    # v2: entries hold (body, headers) rather than (body, content type)
+    return f'{KEY_PREFIX}:response:v2:{digest}'
+
+
+def response_key(request, models):
+    return _response_key(request, generations(*models))
+
+
+async def aresponse_key(request, models):
+    return _response_key(request, await agenerations(*models))
+
+
+def _cache_timeout():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 3600)
+
+
+def _entry(response):
+    """(body, headers) to cache for a rendered response"""
+    # The key depends on Accept, so shared caches must vary on it too
+    patch_vary_headers(response, ['Accept'])
+    return response.content, list(response.items())
+
+
+def _from_entry(entry):
+    """
+    Rebuild a cached response with the headers the view set (Content-Type,
+    Vary, Link, ...); ETag and other headers of outer layers are added again
+    """
+    content, headers = entry
+    return HttpResponse(content, headers=dict(headers))
+
+
+def cached_response(*models):
+    """
+    Cache the rendered 200 responses of a read view (sync or async).
+
+    ``models`` are the models whose rows appear in the response; a write to
+    any of them invalidates the entry. The body is stored with the view's
+    headers, so a hit answers like a miss. Streaming responses are passed
+    through untouched.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                cache = response_cache()
+                key = await aresponse_key(request, models)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return _from_entry(cached)
+
+                response = await view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    await cache.aset(key, _entry(response), _cache_timeout())
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            cache = response_cache()
+            key = response_key(request, models)
+            cached = cache.get(key)
+            if cached is not None:
+                return _from_entry(cached)
+
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                # DRF responses are rendered lazily; render now to store bytes
+                if callable(getattr(response, 'render', None)):
+                    with timing.measure('render'):
+                        response.render()
+                cache.set(key, _entry(response), _cache_timeout())
+            return response
+        return wrapper
+    return decorator
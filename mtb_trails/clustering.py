@@ -0,0 +1,96 @@
+"""
+Server-side POI clustering for the map (``/api/pois/geojson/?zoom=&bbox=``).
+
+Below ``INDIVIDUAL_ZOOM`` POIs are grouped in PostGIS by snapping their Web
+Mercator position to a grid of ``CELL_PX`` screen pixels at the requested
+zoom (``ST_SnapToGrid``). Each occupied cell comes back as one point at the
+mean position of its POIs, with the total and a count per type, so the
+response grows with the size of the viewport rather than with the number
+of POIs. The grid is anchored at the Mercator origin, so panning does not
+reshuffle the clusters. From ``INDIVIDUAL_ZOOM`` up the POIs in the bbox
+are returned one by one.
+"""
+from django.contrib.gis.geos import Polygon
+from django.db import connection
+
+from .geojson import POI_LAYOUT, feature_collection
+from .models import POI
+
+INDIVIDUAL_ZOOM = 15
+MAX_ZOOM = 22
+CELL_PX = 60
+TILE_PX = 256
+# Web Mercator world width in meters
+WORLD_M = 40_075_016.686
+
+CLUSTER_SQL = f"""
+    SELECT sum(n)::int, sum(sx) / sum(n), sum(sy) / sum(n),
+           jsonb_object_agg(type, n), min(id), min(name)
+    FROM (
+        SELECT ST_SnapToGrid(ST_Transform(location, 3857), %s) AS cell, type,
+               count(*) AS n, sum(ST_X(location)) AS sx, sum(ST_Y(location)) AS sy,
+               min(id) AS id, min(name) AS name
+        FROM {POI._meta.db_table}
+        WHERE {{condition}}
+        GROUP BY cell, type
+    ) c
+    GROUP BY cell
+    ORDER BY 1 DESC, 5
+"""
+
+
+def parse_zoom(value):
+    zoom = float(value)
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f'zoom must be between 0 and {MAX_ZOOM}')
+    return zoom
+
+
+def parse_bbox(value):
+    """``minx,miny,maxx,maxy`` (degrees) -> tuple, None when not given"""
+    if not value:
+        return None
+    try:
+        bbox = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        raise ValueError('bbox must be minx,miny,maxx,maxy')
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError('bbox must be minx,miny,maxx,maxy')
+    return bbox
+
+
+def cell_size(zoom):
+    """Grid cell size in Web Mercator meters: CELL_PX screen pixels at ``zoom``"""
+    return WORLD_M / (TILE_PX * 2 ** zoom) * CELL_PX
+
+
+def cluster_pois(zoom, bbox=None):
+    """FeatureCollection of one point per occupied grid cell"""
+    condition, params = 'TRUE', []
+    if bbox:
+        condition, params = 'location && ST_MakeEnvelope(%s, %s, %s, %s, 4326)', list(bbox)
+    with connection.cursor() as cursor:
+        cursor.execute(CLUSTER_SQL.format(condition=condition), [cell_size(zoom)] + params)
+        rows = cursor.fetchall()
+    features = []
+    for count, lng, lat, types, poi_id, name in rows:
+        properties = {'count': count, 'types': types}
+        if count == 1:
+            # A lone POI is drawn as itself
+            properties.update(poi_id=poi_id, name=name)
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [round(lng, 6), round(lat, 6)]},
+            'properties': properties,
+        })
+    return {'type': 'FeatureCollection', 'clustered': True, 'features': features}
+
+
+def pois_in_view(zoom, bbox=None):
+    """Clusters below INDIVIDUAL_ZOOM, else the POIs inside ``bbox``"""
+    if zoom < INDIVIDUAL_ZOOM:
+        return cluster_pois(zoom, bbox)
+    pois = POI.objects.all()
+    if bbox:
+        pois = pois.filter(location__bboverlaps=Polygon.from_bbox(bbox))
+    return {**feature_collection(pois, POI_LAYOUT), 'clustered': False}
@@ -0,0 +1,109 @@
+"""
+Conditional GET (ETag) for the collection endpoints.
+
+A response is versioned by the models it is built from. Every write to a
+model's table increments its ModelVersion row in the same transaction
+(bump(), called from signals.py and bulk_write_finished), so the version
+moves on each commit: inserts, edits and deletions alike, and whichever
+clock stamped ``updated_at``. Reading the versions of a response's models
+is one indexed query. When the client's ETag still matches, Django's
+``condition`` decorator answers 304 before the view - and therefore
+serialization - runs at all.
+
+There is deliberately no Last-Modified: the newest ``updated_at`` does not
+move when a row is deleted, so If-Modified-Since would get a stale 304.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.db import connection
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import ModelVersion
+
+
+def bump(*models):
+    """Increment the version of each of ``models``; call inside the write's transaction"""
+    # Sorted, so concurrent writers lock the rows in the same order
+    labels = sorted({model._meta.label for model in models})
+    table = ModelVersion._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {table} (model, version)
+            SELECT label, 1 FROM unnest(%s::text[]) AS label
+            ON CONFLICT (model) DO UPDATE SET version = {table}.version + 1
+        """, [labels])
+
+
+def _labels(models):
+    return [model._meta.label for model in models]
+
+
+def _version(labels, versions):
+    return '|'.join(f'{label}:{versions.get(label, 0)}' for label in labels)
+
+
+def data_version(*models):
+    """Version string of ``models``; changes with every committed write to any of them"""
+    labels = _labels(models)
+    return _version(labels, dict(
+        ModelVersion.objects.filter(model__in=labels).values_list('model', 'version')
+    ))
+
+
+async def adata_version(*models):
+    """data_version() for async views"""
+    labels = _labels(models)
+    return _version(labels, {
+        model: version async for model, version in
+        ModelVersion.objects.filter(model__in=labels).values_list('model', 'version')
+    })
+
+
+def _etag(request, version):
+    representation = '|'.join([
+        version, request.get_full_path(), request.headers.get('Accept', ''),
+    ])
+    return hashlib.md5(representation.encode()).hexdigest()
+
+
+def versioned(*models):
+    """
+    Decorate a read view with ETag handling.
+
+    ``models`` are the models whose rows make up the response, as for
+    cached_response. The ETag also covers the full path and the Accept
+    header, since ``?zoom=``, ``?stream=`` or a different renderer produce
+    a different representation of the same rows.
+    """
+    def etag_func(request, *args, **kwargs):
+        # Set beforehand by the async wrapper
+        if not hasattr(request, '_collection_etag'):
+            request._collection_etag = _etag(request, data_version(*models))
+        return request._collection_etag
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func)(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # condition() calls etag_func synchronously, so the
+                # versions are awaited here and only read back there
+                request._collection_etag = _etag(request, await adata_version(*models))
+                response = await conditional_view(request, *args, **kwargs)
+                patch_cache_control(response, no_cache=True)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Let browsers keep the copy but revalidate it on every use,
+            # which is what turns repeat page loads into 304s
+            patch_cache_control(response, no_cache=True)
+            return response
+        return wrapper
+    return decorator
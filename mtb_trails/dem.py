@@ -0,0 +1,148 @@
+"""
+DEM sampling for ``manage.py enrich_elevation`` (see elevation.py).
+
+This is the part that runs in the worker processes. Workers are spawned,
+so the module imports neither Django nor the models: it gets trail paths
+as WKB and returns plain dicts of TrailProfile values.
+"""
+import struct
+
+try:
+    import numpy as np
+    import rasterio
+    from affine import Affine
+    from rasterio.warp import transform as warp_transform
+except ImportError:  # only needed by enrich_elevation
+    np = rasterio = None
+
+DEFAULT_SPACING_M = 25
+GRADIENT_WINDOW_M = 100
+MAX_PROFILE_POINTS = 500
+METERS_PER_DEGREE = 111_320
+
+# Set in each worker by init_worker
+_dem = None
+
+
+class DEM:
+    """A memory-mapped DEM band plus what is needed to sample it"""
+
+    def __init__(self, array, transform, crs, nodata):
+        self.array = array
+        self.inverse = ~Affine(*transform)
+        self.crs = crs
+        self.nodata = nodata
+
+    def sample(self, lons, lats):
+        """Bilinear DEM values at WGS84 points; NaN outside the raster or on nodata"""
+        xs, ys = lons, lats
+        if self.crs and self.crs != 'EPSG:4326':
+            xs, ys = map(np.asarray, warp_transform('EPSG:4326', self.crs, lons, lats))
+        cols, rows = self.inverse * (xs, ys)
+        # Pixel centres sit at +0.5
+        cols, rows = np.asarray(cols) - 0.5, np.asarray(rows) - 0.5
+        height, width = self.array.shape
+        col0, row0 = np.floor(cols).astype(int), np.floor(rows).astype(int)
+        inside = (col0 >= 0) & (row0 >= 0) & (col0 < width - 1) & (row0 < height - 1)
+        c0, r0 = np.where(inside, col0, 0), np.where(inside, row0, 0)
+        fx, fy = cols - c0, rows - r0
+        corners = np.stack([
+            self.array[r0, c0], self.array[r0, c0 + 1],
+            self.array[r0 + 1, c0], self.array[r0 + 1, c0 + 1],
+        ]).astype('float64')
+        if self.nodata is not None:
+            corners[corners == self.nodata] = np.nan
+        top = corners[0] * (1 - fx) + corners[1] * fx
+        bottom = corners[2] * (1 - fx) + corners[3] * fx
+        values = top * (1 - fy) + bottom * fy
+        values[~inside] = np.nan
+        return values
+
+
+def densify(coords, spacing_m):
+    """Points every ``spacing_m`` along a lon/lat line (plus its end point)"""
+    lons, lats = coords[:, 0], coords[:, 1]
+    # Local equirectangular approximation; fine for segment lengths on a trail
+    dx = np.diff(lons) * np.cos(np.radians((lats[:-1] + lats[1:]) / 2)) * METERS_PER_DEGREE
+    dy = np.diff(lats) * METERS_PER_DEGREE
+    distance = np.concatenate([[0], np.cumsum(np.hypot(dx, dy))])
+    stations = np.append(np.arange(0, distance[-1], spacing_m), distance[-1])
+    return np.interp(stations, distance, lons), np.interp(stations, distance, lats), stations
+
+
+def profile_metrics(elevations, stations):
+    """(gain, loss, max gradient %) of an elevation series"""
+    steps = np.diff(elevations)
+    gain = float(steps[steps > 0].sum())
+    loss = float(-steps[steps < 0].sum())
+    # Gradient over a window, so a single noisy DEM pixel can't dominate
+    spacing = stations[1] - stations[0] if len(stations) > 1 else 0
+    window = max(1, int(round(GRADIENT_WINDOW_M / spacing))) if spacing else 1
+    window = min(window, len(elevations) - 1)
+    if window < 1:
+        return gain, loss, 0.0
+    rise = elevations[window:] - elevations[:-window]
+    run = stations[window:] - stations[:-window]
+    max_gradient = float(np.max(np.abs(rise) / run) * 100) if len(run) else 0.0
+    return gain, loss, max_gradient
+
+
+def linestring_coords(wkb):
+    """(n, 2) array of a 2D WKB LineString, in either byte order"""
+    # Byte order flag, geometry type, point count, then x/y doubles
+    order = '<' if wkb[0] == 1 else '>'
+    geometry_type, count = struct.unpack_from(f'{order}II', wkb, 1)
+    if geometry_type != 2:
+        raise ValueError(f'expected a 2D WKB LineString, got type {geometry_type}')
+    return np.frombuffer(wkb, dtype=f'{order}f8', count=count * 2, offset=9).reshape(-1, 2)
+
+
+def compute_profile(trail_id, wkb, spacing_m):
+    """Worker: sample one trail; returns a dict of TrailProfile values or None"""
+    coords = linestring_coords(bytes(wkb))
+    lons, lats, stations = densify(coords, spacing_m)
+    if stations[-1] == 0:
+        return None
+    elevations = _dem.sample(lons, lats)
+    valid = ~np.isnan(elevations)
+    if valid.sum() < 2:
+        return None  # trail lies outside the DEM
+    if not valid.all():
+        # Fill short nodata gaps (voids, water) from their neighbours
+        elevations = np.interp(stations, stations[valid], elevations[valid])
+    gain, loss, max_gradient = profile_metrics(elevations, stations)
+
+    # Downsample the stored profile; metrics above use every sample
+    step = max(1, int(np.ceil(len(elevations) / MAX_PROFILE_POINTS)))
+    stored = elevations[::step]
+    return {
+        'trail_id': trail_id,
+        'spacing_m': round(float(stations[1] - stations[0]) * step, 2) if len(stations) > 1 else 0,
+        'elevations': [round(float(value), 1) for value in stored],
+        'elevation_gain_m': round(gain, 1),
+        'elevation_loss_m': round(loss, 1),
+        'max_gradient_pct': round(max_gradient, 1),
+    }
+
+
+def compute_many(args):
+    rows, spacing_m = args
+    return [(path_hash, compute_profile(trail_id, wkb, spacing_m)) for trail_id, wkb, path_hash in rows]
+
+
+def init_worker(npy_path, transform, crs, nodata):
+    global _dem
+    _dem = DEM(np.load(npy_path, mmap_mode='r'), transform, crs, nodata)
+
+
+def copy_band(dem_path, npy_path):
+    """Copy band 1 of ``dem_path`` into a .npy file block by block"""
+    with rasterio.open(dem_path) as src:
+        band = np.lib.format.open_memmap(
+            npy_path, mode='w+', dtype=src.dtypes[0], shape=(src.height, src.width)
+        )
+        for _, window in src.block_windows(1):
+            band[window.toslices()] = src.read(1, window=window)
+        band.flush()
+        crs = src.crs.to_string() if src.crs else None
+        return tuple(src.transform)[:6], crs, src.nodata
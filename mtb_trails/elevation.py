@@ -0,0 +1,141 @@
+"""
+DEM elevation enrichment (used by ``manage.py enrich_elevation``).
+
+The DEM band is copied once, block by block, into a ``.npy`` file that
+every worker process memory-maps read-only, so the raster is shared
+through the page cache instead of being decoded per process. The copy is
+kept in ``DEM_CACHE_DIR`` and reused until the DEM file changes. Each worker
+densifies a trail to a fixed spacing, samples the DEM along it with
+vectorized bilinear interpolation and derives gain, loss and the steepest
+gradient (see dem.py). Trails whose path hash matches their stored profile
+are skipped.
+"""
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.gis.db.models.functions import AsWKB
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import MD5
+from django.utils import timezone
+
+from .dem import DEFAULT_SPACING_M, np, compute_many, copy_band, init_worker
+from .models import Trail, TrailProfile
+
+
+def trails_to_enrich(force=False):
+    trails = Trail.objects.annotate(path_hash=MD5(AsWKB('path')))
+    if not force:
+        trails = trails.filter(Q(profile__isnull=True) | ~Q(profile__path_hash=F('path_hash')))
+    return trails
+
+
+def cached_band(dem_path, cache_dir):
+    """
+    (.npy path, (transform, crs, nodata)) of band 1 of ``dem_path``, copied
+    into ``cache_dir`` once per version (size and mtime) of the file
+    """
+    stat = os.stat(dem_path)
+    prefix = os.path.join(cache_dir, hashlib.md5(os.path.abspath(dem_path).encode()).hexdigest())
+    version = f'{prefix}-{stat.st_size}-{stat.st_mtime_ns}'
+    npy_path, meta_path = f'{version}.npy', f'{version}.json'
+    # The metadata is written last, so its presence means a complete copy
+    if os.path.exists(meta_path):
+        with open(meta_path) as meta:
+            transform, crs, nodata = json.load(meta)
+        return npy_path, (tuple(transform), crs, nodata)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(f'{prefix}-*'):
+        os.remove(stale)
+    partial = f'{version}.{os.getpid()}.npy'
+    dem = copy_band(dem_path, partial)
+    os.replace(partial, npy_path)
+    with open(f'{meta_path}.{os.getpid()}', 'w') as meta:
+        json.dump(dem, meta)
+    os.replace(f'{meta_path}.{os.getpid()}', meta_path)
+    return npy_path, dem
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def enrich(dem_path, spacing_m=DEFAULT_SPACING_M, workers=None, force=False,
+           chunk_size=200, progress=None, cache_dir=None):
+    """
+    Compute profiles for every trail that needs one; return (ids of the
+    trails updated, number skipped outside the DEM). Results are written
+    per chunk, one transaction each.
+    """
+    if np is None:
+        raise RuntimeError('enrich_elevation needs numpy and rasterio')
+
+    # Paths as WKB are ~16 bytes a vertex, so holding them all is cheap and
+    # no cursor stays open while the workers run (workers=1 runs in-process)
+    rows = [
+        (trail_id, bytes(wkb), path_hash)
+        for trail_id, wkb, path_hash in trails_to_enrich(force).values_list(
+            'id', AsWKB('path'), 'path_hash'
+        ).order_by('id').iterator()
+    ]
+    if not rows:
+        return [], 0
+
+    updated, outside = [], 0
+    npy_path, dem = cached_band(dem_path, cache_dir or settings.DEM_CACHE_DIR)
+    jobs = ((chunk, spacing_m) for chunk in _chunks(rows, chunk_size))
+    if workers == 1:
+        init_worker(npy_path, *dem)
+        batches = map(compute_many, jobs)
+        pool = None
+    else:
+        # Spawned, so workers neither inherit the database connection nor
+        # depend on the platform's default start method
+        pool = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker, initargs=(npy_path, *dem),
+        )
+        batches = pool.map(compute_many, jobs)
+    try:
+        for results in batches:
+            profiles = [(path_hash, values) for path_hash, values in results if values]
+            outside += len(results) - len(profiles)
+            _save(profiles, os.path.basename(dem_path))
+            updated += [values['trail_id'] for _, values in profiles]
+            if progress:
+                progress(len(updated), outside, len(rows))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return updated, outside
+
+
+def _save(profiles, dem_name):
+    if not profiles:
+        return
+    now = timezone.now()
+    with transaction.atomic():
+        TrailProfile.objects.bulk_create(
+            [TrailProfile(path_hash=path_hash, dem=dem_name, updated_at=now, **values)
+             for path_hash, values in profiles],
+            update_conflicts=True,
+            unique_fields=['trail'],
+            update_fields=[
+                'spacing_m', 'elevations', 'elevation_gain_m', 'elevation_loss_m',
+                'max_gradient_pct', 'path_hash', 'dem', 'updated_at',
+            ],
+        )
+        # The DEM value replaces the hand-entered gain shown everywhere else
+        Trail.objects.bulk_update(
+            [Trail(id=values['trail_id'], elevation_gain_m=values['elevation_gain_m'],
+                   updated_at=now)
+             for _, values in profiles],
+            ['elevation_gain_m', 'updated_at'],
+        )
@@ -0,0 +1,24 @@
+"""
+Filter backends for the GeoJSON list endpoints.
+"""
+from django.contrib.gis.measure import D
+from rest_framework.exceptions import ParseError
+from rest_framework_gis.filters import DistanceToPointFilter
+
+
+class GeographyDistanceFilter(DistanceToPointFilter):
+    """
+    ``?dist=<meters>&point=<lon>,<lat>``, measured on the spheroid against
+    the model's stored geography column (SpatialQuerySet.within) instead of
+    converting meters to an approximate radius in degrees.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        point = self.get_filter_point(request, srid=4326)
+        if not point:
+            return queryset
+        try:
+            dist = float(request.query_params.get(self.dist_param, 1000))
+        except ValueError:
+            raise ParseError(f'Invalid distance string supplied for parameter {self.dist_param}')
+        return queryset.within(point, D(m=dist))
@@ -0,0 +1,10 @@
+"""
+PostGIS functions that GeoDjango does not ship an expression for.
+"""
+from django.contrib.gis.db.models.functions import GeomOutputGeoFunc
+
+
+class SimplifyPreserveTopology(GeomOutputGeoFunc):
+    """ST_SimplifyPreserveTopology(geometry, tolerance)"""
+    function = 'ST_SimplifyPreserveTopology'
+    arity = 2
@@ -0,0 +1,267 @@
+"""
+GeoJSON helpers for the full-dataset endpoints.
+
+Features are built from ``.values()`` rows with the geometry already encoded
+by PostGIS (``ST_AsGeoJSON``), so no model instances, GEOS geometries or DRF
+serializers are created per row. ``stream_feature_collection`` reads rows
+through a server-side cursor and writes them out as they arrive, which keeps
+worker memory flat regardless of how many features there are.
+"""
+import json
+
+from django.contrib.gis.db.models.functions import AsGeoJSON
+from django.http import StreamingHttpResponse
+from rest_framework.fields import DateTimeField
+
+from .models import POI, GEOMETRY_LEVELS
+from . import timing
+
+# Rows fetched per round-trip from the server-side cursor
+STREAM_CHUNK_SIZE = 2000
+# Flush the output buffer once it holds roughly this many characters
+STREAM_BUFFER_SIZE = 64 * 1024
+
+GEOMETRY_ALIAS = 'geometry_json'
+
+# Decimal places of GeoJSON coordinates: AsGeoJSON's default, and the range
+# accepted from ?precision= (6 is ~0.1 m, below anything a map shows)
+DEFAULT_PRECISION = 8
+MAX_PRECISION = 15
+
+_datetime_field = DateTimeField()
+
+
+def _datetime(value):
+    return _datetime_field.to_representation(value) if value else None
+
+
+class FeatureLayout:
+    """
+    Describes how a model is written as GeoJSON features.
+
+    ``properties`` is a sequence of ``(name, lookup)`` or
+    ``(name, lookup, convert)`` tuples; ``lookup`` is anything ``.values()``
+    accepts (including ``park__name`` style joins) and ``convert`` is an
+    optional callable applied to the raw value. ``simplified`` marks models
+    that carry the ``<geometry_field>_<level>`` columns from GEOMETRY_LEVELS.
+    """
+
+    def __init__(self, geometry_field, properties, simplified=False):
+        self.geometry_field = geometry_field
+        self.simplified = simplified
+        self.properties = [
+            (spec[0], spec[1], spec[2] if len(spec) > 2 else None)
+            for spec in properties
+        ]
+        self.lookups = list(dict.fromkeys(
+            ['id'] + [lookup for _, lookup, _ in self.properties]
+        ))
+
+    def geometry_column(self, level=None):
+        if level and self.simplified:
+            return f'{self.geometry_field}_{level}'
+        return self.geometry_field
+
+    def rows(self, queryset, level=None, precision=None):
+        """Values queryset carrying the encoded geometry and every property"""
+        if precision is None:
+            precision = DEFAULT_PRECISION
+        return queryset.annotate(
+            **{GEOMETRY_ALIAS: AsGeoJSON(self.geometry_column(level), precision=precision)}
+        ).values(GEOMETRY_ALIAS, *self.lookups)
+
+    def binary_columns(self, level=None):
+        """
+        (column names, ``.values()`` lookups) for the binary encodings in
+        renderers.py: each lookup once, named after its first property, raw
+        values (no ``convert``), geometry last as ``geom``
+        """
+        names = {'id': 'id'}
+        for name, lookup, _ in self.properties:
+            names.setdefault(lookup, name)
+        columns = [names[lookup] for lookup in self.lookups] + ['geom']
+        return columns, self.lookups + [self.geometry_column(level)]
+
+    def properties_for(self, row):
+        properties = {}
+        for name, lookup, convert in self.properties:
+            value = row[lookup]
+            properties[name] = convert(value) if convert else value
+        return properties
+
+    def feature_dict(self, row):
+        with timing.measure('serialize'):
+            return {
+                'id': row['id'],
+                'type': 'Feature',
+                'geometry': json.loads(row[GEOMETRY_ALIAS]),
+                'properties': self.properties_for(row),
+            }
+
+    def feature_json(self, row):
+        # The geometry is spliced in verbatim - it is already valid JSON
+        return '{"id": %d, "type": "Feature", "geometry": %s, "properties": %s}' % (
+            row['id'], row[GEOMETRY_ALIAS], json.dumps(self.properties_for(row)),
+        )
+
+
+# Property sets mirror TrailSerializer / POISerializer and parks_geojson
+TRAIL_LAYOUT = FeatureLayout('path', [
+    ('name', 'name'),
+    ('park', 'park_id'),
+    ('park_name', 'park__name'),
+    ('park_id', 'park_id'),
+    ('difficulty', 'difficulty'),
+    ('length_km', 'length_km'),
+    ('elevation_gain_m', 'elevation_gain_m'),
+    ('description', 'description'),
+    ('source', 'source'),
+    ('created_at', 'created_at', _datetime),
+], simplified=True)
+
+POI_LAYOUT = FeatureLayout('location', [
+    ('name', 'name'),
+    ('type', 'type'),
+    ('type_display', 'type', dict(POI._meta.get_field('type').flatchoices).get),
+    ('park', 'park_id'),
+    ('park_name', 'park__name'),
+    ('park_id', 'park_id'),
+    ('description', 'description'),
+    ('source', 'source'),
+    ('created_at', 'created_at', _datetime),
+])
+
+PARK_LAYOUT = FeatureLayout('boundary', [
+    ('id', 'id'),
+    ('name', 'name'),
+    ('description', 'description'),
+    ('source', 'source'),
+    ('created_at', 'created_at', _datetime),
+], simplified=True)
+
+
+def feature_collection(queryset, layout, level=None, precision=None):
+    """Build a FeatureCollection dict in memory (for DRF responses)"""
+    return {
+        'type': 'FeatureCollection',
+        'features': [layout.feature_dict(row) for row in layout.rows(queryset, level, precision)],
+    }
+
+
+async def afeature_collection(queryset, layout, level=None, precision=None):
+    """feature_collection() for async views"""
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            layout.feature_dict(row) async for row in layout.rows(queryset, level, precision)
+        ],
+    }
+
+
+class _FeatureBuffer:
+    """Joins feature JSON into chunks of roughly STREAM_BUFFER_SIZE characters"""
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.parts = ['{"type": "FeatureCollection", "features": [']
+        self.size = 0
+        self.separator = ''
+
+    def add(self, row):
+        """Add a row; returns a chunk to send once the buffer is full, else None"""
+        feature = self.separator + self.layout.feature_json(row)
+        self.separator = ', '
+        self.parts.append(feature)
+        self.size += len(feature)
+        if self.size >= STREAM_BUFFER_SIZE:
+            chunk = ''.join(self.parts)
+            self.parts = []
+            self.size = 0
+            return chunk
+        return None
+
+    def close(self):
+        self.parts.append(']}')
+        return ''.join(self.parts)
+
+
+def _stream_rows(queryset, layout, level, precision):
+    # Primary-key order walks the index, so rows (and bytes) start flowing
+    # without waiting for a full sort of the table.
+    return layout.rows(queryset.order_by('pk'), level, precision)
+
+
+def iter_feature_collection(queryset, layout, level=None, chunk_size=STREAM_CHUNK_SIZE, precision=None):
+    """Yield a FeatureCollection as text chunks, reading rows lazily"""
+    buffer = _FeatureBuffer(layout)
+    for row in _stream_rows(queryset, layout, level, precision).iterator(chunk_size=chunk_size):
+        chunk = buffer.add(row)
+        if chunk:
+            yield chunk
+    yield buffer.close()
+
+
+async def aiter_feature_collection(queryset, layout, level=None, chunk_size=STREAM_CHUNK_SIZE, precision=None):
+    """iter_feature_collection() as an async generator, for async views"""
+    buffer = _FeatureBuffer(layout)
+    async for row in _stream_rows(queryset, layout, level, precision).aiterator(chunk_size=chunk_size):
+        chunk = buffer.add(row)
+        if chunk:
+            yield chunk
+    yield buffer.close()
+
+
+def stream_feature_collection(queryset, layout, level=None, chunk_size=STREAM_CHUNK_SIZE, precision=None):
+    """StreamingHttpResponse that writes features as they are read"""
+    return StreamingHttpResponse(
+        iter_feature_collection(queryset, layout, level, chunk_size, precision),
+        content_type='application/json',
+    )
+
+
+def astream_feature_collection(queryset, layout, level=None, chunk_size=STREAM_CHUNK_SIZE, precision=None):
+    """stream_feature_collection() with an async iterator, for async views under ASGI"""
+    return StreamingHttpResponse(
+        aiter_feature_collection(queryset, layout, level, chunk_size, precision),
+        content_type='application/json',
+    )
+
+
+def wants_stream(request):
+    """True when the client asked for the streaming mode (?stream=1)"""
+    return request.GET.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def geometry_level(request):
+    """
+    Pick a simplified geometry level from ``?zoom=`` (map zoom) or
+    ``?tolerance=`` (degrees). Returns None for full resolution.
+    """
+    zoom = request.GET.get('zoom')
+    tolerance = request.GET.get('tolerance')
+    try:
+        if zoom:
+            zoom = float(zoom)
+            for name, _, max_zoom in GEOMETRY_LEVELS:
+                if zoom <= max_zoom:
+                    return name
+        elif tolerance:
+            tolerance = float(tolerance)
+            # Coarsest level that stays within the requested tolerance
+            for name, level_tolerance, _ in GEOMETRY_LEVELS:
+                if level_tolerance <= tolerance:
+                    return name
+    except ValueError:
+        pass
+    return None
+
+
+def coordinate_precision(request):
+    """
+    Decimal places for coordinates from ``?precision=`` (clamped to
+    0..MAX_PRECISION), None when not given or not a number
+    """
+    try:
+        return max(0, min(int(request.GET['precision']), MAX_PRECISION))
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ... import benchmark
+
+
+class Command(BaseCommand):
+    help = 'Benchmark every API endpoint and save (or compare against) a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='benchmark-baseline.json',
+            help='Where to save this run (default benchmark-baseline.json)',
+        )
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Baseline to compare against; fails on regressions',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=benchmark.DEFAULT_REPEAT,
+            help=f'Measured requests per endpoint (default {benchmark.DEFAULT_REPEAT})',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=benchmark.DEFAULT_WARMUP,
+            help=f'Unmeasured requests first (default {benchmark.DEFAULT_WARMUP})',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=benchmark.DEFAULT_TOLERANCE,
+            help=f'Allowed p95 growth as a share of the baseline (default {benchmark.DEFAULT_TOLERANCE})',
+        )
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Keep the response cache between requests (measure cache hits)',
+        )
+        parser.add_argument(
+            '--only', action='append', metavar='URL_NAME',
+            help='Only benchmark this url name (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+        baseline = benchmark.load(options['compare']) if options['compare'] else None
+        try:
+            current = benchmark.run(
+                repeat=options['repeat'], warmup=options['warmup'],
+                warm=options['warm'], only=options['only'],
+            )
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        for key, result in current['endpoints'].items():
+            self.stdout.write(
+                f"  {key}: {result['status']}, p50 {result['p50_ms']:.1f}ms, "
+                f"p95 {result['p95_ms']:.1f}ms, {result['queries']} queries, {result['bytes']} bytes"
+            )
+        benchmark.save(current, options['output'])
+        self.stdout.write(f"Saved {len(current['endpoints'])} endpoints to {options['output']}")
+
+        if baseline is not None:
+            regressions = benchmark.compare(current, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(f'  {regression}')
+                raise CommandError(f"{len(regressions)} regressions against {options['compare']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}"))
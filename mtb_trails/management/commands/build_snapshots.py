@@ -0,0 +1,59 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...snapshots import LAYERS, build_pending, build_snapshots, snapshot_root
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Write content-hashed GeoJSON snapshots (plus .gz/.br) for WhiteNoise to serve'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--layer', action='append', choices=sorted(LAYERS), dest='layers',
+            help='Only rebuild this layer (repeatable; default: all layers)',
+        )
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Only rebuild the layers marked pending by writes since the last build',
+        )
+        parser.add_argument(
+            '--watch', action='store_true',
+            help='Keep running and rebuild the pending layers every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=10,
+            help='Seconds between checks for pending layers with --watch (default 10)',
+        )
+
+    def handle(self, *args, **options):
+        if options['watch']:
+            self.stdout.write(f"Rebuilding pending snapshots every {options['interval']:g}s")
+            while True:
+                close_old_connections()
+                # A failed pass (database restart, full disk) leaves the layers
+                # pending, so the next pass retries them
+                try:
+                    layers = build_pending()
+                except Exception:
+                    logger.exception('Rebuilding pending snapshots failed')
+                else:
+                    if layers:
+                        self.stdout.write(f"  rebuilt {', '.join(layers)}")
+                time.sleep(options['interval'])
+        if options['pending']:
+            layers = build_pending()
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {', '.join(layers)}" if layers else 'No pending snapshots'
+            ))
+            return
+        manifest = build_snapshots(options['layers'])
+        for name, hashed_name in sorted(manifest.items()):
+            self.stdout.write(f'  {name} -> {hashed_name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Snapshots written to {snapshot_root()}'
+        ))
@@ -0,0 +1,56 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...elevation import DEFAULT_SPACING_M, enrich
+from ...models import Trail, TrailProfile
+from ...signals import bulk_write_finished
+
+
+class Command(BaseCommand):
+    help = 'Sample a GeoTIFF DEM along every changed trail and store its elevation profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dem', help='GeoTIFF (or any GDAL raster) with elevations in meters')
+        parser.add_argument(
+            '--spacing', type=float, default=DEFAULT_SPACING_M,
+            help=f'Sample spacing along the trail in meters (default {DEFAULT_SPACING_M})',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Worker processes (default: one per CPU; 1 runs in-process)',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Recompute every trail, e.g. after switching to a new DEM',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options['dem']):
+            raise CommandError(f"{options['dem']} does not exist")
+        if options['spacing'] <= 0:
+            raise CommandError('--spacing must be positive')
+
+        started = time.monotonic()
+
+        def progress(updated, outside, total):
+            self.stdout.write(f'  {updated + outside}/{total} trails processed')
+
+        try:
+            updated, outside = enrich(
+                options['dem'], spacing_m=options['spacing'], workers=options['workers'],
+                force=options['force'], progress=progress,
+            )
+        except RuntimeError as exc:
+            raise CommandError(exc)
+
+        if updated:
+            # Only the profiles written: stats and access points of the
+            # other trails and parks did not change
+            bulk_write_finished(Trail, TrailProfile, changed_ids={Trail: updated, TrailProfile: updated})
+        if outside:
+            self.stdout.write(self.style.WARNING(f'{outside} trails lie outside the DEM'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(updated)} trail profiles updated in {time.monotonic() - started:.1f}s'
+        ))
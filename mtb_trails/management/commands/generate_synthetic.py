@@ -0,0 +1,83 @@
+import random
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ... import synthetic
+from ...models import Trail, POI, Park
+from ...signals import bulk_write_finished
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Generate a deterministic synthetic dataset of parks, trails and POIs for benchmarks'
+
+    def add_arguments(self, parser):
+        size = parser.add_mutually_exclusive_group(required=True)
+        size.add_argument('--scale', choices=list(synthetic.SCALES), help='Preset trail count')
+        size.add_argument('--trails', type=int, help='Number of trails')
+        parser.add_argument('--parks', type=int, help=f'Number of parks (default trails / {synthetic.TRAILS_PER_PARK})')
+        parser.add_argument('--pois', type=int, help=f'Number of POIs (default trails * {synthetic.POIS_PER_TRAIL})')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default 42)')
+        parser.add_argument(
+            '--vertices', type=int, nargs=2, default=(100, 400), metavar=('MIN', 'MAX'),
+            help='Vertices per trail (default 100 400)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per insert transaction (default 1000)')
+
+    def handle(self, *args, **options):
+        trail_count = synthetic.SCALES[options['scale']] if options['scale'] else options['trails']
+        park_count, trail_count, poi_count = synthetic.scale_counts(trail_count)
+        if options['parks'] is not None:
+            park_count = options['parks']
+        if options['pois'] is not None:
+            poi_count = options['pois']
+        if park_count < 1:
+            raise CommandError('At least one park is needed')
+        seed, batch_size = options['seed'], options['batch_size']
+        if synthetic.existing(seed):
+            raise CommandError(f'Synthetic rows for seed {seed} already exist; use a fresh database or another --seed')
+
+        started = time.monotonic()
+        rng = random.Random(seed)
+
+        areas = []
+        for batch in _batches(synthetic.parks(rng, park_count, seed), batch_size):
+            with transaction.atomic():
+                Park.objects.bulk_create([park for park, _ in batch])
+            for park, area in batch:
+                area.id = park.pk
+                areas.append(area)
+        self.stdout.write(f'  parks: {len(areas)}')
+
+        starts = []
+        trails = synthetic.trails(rng, trail_count, areas, seed, tuple(options['vertices']))
+        for batch in _batches(trails, batch_size):
+            with transaction.atomic():
+                Trail.objects.bulk_create([trail for trail, _ in batch])
+            starts.extend(start for _, start in batch)
+            if len(starts) % (batch_size * 10) == 0:
+                self.stdout.write(f'  trails: {len(starts)}')
+        self.stdout.write(f'  trails: {len(starts)}')
+
+        written = 0
+        for batch in _batches(synthetic.pois(rng, poi_count, starts, areas, seed), batch_size):
+            with transaction.atomic():
+                POI.objects.bulk_create(batch)
+            written += len(batch)
+        self.stdout.write(f'  POIs: {written}')
+
+        # Everything rather than by updated_at: bulk_create stamps it with
+        # the app clock, which need not agree with the database's. At these
+        # sizes a full refresh is also cheaper than naming every row.
+        bulk_write_finished(Park, Trail, POI, everything=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Synthetic dataset (seed {seed}) generated in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...osm import DEFAULT_BATCH_SIZE, BatchWriter, database_now, import_osm
+from ...signals import bulk_write_finished
+
+
+class Command(BaseCommand):
+    help = 'Import MTB routes, parks and POIs from a local .osm/.osm.pbf extract (upserts on source_id)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='OSM extract (.osm, .osm.pbf, .osm.bz2, ...)')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Rows per COPY + upsert transaction (default {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--node-cache', default='flex_mem',
+            help="pyosmium node location storage, e.g. 'dense_file_array,/tmp/nodes.cache' "
+                 "to keep memory flat on large extracts (default flex_mem)",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Parse and count features without writing to the database',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        writer = BatchWriter(options['batch_size'], dry_run=options['dry_run'])
+        since = database_now()
+        try:
+            import_osm(options['path'], writer, node_cache=options['node_cache'])
+        except RuntimeError as exc:
+            raise CommandError(exc)
+
+        for model, stats in writer.stats.items():
+            self.stdout.write(
+                f"  {model._meta.verbose_name_plural}: {stats['read']} read, "
+                f"{stats['inserted']} inserted, {stats['updated']} updated"
+            )
+        changed = writer.changed_models()
+        if changed:
+            bulk_write_finished(*changed, changed_since=since)
+        self.stdout.write(self.style.SUCCESS(
+            f'OSM import finished in {time.monotonic() - started:.1f}s'
+        ))
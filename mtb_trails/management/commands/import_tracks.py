@@ -0,0 +1,118 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.contrib.gis.geos import LineString
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ...models import Trail, Park
+from ...signals import bulk_write_finished
+from ...tracks import DIFFICULTIES, find_tracks, parse_tracks
+
+SOURCE = 'other'
+# Column -> SQL of its value; timestamps come from the database clock
+COLUMNS = {
+    'name': '%s', 'park_id': '%s', 'difficulty': '%s', 'length_km': '%s',
+    'elevation_gain_m': '%s', 'path': 'ST_GeomFromEWKB(%s)', 'description': '%s',
+    'source': '%s', 'source_id': '%s',
+    'created_at': 'statement_timestamp()', 'updated_at': 'statement_timestamp()',
+}
+
+
+class Command(BaseCommand):
+    help = 'Import a directory of GPX/GeoJSON tracks as trails (parsed in parallel, written in batches)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory searched recursively for .gpx/.geojson files')
+        parser.add_argument('--park', type=int, help='Park id to attach the imported trails to')
+        parser.add_argument(
+            '--difficulty', choices=DIFFICULTIES, default='intermediate',
+            help='Difficulty for tracks that do not specify one (default intermediate)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Parser processes (default: one per CPU; 1 parses in-process)',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Trails per INSERT batch (default 500)',
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f'{directory} is not a directory')
+        park = None
+        if options['park'] is not None:
+            park = Park.objects.filter(pk=options['park']).first()
+            if park is None:
+                raise CommandError(f"Park {options['park']} does not exist")
+
+        started = time.monotonic()
+        paths = find_tracks(directory)
+        parse = partial(parse_tracks, root=directory)
+        self.created, self.skipped, self.failed = [], 0, 0
+        batch = []
+
+        if options['workers'] > 1:
+            # Spawned, so workers neither inherit the database connection nor
+            # depend on the platform's default start method
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(options['workers'], mp_context=context) as pool:
+                for tracks in pool.map(parse, paths, chunksize=16):
+                    self.collect(tracks, batch, park, options)
+        else:
+            for tracks in map(parse, paths):
+                self.collect(tracks, batch, park, options)
+        self.write(batch)
+
+        if self.created:
+            bulk_write_finished(Trail, changed_ids={Trail: self.created})
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(self.created)} trails created, {self.skipped} already imported, '
+            f'{self.failed} rejected, from {len(paths)} files in {time.monotonic() - started:.1f}s'
+        ))
+
+    def collect(self, tracks, batch, park, options):
+        for track in tracks:
+            if track.errors:
+                self.failed += 1
+                self.stderr.write(f"  {track.source_id}: {'; '.join(track.errors)}")
+                continue
+            batch.append((
+                track.name,
+                park.pk if park else None,
+                track.difficulty or options['difficulty'],
+                track.length_km,
+                track.elevation_gain_m,
+                bytes(LineString(track.coords, srid=4326).ewkb),
+                track.description,
+                SOURCE,
+                track.source_id,
+            ))
+            if len(batch) >= options['batch_size']:
+                self.write(batch)
+
+    def write(self, batch):
+        """
+        Insert one batch in one statement. Tracks imported before, by this
+        or a concurrent run, conflict on (source, source_id) and are skipped;
+        RETURNING gives the ids of the rows actually inserted.
+        """
+        if not batch:
+            return
+        row = f"({', '.join(COLUMNS.values())})"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {Trail._meta.db_table} ({', '.join(COLUMNS)}) "
+                f"VALUES {', '.join([row] * len(batch))} "
+                f"ON CONFLICT DO NOTHING RETURNING id",
+                [value for values in batch for value in values],
+            )
+            inserted = [pk for pk, in cursor.fetchall()]
+        self.created += inserted
+        self.skipped += len(batch) - len(inserted)
+        batch.clear()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from ...access import refresh
+from ...models import TrailAccessPoint
+
+
+class Command(BaseCommand):
+    help = 'Recompute the nearest parking, trailhead and toilets to both ends of every trail'
+
+    def handle(self, *args, **options):
+        refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'{TrailAccessPoint.objects.count()} trail access points'
+        ))
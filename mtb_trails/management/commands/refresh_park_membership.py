@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ...membership import refresh_parks
+from ...models import ParkBoundaryPart, TrailParkMembership, POIParkMembership
+
+
+class Command(BaseCommand):
+    help = 'Re-cut every park boundary with ST_Subdivide and recompute trail/POI park membership'
+
+    def handle(self, *args, **options):
+        refresh_parks()
+        self.stdout.write(self.style.SUCCESS(
+            f'{ParkBoundaryPart.objects.count()} boundary parts, '
+            f'{TrailParkMembership.objects.count()} trail and '
+            f'{POIParkMembership.objects.count()} POI memberships'
+        ))
@@ -0,0 +1,86 @@
+"""
+Subdivided park boundaries and trail/POI -> park membership.
+
+Park boundaries are cut with ST_Subdivide into ParkBoundaryPart rows of at
+most ``MAX_VERTICES`` vertices each. Their GiST index boxes are tight, so
+"which park contains this point" touches one or two small polygons instead
+of testing the whole, detailed boundary. TrailParkMembership and
+POIParkMembership store which parks each trail runs through and each POI
+lies in, so "trails in park X" is a join on an indexed foreign key.
+
+Everything here is refreshed by the signal handlers in signals.py (single
+writes) and by ``bulk_write_finished`` (imports); ``manage.py
+refresh_park_membership`` rebuilds it all.
+"""
+from django.db import connection, transaction
+
+from .models import Trail, POI, Park, ParkBoundaryPart, TrailParkMembership, POIParkMembership
+
+MAX_VERTICES = 256
+
+PARTS_TABLE = ParkBoundaryPart._meta.db_table
+
+# model -> (membership model, its foreign key column, geometry column)
+MEMBERSHIPS = {
+    Trail: (TrailParkMembership, 'trail_id', 'path'),
+    POI: (POIParkMembership, 'poi_id', 'location'),
+}
+
+
+def _where(column, ids):
+    """SQL condition and params restricting ``column`` to ``ids`` (None = all rows)"""
+    if ids is None:
+        return 'TRUE', []
+    return f'{column} = ANY(%s)', [list(ids)]
+
+
+def _subdivide(cursor, park_ids):
+    condition, params = _where('park_id', park_ids)
+    cursor.execute(f"DELETE FROM {PARTS_TABLE} WHERE {condition}", params)
+    condition, params = _where('id', park_ids)
+    cursor.execute(f"""
+        INSERT INTO {PARTS_TABLE} (park_id, geom)
+        SELECT id, (ST_Dump(ST_Subdivide(boundary, %s))).geom
+        FROM {Park._meta.db_table}
+        WHERE {condition}
+    """, [MAX_VERTICES] + params)
+
+
+def _match(cursor, model, column, ids):
+    """Recompute the memberships of ``model`` rows whose ``column`` is in ``ids``"""
+    membership, fk_column, geometry = MEMBERSHIPS[model]
+    condition, params = _where(f'm.{column}', ids)
+    cursor.execute(
+        f"DELETE FROM {membership._meta.db_table} m WHERE {condition}", params
+    )
+    # Match the same rows from the other side of the join
+    source = 't.id' if column == fk_column else 'b.park_id'
+    condition, params = _where(source, ids)
+    cursor.execute(f"""
+        INSERT INTO {membership._meta.db_table} ({fk_column}, park_id)
+        SELECT DISTINCT t.id, b.park_id
+        FROM {model._meta.db_table} t
+        JOIN {PARTS_TABLE} b ON ST_Intersects(t.{geometry}, b.geom)
+        WHERE {condition}
+    """, params)
+
+
+def refresh(model, ids=None):
+    """Recompute the park memberships of Trail or POI rows ``ids`` (None = all)"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        _match(cursor, model, MEMBERSHIPS[model][1], ids)
+
+
+def refresh_parks(park_ids=None):
+    """Re-cut the boundaries of ``park_ids`` (None = all) and recompute their members"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        _subdivide(cursor, park_ids)
+        for model in MEMBERSHIPS:
+            _match(cursor, model, 'park_id', park_ids)
+
+
+def parks_containing(point):
+    """Parks whose boundary contains ``point``"""
+    return Park.objects.filter(
+        pk__in=ParkBoundaryPart.objects.filter(geom__intersects=point).values('park_id')
+    )
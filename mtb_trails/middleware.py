@@ -0,0 +1,133 @@
+"""
+Project middleware.
+"""
+import os
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+from whitenoise.responders import MissingFileError
+
+from . import timing
+
+# trails-medium.3f2a9c81d0e4.geojson
+HASHED_SNAPSHOT_RE = re.compile(r'\.[0-9a-f]{12}\.geojson$')
+
+
+class SnapshotWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also serves the GeoJSON snapshots in ``SNAPSHOT_ROOT``.
+
+    WhiteNoise indexes its files once at startup, but snapshots are written
+    while the server runs, so files under ``SNAPSHOT_URL`` are looked up on
+    first request and then kept in a separate index.
+    Hashed snapshot names never change content and are cached forever;
+    precompressed .br/.gz variants are picked by Accept-Encoding.
+
+    Unlike WhiteNoise's own middleware it is async-capable, so under ASGI
+    requests for the async views are not pushed through a thread here.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        self.snapshot_prefix = settings.SNAPSHOT_URL
+        self.snapshot_root = os.path.abspath(settings.SNAPSHOT_ROOT)
+        self.snapshot_files = {}
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.lookup(request.path_info)
+        if static_file is None:
+            return self.get_response(request)
+        return self.serve(static_file, request)
+
+    async def __acall__(self, request):
+        # Lookups are dict reads (plus a stat for snapshots), fine inline
+        static_file = self.lookup(request.path_info)
+        if static_file is None:
+            return await self.get_response(request)
+        return self.serve(static_file, request)
+
+    def lookup(self, url):
+        if url.startswith(self.snapshot_prefix):
+            return self.find_snapshot(url)
+        if self.autorefresh:
+            return self.find_file(url)
+        return self.files.get(url)
+
+    def find_snapshot(self, url):
+        path, static_file = self.snapshot_files.get(url, (None, None))
+        # Superseded snapshots are deleted on rebuild; forget them
+        if static_file is not None and os.path.exists(path):
+            return static_file
+        self.snapshot_files.pop(url, None)
+        if not self.url_is_canonical(url):
+            return None
+        path = os.path.join(self.snapshot_root, url[len(self.snapshot_prefix):])
+        if os.path.commonpath((self.snapshot_root, path)) != self.snapshot_root:
+            return None
+        try:
+            static_file = self.find_file_at_path(path, url)
+        except MissingFileError:
+            return None
+        # Only hashed names are immutable; manifest.json is re-read each time
+        if HASHED_SNAPSHOT_RE.search(url):
+            self.snapshot_files[url] = (path, static_file)
+        return static_file
+
+    def immutable_file_test(self, path, url):
+        if url.startswith(self.snapshot_prefix):
+            return bool(HASHED_SNAPSHOT_RE.search(url))
+        return super().immutable_file_test(path, url)
+
+
+class ServerTimingMiddleware:
+    """
+    Times each request to an mtb_trails view (database, serializers,
+    rendering) and reports it in a ``Server-Timing`` header and a log line;
+    see timing.py.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = timing.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_timing = timing.stop(token)
+        timing.report(request, response, request_timing)
+        return response
+
+    async def __acall__(self, request):
+        token = timing.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_timing = timing.stop(token)
+        timing.report(request, response, request_timing)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook; time up to the end of render()
+        request_timing = timing.current()
+        if request_timing is not None:
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendered: request_timing.add('render', time.perf_counter() - started)
+            )
+        return response
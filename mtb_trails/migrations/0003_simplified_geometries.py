@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:32
+
+import django.contrib.gis.db.models.fields
+import mtb_trails.functions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0002_alter_park_options_alter_poi_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='park',
+            name='boundary_coarse',
+            field=models.GeneratedField(db_persist=True, expression=mtb_trails.functions.SimplifyPreserveTopology('boundary', 0.005), output_field=django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+        ),
+        migrations.AddField(
+            model_name='park',
+            name='boundary_fine',
+            field=models.GeneratedField(db_persist=True, expression=mtb_trails.functions.SimplifyPreserveTopology('boundary', 0.0001), output_field=django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+        ),
+        migrations.AddField(
+            model_name='park',
+            name='boundary_medium',
+            field=models.GeneratedField(db_persist=True, expression=mtb_trails.functions.SimplifyPreserveTopology('boundary', 0.0007), output_field=django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+        ),
+        migrations.AddField(
+            model_name='trail',
+            name='path_coarse',
+            field=models.GeneratedField(db_persist=True, expression=mtb_trails.functions.SimplifyPreserveTopology('path', 0.005), output_field=django.contrib.gis.db.models.fields.LineStringField(srid=4326)),
+        ),
+        migrations.AddField(
+            model_name='trail',
+            name='path_fine',
+            field=models.GeneratedField(db_persist=True, expression=mtb_trails.functions.SimplifyPreserveTopology('path', 0.0001), output_field=django.contrib.gis.db.models.fields.LineStringField(srid=4326)),
+        ),
+        migrations.AddField(
+            model_name='trail',
+            name='path_medium',
+            field=models.GeneratedField(db_persist=True, expression=mtb_trails.functions.SimplifyPreserveTopology('path', 0.0007), output_field=django.contrib.gis.db.models.fields.LineStringField(srid=4326)),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0004_index_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='park',
+            constraint=models.UniqueConstraint(condition=models.Q(('source_id', ''), _negated=True), fields=('source', 'source_id'), name='park_unique_source_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='poi',
+            constraint=models.UniqueConstraint(condition=models.Q(('source_id', ''), _negated=True), fields=('source', 'source_id'), name='poi_unique_source_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='trail',
+            constraint=models.UniqueConstraint(condition=models.Q(('source_id', ''), _negated=True), fields=('source', 'source_id'), name='trail_unique_source_id'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0005_unique_source_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrailProfile',
+            fields=[
+                ('trail', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to='mtb_trails.trail')),
+                ('spacing_m', models.FloatField(help_text='Distance between consecutive profile samples in meters')),
+                ('elevations', models.JSONField(help_text='Elevation in meters every spacing_m along the trail')),
+                ('elevation_gain_m', models.FloatField()),
+                ('elevation_loss_m', models.FloatField()),
+                ('max_gradient_pct', models.FloatField(help_text='Steepest gradient over any 100 m stretch, in percent')),
+                ('path_hash', models.CharField(max_length=32)),
+                ('dem', models.CharField(blank=True, help_text='DEM file the profile was sampled from', max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:45
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.operations
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0006_trail_profile'),
+    ]
+
+    operations = [
+        django.contrib.postgres.operations.TrigramExtension(),
+        migrations.AddField(
+            model_name='trail',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='trail_search_vector'),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='trail_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='trail_name_prefix'),
+        ),
+        # Same document as search.trail_search_vector(), for existing rows
+        migrations.RunSQL(
+            sql="""
+                UPDATE mtb_trails_trail AS t SET search_vector =
+                    setweight(to_tsvector('english', COALESCE(t.name, '')), 'A')
+                    || setweight(to_tsvector('english', COALESCE(
+                        (SELECT p.name FROM mtb_trails_park p WHERE p.id = t.park_id), ''
+                    )), 'B')
+                    || setweight(to_tsvector('english', COALESCE(t.difficulty, '')), 'B')
+                    || setweight(to_tsvector('english', COALESCE(t.description, '')), 'C')
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
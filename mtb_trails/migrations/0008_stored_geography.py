@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:49
+
+import django.contrib.gis.db.models.fields
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0007_trail_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='poi',
+            name='location_geography',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast('location', django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326)), output_field=django.contrib.gis.db.models.fields.PointField(geography=True, srid=4326)),
+        ),
+        migrations.AddField(
+            model_name='trail',
+            name='path_geography',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast('path', django.contrib.gis.db.models.fields.LineStringField(geography=True, srid=4326)), output_field=django.contrib.gis.db.models.fields.LineStringField(geography=True, srid=4326)),
+        ),
+        migrations.AddIndex(
+            model_name='poi',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['location_geography'], name='poi_location_geography'),
+        ),
+        migrations.AddIndex(
+            model_name='trail',
+            index=django.contrib.postgres.indexes.GistIndex(fields=['path_geography'], name='trail_path_geography'),
+        ),
+    ]
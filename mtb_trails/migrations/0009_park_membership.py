@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:50
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0008_stored_geography'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkBoundaryPart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geom', django.contrib.gis.db.models.fields.PolygonField(srid=4326)),
+                ('park', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='boundary_parts', to='mtb_trails.park')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='POIParkMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('park', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='poi_memberships', to='mtb_trails.park')),
+                ('poi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='park_memberships', to='mtb_trails.poi')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('poi', 'park'), name='poi_park_membership_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrailParkMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('park', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trail_memberships', to='mtb_trails.park')),
+                ('trail', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='park_memberships', to='mtb_trails.trail')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trail', 'park'), name='trail_park_membership_unique')],
+            },
+        ),
+        # Backfill (what membership.refresh_parks() does for all parks)
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO mtb_trails_parkboundarypart (park_id, geom)
+                SELECT id, (ST_Dump(ST_Subdivide(boundary, 256))).geom FROM mtb_trails_park;
+                INSERT INTO mtb_trails_trailparkmembership (trail_id, park_id)
+                SELECT DISTINCT t.id, b.park_id FROM mtb_trails_trail t
+                JOIN mtb_trails_parkboundarypart b ON ST_Intersects(t.path, b.geom);
+                INSERT INTO mtb_trails_poiparkmembership (poi_id, park_id)
+                SELECT DISTINCT t.id, b.park_id FROM mtb_trails_poi t
+                JOIN mtb_trails_parkboundarypart b ON ST_Intersects(t.location, b.geom);
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
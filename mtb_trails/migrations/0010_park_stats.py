@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0009_park_membership'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkStats',
+            fields=[
+                ('park', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='mtb_trails.park')),
+                ('trail_count', models.PositiveIntegerField(default=0)),
+                ('total_length_km', models.FloatField(default=0)),
+                ('mean_length_km', models.FloatField(null=True)),
+                ('total_elevation_gain_m', models.FloatField(default=0)),
+                ('difficulty_counts', models.JSONField(default=dict, help_text='Number of trails per difficulty')),
+                ('poi_counts', models.JSONField(default=dict, help_text='Number of POIs per type')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        # Backfill (what stats.refresh() does for all parks)
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO mtb_trails_parkstats (
+                    park_id, trail_count, total_length_km, mean_length_km,
+                    total_elevation_gain_m, difficulty_counts, poi_counts, updated_at
+                )
+                SELECT p.id, t.trail_count, COALESCE(t.total_length_km, 0), t.mean_length_km,
+                       COALESCE(t.total_elevation_gain_m, 0),
+                       COALESCE(d.counts, jsonb_build_object()), COALESCE(o.counts, jsonb_build_object()),
+                       statement_timestamp()
+                FROM mtb_trails_park p
+                CROSS JOIN LATERAL (
+                    SELECT count(*) AS trail_count, sum(length_km) AS total_length_km,
+                           avg(length_km) AS mean_length_km,
+                           sum(elevation_gain_m) AS total_elevation_gain_m
+                    FROM mtb_trails_trail WHERE park_id = p.id
+                ) t
+                CROSS JOIN LATERAL (
+                    SELECT jsonb_object_agg(difficulty, n) AS counts FROM (
+                        SELECT difficulty, count(*) AS n FROM mtb_trails_trail
+                        WHERE park_id = p.id GROUP BY difficulty
+                    ) x
+                ) d
+                CROSS JOIN LATERAL (
+                    SELECT jsonb_object_agg(type, n) AS counts FROM (
+                        SELECT type, count(*) AS n FROM mtb_trails_poi
+                        WHERE park_id = p.id GROUP BY type
+                    ) x
+                ) o
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mtb_trails', '0010_park_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrailAccessPoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(choices=[('start', 'Start'), ('end', 'End')], max_length=5)),
+                ('type', models.CharField(help_text='POI type (see access.ACCESS_TYPES)', max_length=50)),
+                ('distance_m', models.FloatField(help_text='Geodesic distance from the trail end to the POI in meters')),
+                ('poi', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trail_access_points', to='mtb_trails.poi')),
+                ('trail', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_points', to='mtb_trails.trail')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trail', 'endpoint', 'type'), name='trail_access_point_unique')],
+            },
+        ),
+        # Backfill (what access.refresh() does for all trails)
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO mtb_trails_trailaccesspoint (trail_id, endpoint, type, poi_id, distance_m)
+                SELECT t.id, e.endpoint, k.type, n.id, n.distance_m
+                FROM mtb_trails_trail t
+                CROSS JOIN LATERAL (VALUES
+                    ('start', ST_StartPoint(t.path)::geography),
+                    ('end', ST_EndPoint(t.path)::geography)
+                ) e (endpoint, point)
+                CROSS JOIN unnest(ARRAY['parking', 'trailhead', 'toilets']) k (type)
+                CROSS JOIN LATERAL (
+                    SELECT p.id, ST_Distance(p.location_geography, e.point) AS distance_m
+                    FROM mtb_trails_poi p
+                    WHERE p.type = k.type AND ST_DWithin(p.location_geography, e.point, 20000)
+                    ORDER BY p.location_geography <-> e.point
+                    LIMIT 1
+                ) n;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
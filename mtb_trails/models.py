@@ -1,5 +1,83 @@
 from django.contrib.gis.db import models
+from django.contrib.postgres.indexes import GinIndex, GistIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Cast, Upper
+
+from .functions import SimplifyPreserveTopology
+
+# Precomputed simplified geometries for zoom-dependent output.
+# Each level is (name, tolerance in degrees, highest map zoom it is served at);
+# the tolerance is roughly one screen pixel at that zoom, so the
+# simplification is not visible on the map. Ordered coarse -> fine.
+GEOMETRY_LEVELS = (
+    ('coarse', 0.005, 8),
+    ('medium', 0.0007, 11),
+    ('fine', 0.0001, 14),
+)
+SIMPLIFY_TOLERANCES = {name: tolerance for name, tolerance, _ in GEOMETRY_LEVELS}
+
+
+# Annotation carrying the simplified geometry selected by at_level()
+LEVEL_GEOMETRY = 'level_geometry'
+
+
+def simplified_fields(geometry_field):
+    return [f'{geometry_field}_{name}' for name, _, _ in GEOMETRY_LEVELS]
+
+
+class SpatialQuerySet(models.QuerySet):
+    """
+    QuerySet for models with simplified geometry levels and/or a park FK.
+    Models set ``SIMPLIFIED_GEOMETRY`` to the name of their full geometry field.
+    """
+
+    def at_level(self, level):
+        """
+        Load only the geometry column for ``level`` (None = full resolution),
+        as the ``LEVEL_GEOMETRY`` annotation. The simplified columns stay
+        deferred, so other deferrals (e.g. with_park) compose with it.
+        """
+        geometry_field = getattr(self.model, 'SIMPLIFIED_GEOMETRY', None)
+        if not level or not geometry_field:
+            return self
+        return self.defer(geometry_field, *simplified_fields(geometry_field)).annotate(
+            **{LEVEL_GEOMETRY: models.F(f'{geometry_field}_{level}')}
+        )
+
+    def within(self, point, distance):
+        """
+        Rows within ``distance`` (a D) of ``point``, measured on the spheroid.
+        Filters on the model's stored ``GEOGRAPHY`` column, so the ST_DWithin
+        is answered from its GiST index.
+        """
+        field = self.model._meta.get_field(self.model.GEOGRAPHY)
+        # Typed as geography so dwithin takes meters (the column is a GeneratedField)
+        geography = models.ExpressionWrapper(models.F(field.name), output_field=field.output_field)
+        return self.alias(geography=geography).filter(geography__dwithin=(point, distance))
+
+    def with_park(self):
+        """select_related('park') without dragging the park geometries along"""
+        return self.select_related('park').defer(
+            *[f'park__{name}' for name in ['boundary'] + simplified_fields('boundary')]
+        )
+
+
+class SpatialManager(models.Manager.from_queryset(SpatialQuerySet)):
+    """
+    Leaves the simplified geometry columns (and a model's other
+    ``DEFERRED_FIELDS``) out of ordinary queries
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        geometry_field = getattr(self.model, 'SIMPLIFIED_GEOMETRY', None)
+        if geometry_field:
+            queryset = queryset.defer(*simplified_fields(geometry_field))
+        deferred = getattr(self.model, 'DEFERRED_FIELDS', ())
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        return queryset
 
 class Park(models.Model):
     """
@@ -21,6 +99,24 @@ class Park(models.Model):
         help_text="Geographic boundary of the park area"
     )
     
+    # Simplified boundaries (see GEOMETRY_LEVELS), computed by the database
+    # so they stay in sync on every write, including bulk inserts
+    boundary_coarse = models.GeneratedField(
+        expression=SimplifyPreserveTopology('boundary', SIMPLIFY_TOLERANCES['coarse']),
+        output_field=models.PolygonField(srid=4326),
+        db_persist=True,
+    )
+    boundary_medium = models.GeneratedField(
+        expression=SimplifyPreserveTopology('boundary', SIMPLIFY_TOLERANCES['medium']),
+        output_field=models.PolygonField(srid=4326),
+        db_persist=True,
+    )
+    boundary_fine = models.GeneratedField(
+        expression=SimplifyPreserveTopology('boundary', SIMPLIFY_TOLERANCES['fine']),
+        output_field=models.PolygonField(srid=4326),
+        db_persist=True,
+    )
+    
     # Data source tracking - useful for knowing where data came from
     source = models.CharField(
         max_length=50,
@@ -38,7 +134,10 @@ class Park(models.Model):
     )
     
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    SIMPLIFIED_GEOMETRY = 'boundary'
+    objects = SpatialManager()
     
     def __str__(self):
         return self.name
@@ -47,6 +146,14 @@ class Park(models.Model):
         ordering = ['name']
         verbose_name = "Mountain Bike Park"
         verbose_name_plural = "Mountain Bike Parks"
+        constraints = [
+            # Upsert key for imports (see osm.py); manual rows have no source_id
+            models.UniqueConstraint(
+                fields=['source', 'source_id'],
+                condition=~models.Q(source_id=''),
+                name='park_unique_source_id',
+            ),
+        ]
 
 
 class Trail(models.Model):
@@ -96,6 +203,23 @@ class Trail(models.Model):
         help_text="Trail route as a line geometry (sequence of coordinates)"
     )
     
+    # Simplified paths (see GEOMETRY_LEVELS), computed by the database
+    path_coarse = models.GeneratedField(
+        expression=SimplifyPreserveTopology('path', SIMPLIFY_TOLERANCES['coarse']),
+        output_field=models.LineStringField(srid=4326),
+        db_persist=True,
+    )
+    path_medium = models.GeneratedField(
+        expression=SimplifyPreserveTopology('path', SIMPLIFY_TOLERANCES['medium']),
+        output_field=models.LineStringField(srid=4326),
+        db_persist=True,
+    )
+    path_fine = models.GeneratedField(
+        expression=SimplifyPreserveTopology('path', SIMPLIFY_TOLERANCES['fine']),
+        output_field=models.LineStringField(srid=4326),
+        db_persist=True,
+    )
+    
     # NEW: Additional metadata
     description = models.TextField(
         blank=True,
@@ -118,8 +242,25 @@ class Trail(models.Model):
         help_text="External ID from data source (e.g., OSM relation ID)"
     )
     
+    # Geodesic copy of path for radius searches, computed by the database so
+    # it stays in sync on every write (see SpatialQuerySet.within)
+    path_geography = models.GeneratedField(
+        expression=Cast('path', models.LineStringField(srid=4326, geography=True)),
+        output_field=models.LineStringField(srid=4326, geography=True),
+        db_persist=True,
+    )
+    
+    # Full-text search document: name, park name, difficulty, description.
+    # Maintained by search.update_search_vectors (see signals.py)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    SIMPLIFIED_GEOMETRY = 'path'
+    GEOGRAPHY = 'path_geography'
+    DEFERRED_FIELDS = ('search_vector', 'path_geography')
+    objects = SpatialManager()
     
     def __str__(self):
         if self.park:
@@ -128,6 +269,22 @@ class Trail(models.Model):
     
     class Meta:
         ordering = ['name']
+        constraints = [
+            # Upsert key for imports (see osm.py); manual rows have no source_id
+            models.UniqueConstraint(
+                fields=['source', 'source_id'],
+                condition=~models.Q(source_id=''),
+                name='trail_unique_source_id',
+            ),
+        ]
+        indexes = [
+            GinIndex(fields=['search_vector'], name='trail_search_vector'),
+            # Trigram matching on the name (search typos, autocomplete)
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='trail_name_trgm'),
+            # name__istartswith (autocomplete prefix scan)
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'), name='trail_name_prefix'),
+            GistIndex(fields=['path_geography'], name='trail_path_geography'),
+        ]
 
 
 class POI(models.Model):
@@ -171,6 +328,12 @@ class POI(models.Model):
         db_index=True,
         help_text="Geographic location of the POI"
     )
+    # Geodesic copy of location for radius searches (see SpatialQuerySet.within)
+    location_geography = models.GeneratedField(
+        expression=Cast('location', models.PointField(srid=4326, geography=True)),
+        output_field=models.PointField(srid=4326, geography=True),
+        db_persist=True,
+    )
     
     # NEW: Additional metadata
     description = models.TextField(
@@ -195,7 +358,11 @@ class POI(models.Model):
     )
     
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    
+    GEOGRAPHY = 'location_geography'
+    DEFERRED_FIELDS = ('location_geography',)
+    objects = SpatialManager()
     
     def __str__(self):
         return f"{self.name} ({self.get_type_display()})"
@@ -204,3 +371,197 @@ class POI(models.Model):
         ordering = ['name']
         verbose_name = "Point of Interest"
         verbose_name_plural = "Points of Interest"
+        constraints = [
+            # Upsert key for imports (see osm.py); manual rows have no source_id
+            models.UniqueConstraint(
+                fields=['source', 'source_id'],
+                condition=~models.Q(source_id=''),
+                name='poi_unique_source_id',
+            ),
+        ]
+        indexes = [
+            GistIndex(fields=['location_geography'], name='poi_location_geography'),
+        ]
+
+
+class ParkBoundaryPart(models.Model):
+    """
+    A piece of a park boundary cut by ST_Subdivide (see membership.py).
+    Containment and intersection tests run against these small, tightly
+    indexed polygons instead of the full, detailed boundary.
+    """
+    park = models.ForeignKey(
+        Park,
+        on_delete=models.CASCADE,
+        related_name='boundary_parts'
+    )
+    geom = models.PolygonField(srid=4326)
+    
+    def __str__(self):
+        return f"Boundary part of park {self.park_id}"
+
+
+class TrailParkMembership(models.Model):
+    """
+    Parks a trail's path runs through, derived from the boundaries (see
+    membership.py). ``Trail.park`` remains the park a trail is assigned to.
+    """
+    trail = models.ForeignKey(
+        Trail,
+        on_delete=models.CASCADE,
+        related_name='park_memberships'
+    )
+    park = models.ForeignKey(
+        Park,
+        on_delete=models.CASCADE,
+        related_name='trail_memberships'
+    )
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trail', 'park'], name='trail_park_membership_unique'),
+        ]
+
+
+class POIParkMembership(models.Model):
+    """Parks whose boundary contains a POI (see membership.py)"""
+    poi = models.ForeignKey(
+        POI,
+        on_delete=models.CASCADE,
+        related_name='park_memberships'
+    )
+    park = models.ForeignKey(
+        Park,
+        on_delete=models.CASCADE,
+        related_name='poi_memberships'
+    )
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['poi', 'park'], name='poi_park_membership_unique'),
+        ]
+
+
+class ParkStats(models.Model):
+    """
+    Per-park aggregates of its trails and POIs (assigned through the
+    ``park`` foreign keys), kept as a table and refreshed one park at a
+    time when its trails or POIs change (see stats.py).
+    """
+    park = models.OneToOneField(
+        Park,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    trail_count = models.PositiveIntegerField(default=0)
+    total_length_km = models.FloatField(default=0)
+    mean_length_km = models.FloatField(null=True)
+    total_elevation_gain_m = models.FloatField(default=0)
+    difficulty_counts = models.JSONField(
+        default=dict,
+        help_text="Number of trails per difficulty"
+    )
+    poi_counts = models.JSONField(
+        default=dict,
+        help_text="Number of POIs per type"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Stats of park {self.park_id}"
+
+
+class TrailAccessPoint(models.Model):
+    """
+    The nearest parking, trailhead or toilets POI to one end of a trail,
+    precomputed for every trail in one spatial join (see access.py) so trail
+    detail responses don't run a KNN search each time.
+    """
+    trail = models.ForeignKey(
+        Trail,
+        on_delete=models.CASCADE,
+        related_name='access_points'
+    )
+    endpoint = models.CharField(
+        max_length=5,
+        choices=[
+            ('start', 'Start'),
+            ('end', 'End')
+        ]
+    )
+    type = models.CharField(
+        max_length=50,
+        help_text="POI type (see access.ACCESS_TYPES)"
+    )
+    poi = models.ForeignKey(
+        POI,
+        on_delete=models.CASCADE,
+        related_name='trail_access_points'
+    )
+    distance_m = models.FloatField(
+        help_text="Geodesic distance from the trail end to the POI in meters"
+    )
+    
+    def __str__(self):
+        return f"Nearest {self.type} to the {self.endpoint} of trail {self.trail_id}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['trail', 'endpoint', 'type'], name='trail_access_point_unique'
+            ),
+        ]
+
+
+class TrailProfile(models.Model):
+    """
+    Elevation profile of a trail sampled from a DEM (see elevation.py).
+    Kept out of the Trail row so list/GeoJSON queries don't carry it.
+    ``path_hash`` is the md5 of the path it was computed from, so unchanged
+    trails are skipped on the next enrichment run.
+    """
+    trail = models.OneToOneField(
+        Trail,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile'
+    )
+    spacing_m = models.FloatField(
+        help_text="Distance between consecutive profile samples in meters"
+    )
+    elevations = models.JSONField(
+        help_text="Elevation in meters every spacing_m along the trail"
+    )
+    elevation_gain_m = models.FloatField()
+    elevation_loss_m = models.FloatField()
+    max_gradient_pct = models.FloatField(
+        help_text="Steepest gradient over any 100 m stretch, in percent"
+    )
+    path_hash = models.CharField(max_length=32)
+    dem = models.CharField(
+        max_length=255,
+        blank=True,
+        help_text="DEM file the profile was sampled from"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Profile of {self.trail.name}"
+
+
+class ModelVersion(models.Model):
+    """
+    Write counter of a model's table, incremented in the transaction of
+    every write to it (see conditional.py). Unlike max(updated_at) it moves
+    on every commit, whichever clock stamped the rows.
+    """
+    model = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="Model label, e.g. 'mtb_trails.Trail'"
+    )
+    version = models.BigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.model} v{self.version}"
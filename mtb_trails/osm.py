@@ -0,0 +1,279 @@
+"""
+Streaming OpenStreetMap importer (used by ``manage.py import_osm``).
+
+Reads a local ``.osm`` / ``.osm.pbf`` extract with pyosmium in two passes:
+
+1. relations only: collect the member ways of ``route=mtb`` relations;
+2. everything: keep the geometry of just those ways, turn MTB route
+   relations into Trails, ``leisure=park`` areas into Parks and amenity
+   (and a few related) nodes into POIs.
+
+Rows are written in batches: each batch is COPYed into a temporary table
+and upserted on ``(source, source_id)`` in one statement, one transaction
+per batch. Rows whose values did not change are left alone, so re-running
+an import only touches (and bumps ``updated_at`` on) what changed in OSM.
+Memory is bounded by the batch size, the node location cache (see
+``--node-cache``) and the MTB route member ways.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+
+from django.contrib.gis.geos import GEOSGeometry, LineString, MultiLineString, Point
+from django.db import connection, transaction
+
+from .models import Trail, POI, Park
+
+try:
+    import osmium
+except ImportError:  # only needed by import_osm
+    osmium = None
+
+SOURCE = 'osm'
+DEFAULT_BATCH_SIZE = 5000
+NAME_LENGTH = 100
+
+# (key, value) -> POI.type. Amenity nodes plus the other tags that map onto
+# the existing POI types; anything else (benches, bins, ...) is skipped.
+POI_TYPES = {
+    ('amenity', 'parking'): 'parking',
+    ('amenity', 'cafe'): 'cafe',
+    ('amenity', 'restaurant'): 'cafe',
+    ('amenity', 'pub'): 'cafe',
+    ('amenity', 'toilets'): 'toilets',
+    ('amenity', 'drinking_water'): 'water',
+    ('amenity', 'shelter'): 'rest_area',
+    ('amenity', 'bicycle_repair_station'): 'bike_shop',
+    ('shop', 'bicycle'): 'bike_shop',
+    ('tourism', 'viewpoint'): 'viewpoint',
+    ('highway', 'trailhead'): 'trailhead',
+}
+# Unnamed POIs are called after their type ("Parking")
+POI_TYPE_LABELS = dict(POI._meta.get_field('type').choices)
+
+# mtb:scale:imba (0-4) and mtb:scale (0-6) -> Trail.difficulty
+IMBA_DIFFICULTY = ['beginner', 'beginner', 'intermediate', 'expert', 'expert']
+MTB_SCALE_DIFFICULTY = ['beginner', 'beginner', 'intermediate', 'intermediate',
+                        'expert', 'expert', 'expert']
+DEFAULT_DIFFICULTY = 'intermediate'
+
+
+def _number(value):
+    try:
+        return float(str(value).split()[0].rstrip('m'))
+    except (ValueError, IndexError):
+        return None
+
+
+def trail_difficulty(tags):
+    for key, scale in (('mtb:scale:imba', IMBA_DIFFICULTY), ('mtb:scale', MTB_SCALE_DIFFICULTY)):
+        value = _number(tags.get(key, ''))
+        if value is not None and 0 <= value < len(scale):
+            return scale[int(value)]
+    return DEFAULT_DIFFICULTY
+
+
+def poi_type(tags):
+    for (key, value), type_ in POI_TYPES.items():
+        if tags.get(key) == value:
+            return type_
+    return None
+
+
+def _name(tags, fallback):
+    return (tags.get('name') or fallback)[:NAME_LENGTH]
+
+
+@dataclass
+class Upsert:
+    """
+    How one model is written: the columns COPYed from Python and extra
+    columns computed in SQL from them. Rows conflict on (source, source_id).
+    """
+    model: type
+    columns: list
+    computed: dict = field(default_factory=dict)
+    # Set on insert only; enrichment jobs own these values afterwards
+    insert_only: list = field(default_factory=list)
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def sql(self, stage):
+        data_columns = [
+            c for c in self.columns if c != 'source_id' and c not in self.insert_only
+        ] + list(self.computed)
+        insert_columns = self.columns + list(self.computed) + ['source', 'created_at', 'updated_at']
+        select = self.columns + list(self.computed.values()) + ['%s', 'statement_timestamp()', 'statement_timestamp()']
+        changed = ', '.join(f't.{column}' for column in data_columns)
+        excluded = ', '.join(f'EXCLUDED.{column}' for column in data_columns)
+        updates = ', '.join(
+            f'{column} = EXCLUDED.{column}' for column in data_columns + ['updated_at']
+        )
+        return f"""
+            INSERT INTO {self.table} AS t ({', '.join(insert_columns)})
+            SELECT {', '.join(select)}
+            FROM (SELECT DISTINCT ON (source_id) * FROM {stage}) s
+            ON CONFLICT (source, source_id) WHERE source_id <> '' DO UPDATE
+            SET {updates}
+            WHERE ({changed}) IS DISTINCT FROM ({excluded})
+            RETURNING (xmax = 0) AS inserted
+        """
+
+    def write(self, rows):
+        """Upsert ``rows`` (tuples in ``columns`` order); return (inserted, updated)"""
+        stage = f'{self.table}_import'
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Same column types as the target table, none of its constraints.
+            # (Dropped first in case an outer transaction is still open.)
+            cursor.execute(f"DROP TABLE IF EXISTS {stage}")
+            cursor.execute(
+                f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS "
+                f"SELECT {', '.join(self.columns)} FROM {self.table} WITH NO DATA"
+            )
+            cursor.copy_expert(
+                f"COPY {stage} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+            cursor.execute(self.sql(stage), [SOURCE])
+            results = [inserted for inserted, in cursor.fetchall()]
+        inserted = sum(results)
+        return inserted, len(results) - inserted
+
+
+UPSERTS = {
+    Trail: Upsert(
+        Trail,
+        ['source_id', 'name', 'difficulty', 'elevation_gain_m', 'description', 'path'],
+        computed={'length_km': 'ST_Length(s.path::geography) / 1000'},
+        insert_only=['elevation_gain_m'],  # see elevation.py
+    ),
+    Park: Upsert(Park, ['source_id', 'name', 'description', 'boundary']),
+    POI: Upsert(POI, ['source_id', 'name', 'type', 'description', 'location']),
+}
+
+
+def database_now():
+    """The database clock, to compare with the updated_at values we write"""
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT statement_timestamp()')
+        return cursor.fetchone()[0]
+
+
+class BatchWriter:
+    """Collects rows per model and upserts them every ``batch_size`` rows"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.rows = {model: [] for model in UPSERTS}
+        self.stats = {model: {'read': 0, 'inserted': 0, 'updated': 0} for model in UPSERTS}
+
+    def add(self, model, row):
+        self.rows[model].append(row)
+        self.stats[model]['read'] += 1
+        if len(self.rows[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for model in [model] if model else list(self.rows):
+            rows, self.rows[model] = self.rows[model], []
+            if rows and not self.dry_run:
+                inserted, updated = UPSERTS[model].write(rows)
+                self.stats[model]['inserted'] += inserted
+                self.stats[model]['updated'] += updated
+
+    def changed_models(self):
+        return [
+            model for model, stats in self.stats.items()
+            if stats['inserted'] or stats['updated']
+        ]
+
+
+def mtb_route_ways(path):
+    """Pass 1: ids of the ways that are members of MTB route relations"""
+    way_ids = set()
+    relations = osmium.FileProcessor(path, osmium.osm.RELATION).with_filter(
+        osmium.filter.TagFilter(('route', 'mtb'))
+    )
+    for relation in relations:
+        way_ids.update(member.ref for member in relation.members if member.type == 'w')
+    return way_ids
+
+
+def _route_path(member_refs, ways):
+    """Merge a route's member ways into one LineString (longest part if split)"""
+    lines = [LineString(ways[ref], srid=4326) for ref in member_refs if ref in ways]
+    if not lines:
+        return None
+    merged = MultiLineString(*lines, srid=4326).merged
+    if merged.geom_type == 'MultiLineString':
+        merged = max(merged, key=lambda line: line.length)
+    return merged
+
+
+def _largest_polygon(wkb):
+    geometry = GEOSGeometry(wkb, srid=4326)
+    if geometry.geom_type == 'MultiPolygon':
+        geometry = max(geometry, key=lambda polygon: polygon.area)
+    return geometry
+
+
+def import_osm(path, writer, node_cache='flex_mem'):
+    """Stream ``path`` into ``writer`` (a BatchWriter) and flush it"""
+    if osmium is None:
+        raise RuntimeError('import_osm needs pyosmium: pip install osmium')
+
+    route_way_ids = mtb_route_ways(path)
+    ways = {}
+    wkb = osmium.geom.WKBFactory()
+
+    processor = (
+        osmium.FileProcessor(path)
+        .with_locations(node_cache)
+        .with_areas(osmium.filter.TagFilter(('leisure', 'park')))
+    )
+    for obj in processor:
+        tags = obj.tags
+        if obj.is_node():
+            type_ = poi_type(tags)
+            if type_:
+                writer.add(POI, (
+                    f'node/{obj.id}', _name(tags, POI_TYPE_LABELS[type_]),
+                    type_, tags.get('description', ''),
+                    Point(obj.location.lon, obj.location.lat, srid=4326).hexewkb.decode(),
+                ))
+        elif obj.is_way():
+            if obj.id in route_way_ids:
+                try:
+                    coords = [(node.lon, node.lat) for node in obj.nodes]
+                except osmium.InvalidLocationError:  # cut off by the extract
+                    continue
+                if len(coords) >= 2:
+                    ways[obj.id] = coords
+        elif obj.is_relation():
+            if tags.get('route') == 'mtb':
+                route = _route_path([m.ref for m in obj.members if m.type == 'w'], ways)
+                if route is not None:
+                    writer.add(Trail, (
+                        f'relation/{obj.id}', _name(tags, f'MTB route {obj.id}'),
+                        trail_difficulty(tags), _number(tags.get('ascent', '')) or 0,
+                        tags.get('description', ''), route.hexewkb.decode(),
+                    ))
+        elif obj.is_area():
+            if tags.get('leisure') == 'park' and tags.get('name'):
+                try:
+                    boundary = _largest_polygon(wkb.create_multipolygon(obj))
+                except RuntimeError:  # broken multipolygon in the source data
+                    continue
+                kind = 'way' if obj.from_way() else 'relation'
+                writer.add(Park, (
+                    f'{kind}/{obj.orig_id()}', _name(tags, ''),
+                    tags.get('description', ''), boundary.hexewkb.decode(),
+                ))
+    writer.flush()
+    return writer
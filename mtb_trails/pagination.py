@@ -0,0 +1,40 @@
+"""
+Keyset pagination for the GeoJSON list endpoints.
+"""
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class GeoJsonCursorPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination on ``id``, rendered as a FeatureCollection.
+
+    Each page is ``WHERE id > <last id> ORDER BY id LIMIT n`` after the
+    view's filters (bbox, distance, ...), so page 1000 costs the same as
+    page 1, unlike OFFSET pagination. ``?page_size=`` is capped at
+    ``API_MAX_PAGE_SIZE``.
+    """
+    ordering = 'id'
+    page_size = getattr(settings, 'API_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 1000)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('type', 'FeatureCollection'),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('features', data['features']),
+        ]))
+
+    def get_paginated_response_schema(self, view):
+        schema = super().get_paginated_response_schema(view)
+        schema['properties']['features'] = schema['properties'].pop('results')
+        schema['properties'] = {
+            'type': {'type': 'string', 'enum': ['FeatureCollection']},
+            **schema['properties'],
+        }
+        return schema
@@ -0,0 +1,91 @@
+"""
+Binary feature formats: FlatGeobuf and Geobuf.
+
+Picked like any DRF format, with ``?format=fgb`` / ``?format=geobuf`` or the
+``Accept`` header, on the trail, park and POI lists and the ``*_geojson``
+endpoints. Those views hand their filtered queryset to ``encode_features``
+and PostGIS encodes it in a single query (``ST_AsFlatGeobuf`` /
+``ST_AsGeobuf``), from the same columns as the GeoJSON features (see
+FeatureLayout.binary_columns), so no serializer or GEOS object is involved.
+Coordinates go out as binary doubles (FlatGeobuf) or delta-encoded varints
+(Geobuf) instead of decimal text.
+
+FlatGeobuf output includes its packed Hilbert R-tree index, so a saved
+``.fgb`` can be queried by bbox with HTTP range requests. Responses that are
+not features (errors, POI clusters) are still sent as JSON.
+
+``TopoJSONRenderer`` only selects ``?format=topojson``; the views build the
+topology themselves (topojson.py).
+"""
+from django.db import connection
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+
+class BinaryFeatureRenderer(BaseRenderer):
+    """Passes through bytes from encode_features(); anything else goes out as JSON"""
+    charset = None
+    render_style = 'binary'
+    # Aggregates the rows of the {features} subquery into one value
+    sql = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, memoryview)):
+            return bytes(data)
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = JSONRenderer.media_type
+        return JSONRenderer().render(data, JSONRenderer.media_type, renderer_context)
+
+
+class FlatGeobufRenderer(BinaryFeatureRenderer):
+    media_type = 'application/flatgeobuf'
+    format = 'fgb'
+    # true: write the spatial index
+    sql = "SELECT ST_AsFlatGeobuf(f, true, 'geom') FROM ({features}) AS f"
+
+
+class GeobufRenderer(BinaryFeatureRenderer):
+    media_type = 'application/x-protobuf'
+    format = 'geobuf'
+    sql = "SELECT ST_AsGeobuf(f, 'geom') FROM ({features}) AS f"
+
+
+class TopoJSONRenderer(JSONRenderer):
+    """?format=topojson, for the views that build a Topology (see topojson.py)"""
+    format = 'topojson'
+
+
+# Renderers of the views that serve features in every format
+FEATURE_RENDERERS = list(api_settings.DEFAULT_RENDERER_CLASSES) + [FlatGeobufRenderer, GeobufRenderer]
+# ... and of those that can also send a TopoJSON topology
+TOPOLOGY_RENDERERS = FEATURE_RENDERERS + [TopoJSONRenderer]
+
+
+def binary_renderer(request):
+    """The negotiated renderer of a DRF request if it is a binary one, else None"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer if isinstance(renderer, BinaryFeatureRenderer) else None
+
+
+def wants_topojson(request):
+    return isinstance(getattr(request, 'accepted_renderer', None), TopoJSONRenderer)
+
+
+# Django selects geometries as EWKB bytea; turn the column back into a geometry
+FEATURES_SQL = "SELECT {properties}, ST_GeomFromEWKB(q.geom) AS geom FROM ({query}) AS q ({columns})"
+
+
+def encode_features(renderer, queryset, layout, level=None):
+    """The rows of ``queryset`` encoded by PostGIS in ``renderer``'s format"""
+    columns, lookups = layout.binary_columns(level)
+    query, params = queryset.values(*lookups).query.sql_with_params()
+    quoted = [connection.ops.quote_name(column) for column in columns]
+    features = FEATURES_SQL.format(
+        properties=', '.join(f'q.{column}' for column in quoted[:-1]),
+        query=query, columns=', '.join(quoted),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(renderer.sql.format(features=features), params)
+        row = cursor.fetchone()
+    return bytes(row[0]) if row and row[0] is not None else b''
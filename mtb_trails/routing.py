@@ -0,0 +1,566 @@
+"""
+Route and loop planning on the trail network.
+
+Trails are noded where they cross or touch (within ``SNAP_M``) into a graph
+whose edges are the stretches of trail between junctions. The graph lives in
+process memory in compressed sparse row form: ``indptr[n]:indptr[n + 1]``
+indexes node ``n``'s neighbours in ``adj_node``/``adj_edge``, and per-edge
+values (trail, fractions along it, length, difficulty) sit in parallel
+arrays. Dijkstra over those arrays answers a route in milliseconds.
+
+Every request compares the Trail table version (row count and newest
+``updated_at``, see conditional.py) with the one the graph was built from.
+When it moved, only the junctions of the trails that changed are recomputed
+in PostGIS; everything else is reused and the arrays are rebuilt from them.
+
+A route is returned as pieces ``(trail id, from fraction, to fraction)``
+whose geometry is cut from ``Trail.path`` with ST_LineSubstring.
+"""
+import heapq
+import json
+import math
+import threading
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import connection
+
+from .conditional import data_version
+from .models import Trail
+
+# Trail ends and crossings closer than this are one junction
+SNAP_M = 10
+# Waypoints further than this from any (allowed) trail are rejected
+MAX_SNAP_M = 2000
+MAX_WAYPOINTS = 10
+MAX_LOOP_KM = 200
+METERS_PER_DEGREE = 111_320
+
+# Loop planning: turnaround candidates lie between these fractions of the
+# target distance from the start; the return leg pays this factor on
+# stretches already ridden on the way out
+LOOP_TURNAROUND = (0.15, 0.5)
+LOOP_CANDIDATES = 24
+REUSE_PENALTY = 4
+
+DIFFICULTIES = [value for value, _ in Trail._meta.get_field('difficulty').choices]
+DIFFICULTY_RANK = {difficulty: rank for rank, difficulty in enumerate(DIFFICULTIES)}
+
+
+class RoutingError(ValueError):
+    pass
+
+
+class RouteNotFound(RoutingError):
+    pass
+
+
+@dataclass
+class TrailInfo:
+    difficulty: int
+    length_m: float
+    updated_at: object
+    ends: tuple  # ((x, y) at fraction 0, (x, y) at fraction 1)
+
+
+@dataclass
+class Location:
+    """A point snapped onto the graph: a position along one edge"""
+    trail_id: int
+    fraction: float
+    edge: int
+    snap_m: float
+
+
+@dataclass
+class Route:
+    pieces: list  # [(trail_id, from fraction, to fraction)]
+    lengths: list  # meters, per piece
+    distance_m: float
+    extra: dict = field(default_factory=dict)
+
+
+def _cluster(points):
+    """Node id for each (x, y) in ``points``; points within SNAP_M share one"""
+    parent = list(range(len(points)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # Local metric coordinates, bucketed into SNAP_M cells
+    projected = [
+        (x * math.cos(math.radians(y)) * METERS_PER_DEGREE, y * METERS_PER_DEGREE)
+        for x, y in points
+    ]
+    cells = defaultdict(list)
+    for i, (px, py) in enumerate(projected):
+        cells[(math.floor(px / SNAP_M), math.floor(py / SNAP_M))].append(i)
+    for (cx, cy), members in cells.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in cells.get((cx + dx, cy + dy), ()):
+                    for i in members:
+                        if i < j and math.dist(projected[i], projected[j]) <= SNAP_M:
+                            parent[find(i)] = find(j)
+    roots = {}
+    return [roots.setdefault(find(i), len(roots)) for i in range(len(points))]
+
+
+class Graph:
+    """Immutable CSR graph built from per-trail junction points"""
+
+    def __init__(self, trails, junctions):
+        # A copy: Network updates its dict in place for the next graph while
+        # other threads still route on this one
+        trails = dict(trails)
+        points, stations = [], []
+        for trail_id, info in trails.items():
+            trail_points = [(0.0, info.ends[0]), (1.0, info.ends[1])]
+            for partner_points in junctions.get(trail_id, {}).values():
+                trail_points += [(fraction, (x, y)) for fraction, x, y in partner_points]
+            for fraction, xy in trail_points:
+                stations.append((trail_id, min(max(fraction, 0.0), 1.0), len(points)))
+                points.append(xy)
+        nodes = _cluster(points)
+        node_count = len(set(nodes))
+
+        by_trail = defaultdict(list)
+        for trail_id, fraction, index in stations:
+            by_trail[trail_id].append((fraction, nodes[index]))
+
+        edges = []
+        self.trail_edges = {}
+        for trail_id, trail_stations in by_trail.items():
+            trail_stations.sort()
+            trail_edges = []
+            previous_fraction, previous_node = trail_stations[0]
+            for fraction, node in trail_stations[1:]:
+                if node == previous_node:
+                    # Same junction (or a stretch shorter than SNAP_M): move along
+                    previous_fraction = fraction
+                    continue
+                if fraction > previous_fraction:
+                    trail_edges.append((previous_fraction, fraction, previous_node, node))
+                previous_fraction, previous_node = fraction, node
+            if not trail_edges and trail_stations[-1][0] > trail_stations[0][0]:
+                # A closed loop with no junctions: split it at half way
+                middle = node_count
+                node_count += 1
+                start = trail_stations[0][1]
+                trail_edges = [(0.0, 0.5, start, middle), (0.5, 1.0, middle, start)]
+            first = len(edges)
+            edges += [(trail_id, *edge) for edge in trail_edges]
+            self.trail_edges[trail_id] = (
+                [edge[0] for edge in trail_edges], list(range(first, len(edges))),
+            )
+
+        self.node_count = node_count
+        self.trails = trails
+        self.edge_trail = array('q', [edge[0] for edge in edges])
+        self.edge_from = array('d', [edge[1] for edge in edges])
+        self.edge_to = array('d', [edge[2] for edge in edges])
+        self.edge_u = array('q', [edge[3] for edge in edges])
+        self.edge_v = array('q', [edge[4] for edge in edges])
+        self.edge_length = array('d', [
+            trails[edge[0]].length_m * (edge[2] - edge[1]) for edge in edges
+        ])
+        self.edge_rank = array('b', [trails[edge[0]].difficulty for edge in edges])
+
+        degree = [0] * (node_count + 1)
+        for edge in edges:
+            degree[edge[3] + 1] += 1
+            degree[edge[4] + 1] += 1
+        for n in range(node_count):
+            degree[n + 1] += degree[n]
+        self.indptr = array('q', degree)
+        self.adj_node = array('q', [0]) * len(edges) * 2
+        self.adj_edge = array('q', [0]) * len(edges) * 2
+        fill = list(degree[:-1])
+        for e, edge in enumerate(edges):
+            for a, b in ((edge[3], edge[4]), (edge[4], edge[3])):
+                self.adj_node[fill[a]] = b
+                self.adj_edge[fill[a]] = e
+                fill[a] += 1
+
+    @property
+    def edge_count(self):
+        return len(self.edge_trail)
+
+    def edge_at(self, trail_id, fraction):
+        if trail_id not in self.trail_edges:
+            return None
+        starts, edge_ids = self.trail_edges[trail_id]
+        if not edge_ids:
+            return None
+        return edge_ids[max(bisect_right(starts, fraction) - 1, 0)]
+
+    def node_fraction(self, edge, node):
+        return self.edge_from[edge] if self.edge_u[edge] == node else self.edge_to[edge]
+
+    def location_ends(self, location):
+        """{node: meters from the location} for the two ends of its edge"""
+        e = location.edge
+        span = self.edge_to[e] - self.edge_from[e]
+        offset = min(max(location.fraction, self.edge_from[e]), self.edge_to[e])
+        length = self.edge_length[e]
+        return {
+            self.edge_u[e]: length * (offset - self.edge_from[e]) / span,
+            self.edge_v[e]: length * (self.edge_to[e] - offset) / span,
+        }
+
+    def shortest_paths(self, sources, max_rank, targets=(), penalties=None):
+        """
+        Dijkstra from ``sources`` ({node: initial cost}) over edges no harder
+        than ``max_rank``. Returns (cost, previous) where previous[node] is
+        (node, edge); stops once every node in ``targets`` is settled.
+        """
+        indptr, adj_node, adj_edge = self.indptr, self.adj_node, self.adj_edge
+        edge_length, edge_rank = self.edge_length, self.edge_rank
+        cost = dict(sources)
+        previous = {}
+        heap = [(c, n) for n, c in sources.items()]
+        heapq.heapify(heap)
+        remaining = set(targets)
+        settled = set()
+        while heap:
+            c, n = heapq.heappop(heap)
+            if n in settled:
+                continue
+            settled.add(n)
+            remaining.discard(n)
+            if targets and not remaining:
+                break
+            for k in range(indptr[n], indptr[n + 1]):
+                e = adj_edge[k]
+                if edge_rank[e] > max_rank:
+                    continue
+                weight = edge_length[e]
+                if penalties and e in penalties:
+                    weight *= penalties[e]
+                m = adj_node[k]
+                new_cost = c + weight
+                if new_cost < cost.get(m, math.inf):
+                    cost[m] = new_cost
+                    previous[m] = (n, e)
+                    heapq.heappush(heap, (new_cost, m))
+        return cost, previous
+
+    def walk(self, previous, node):
+        """(first node, [(from node, edge)]) of the path Dijkstra found to ``node``"""
+        steps = []
+        while node in previous:
+            before, e = previous[node]
+            steps.append((before, e))
+            node = before
+        steps.reverse()
+        return node, steps
+
+    def edge_pieces(self, steps):
+        pieces = []
+        for node, e in steps:
+            if self.edge_u[e] == node:
+                pieces.append((self.edge_trail[e], self.edge_from[e], self.edge_to[e]))
+            else:
+                pieces.append((self.edge_trail[e], self.edge_to[e], self.edge_from[e]))
+        return pieces
+
+    def piece_length(self, piece):
+        trail_id, start, end = piece
+        return self.trails[trail_id].length_m * abs(end - start)
+
+
+def _merge(pieces):
+    """Drop empty pieces and join consecutive ones along the same trail"""
+    merged = []
+    for trail_id, start, end in pieces:
+        if start == end:
+            continue
+        if merged and merged[-1][0] == trail_id and merged[-1][2] == start:
+            merged[-1] = (trail_id, merged[-1][1], end)
+        else:
+            merged.append((trail_id, start, end))
+    return merged
+
+
+class Network:
+    """The process-wide graph, refreshed from the Trail table on demand"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.trails = {}
+        # trail id -> {partner trail id: [(fraction, x, y)]}
+        self.junctions = defaultdict(dict)
+        self.graph = None
+
+    def current(self):
+        # Moves on every committed Trail write, whatever clock stamped it
+        version = data_version(Trail)
+        if version == self.version and self.graph is not None:
+            return self.graph
+        with self.lock:
+            if version != self.version or self.graph is None:
+                self._update()
+                self.graph = Graph(self.trails, self.junctions)
+                self.version = version
+            return self.graph
+
+    def _update(self):
+        current = dict(Trail.objects.order_by().values_list('id', 'updated_at'))
+        changed = [
+            trail_id for trail_id, updated_at in current.items()
+            if trail_id not in self.trails or self.trails[trail_id].updated_at != updated_at
+        ]
+        for trail_id in set(changed) | (set(self.trails) - set(current)):
+            self.trails.pop(trail_id, None)
+            for partner in self.junctions.pop(trail_id, {}):
+                self.junctions[partner].pop(trail_id, None)
+        if not changed:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(TRAILS_SQL, [changed])
+            for trail_id, difficulty, length_m, x0, y0, x1, y1 in cursor.fetchall():
+                self.trails[trail_id] = TrailInfo(
+                    DIFFICULTY_RANK.get(difficulty, len(DIFFICULTIES)), length_m or 0.0,
+                    current[trail_id], ((x0, y0), (x1, y1)),
+                )
+            cursor.execute(JUNCTIONS_SQL, {'ids': changed, 'snap': SNAP_M})
+            changed = set(changed)
+            pairs = defaultdict(list)
+            for a, b, fraction_a, fraction_b, x, y in cursor.fetchall():
+                # Pairs of two changed trails come back from both sides
+                if b in changed and b < a:
+                    continue
+                pairs[a, b].append((fraction_a, fraction_b, x, y))
+        for (a, b), points in pairs.items():
+            if a not in self.trails or b not in self.trails:
+                continue  # written since the id list was read
+            self.junctions[a][b] = [(fa, x, y) for fa, _, x, y in points]
+            self.junctions[b][a] = [(fb, x, y) for _, fb, x, y in points]
+
+
+TRAILS_SQL = f"""
+    SELECT id, difficulty, ST_Length(path_geography),
+           ST_X(ST_StartPoint(path)), ST_Y(ST_StartPoint(path)),
+           ST_X(ST_EndPoint(path)), ST_Y(ST_EndPoint(path))
+    FROM {Trail._meta.db_table}
+    WHERE id = ANY(%s)
+"""
+
+# Junction points between each trail in ids and any other trail: crossings,
+# plus ends of either trail that stop within the snap distance of the other.
+# Returns the fraction of the point along both trails.
+JUNCTIONS_SQL = f"""
+    SELECT a.id, b.id, ST_LineLocatePoint(a.path, j.geom), ST_LineLocatePoint(b.path, j.geom),
+           ST_X(j.geom), ST_Y(j.geom)
+    FROM {Trail._meta.db_table} a
+    JOIN {Trail._meta.db_table} b
+      ON b.id <> a.id AND ST_DWithin(a.path_geography, b.path_geography, %(snap)s)
+    CROSS JOIN LATERAL (
+        SELECT (ST_DumpPoints(ST_Intersection(a.path, b.path))).geom
+        UNION ALL
+        SELECT ST_ClosestPoint(a.path, e.point)
+        FROM (VALUES (ST_StartPoint(b.path)), (ST_EndPoint(b.path))) AS e(point)
+        WHERE ST_DWithin(a.path_geography, e.point::geography, %(snap)s)
+        UNION ALL
+        SELECT ST_ClosestPoint(b.path, e.point)
+        FROM (VALUES (ST_StartPoint(a.path)), (ST_EndPoint(a.path))) AS e(point)
+        WHERE ST_DWithin(b.path_geography, e.point::geography, %(snap)s)
+    ) AS j(geom)
+    WHERE a.id = ANY(%(ids)s)
+"""
+
+# Nearest allowed trail to each waypoint (KNN on the path GiST index)
+LOCATE_SQL = f"""
+    SELECT w.i, t.id, ST_LineLocatePoint(t.path, w.point),
+           ST_Distance(t.path_geography, w.point::geography)
+    FROM (
+        SELECT i, ST_SetSRID(ST_MakePoint(x, y), 4326) AS point
+        FROM unnest(%s::int[], %s::float8[], %s::float8[]) AS p(i, x, y)
+    ) w
+    CROSS JOIN LATERAL (
+        SELECT id, path, path_geography FROM {Trail._meta.db_table}
+        WHERE difficulty = ANY(%s)
+        ORDER BY path <-> w.point
+        LIMIT 1
+    ) t
+"""
+
+PIECES_SQL = f"""
+    SELECT p.i, t.id, t.name, t.difficulty, ST_AsGeoJSON(
+        CASE WHEN p.start <= p.finish THEN ST_LineSubstring(t.path, p.start, p.finish)
+             ELSE ST_Reverse(ST_LineSubstring(t.path, p.finish, p.start)) END, 6
+    )
+    FROM unnest(%s::int[], %s::bigint[], %s::float8[], %s::float8[]) AS p(i, trail_id, start, finish)
+    JOIN {Trail._meta.db_table} t ON t.id = p.trail_id
+    ORDER BY p.i
+"""
+
+_network = Network()
+
+
+def current_graph():
+    return _network.current()
+
+
+def parse_latlng(value, name):
+    """A WGS84 (lng, lat) tuple from a "lat,lng" query parameter"""
+    try:
+        lat, lng = (float(part) for part in (value or '').split(','))
+    except ValueError:
+        raise RoutingError(f'{name} must be "lat,lng"')
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise RoutingError(f'{name} is out of range')
+    return lng, lat
+
+
+def parse_max_difficulty(value):
+    """Rank of the hardest allowed difficulty (default: no limit)"""
+    if not value:
+        return len(DIFFICULTIES) - 1
+    if value not in DIFFICULTY_RANK:
+        raise RoutingError(f"max_difficulty must be one of {', '.join(DIFFICULTIES)}")
+    return DIFFICULTY_RANK[value]
+
+
+def locate(graph, points, max_rank, names):
+    """Snap each (lng, lat) in ``points`` onto the nearest allowed trail"""
+    allowed = DIFFICULTIES[:max_rank + 1]
+    with connection.cursor() as cursor:
+        cursor.execute(LOCATE_SQL, [
+            list(range(len(points))), [x for x, _ in points], [y for _, y in points], allowed,
+        ])
+        found = {i: (trail_id, fraction, distance) for i, trail_id, fraction, distance in cursor.fetchall()}
+    locations = []
+    for i, name in enumerate(names):
+        trail_id, fraction, distance = found.get(i, (None, None, math.inf))
+        edge = graph.edge_at(trail_id, fraction) if trail_id is not None else None
+        if edge is None or distance > MAX_SNAP_M:
+            raise RouteNotFound(f'No trail within {MAX_SNAP_M} m of {name}')
+        locations.append(Location(trail_id, fraction, edge, distance))
+    return locations
+
+
+def _leg(graph, start, end, max_rank):
+    """Pieces and length of the shortest way from one Location to another"""
+    sources = graph.location_ends(start)
+    targets = graph.location_ends(end)
+    cost, previous = graph.shortest_paths(sources, max_rank, targets=targets)
+    reachable = [(cost[n] + extra, n) for n, extra in targets.items() if n in cost]
+    best = min(reachable) if reachable else None
+
+    if start.edge == end.edge:
+        direct = graph.piece_length((start.trail_id, start.fraction, end.fraction))
+        if best is None or direct <= best[0]:
+            return [(start.trail_id, start.fraction, end.fraction)], direct
+    if best is None:
+        raise RouteNotFound('No route between these points on trails of the allowed difficulty')
+
+    length, last = best
+    first, steps = graph.walk(previous, last)
+    pieces = [(start.trail_id, start.fraction, graph.node_fraction(start.edge, first))]
+    pieces += graph.edge_pieces(steps)
+    pieces.append((end.trail_id, graph.node_fraction(end.edge, last), end.fraction))
+    return pieces, length
+
+
+def plan_route(waypoints, max_rank):
+    """Shortest route through ``waypoints`` ((lng, lat) tuples, in order)"""
+    if len(waypoints) > MAX_WAYPOINTS:
+        raise RoutingError(f'At most {MAX_WAYPOINTS} waypoints')
+    graph = current_graph()
+    names = ['from'] + [f'via #{i}' for i in range(1, len(waypoints) - 1)] + ['to']
+    locations = locate(graph, waypoints, max_rank, names)
+    pieces, distance = [], 0.0
+    for start, end in zip(locations, locations[1:]):
+        leg_pieces, leg_length = _leg(graph, start, end, max_rank)
+        pieces += leg_pieces
+        distance += leg_length
+    pieces = _merge(pieces)
+    return Route(pieces, [graph.piece_length(piece) for piece in pieces], distance)
+
+
+def plan_loop(origin, target_m, max_rank):
+    """
+    A loop of about ``target_m`` from ``origin`` (lng, lat): out to a
+    turnaround junction and back, preferring not to retrace the way out.
+    """
+    graph = current_graph()
+    start, = locate(graph, [origin], max_rank, ['from'])
+    sources = graph.location_ends(start)
+    cost, previous = graph.shortest_paths(sources, max_rank)
+
+    low, high = (fraction * target_m for fraction in LOOP_TURNAROUND)
+    ideal = target_m / 3
+    candidates = [n for n, c in cost.items() if low <= c <= high] or [
+        n for n, c in cost.items() if c > 0
+    ]
+    candidates = sorted(candidates, key=lambda n: abs(cost[n] - ideal))[:LOOP_CANDIDATES]
+
+    best = None
+    for turnaround in candidates:
+        first, out_steps = graph.walk(previous, turnaround)
+        ridden = {e for _, e in out_steps}
+        back_cost, back_previous = graph.shortest_paths(
+            {turnaround: 0.0}, max_rank, targets=sources,
+            penalties=dict.fromkeys(ridden, REUSE_PENALTY),
+        )
+        ends = [(back_cost[n] + extra, n) for n, extra in sources.items() if n in back_cost]
+        if not ends:
+            continue
+        _, last = min(ends)
+        _, back_steps = graph.walk(back_previous, last)
+        back_length = sum(graph.edge_length[e] for _, e in back_steps)
+        length = cost[turnaround] + back_length + sources[last]
+        retraced = sum(graph.edge_length[e] for _, e in back_steps if e in ridden)
+        if last == first:
+            # Back along the stretch of the start trail we set off on
+            retraced += sources[last]
+        score = abs(length - target_m) + retraced
+        if best is None or score < best[0]:
+            best = (score, length, retraced, first, out_steps, back_steps, last)
+    if best is None:
+        raise RouteNotFound('No loop from this point on trails of the allowed difficulty')
+
+    _, length, retraced, first, out_steps, back_steps, last = best
+    pieces = [(start.trail_id, start.fraction, graph.node_fraction(start.edge, first))]
+    pieces += graph.edge_pieces(out_steps) + graph.edge_pieces(back_steps)
+    pieces.append((start.trail_id, graph.node_fraction(start.edge, last), start.fraction))
+    pieces = _merge(pieces)
+    return Route(pieces, [graph.piece_length(piece) for piece in pieces], length, {
+        'target_distance_m': round(target_m), 'retraced_m': round(retraced),
+    })
+
+
+def route_geojson(route):
+    """FeatureCollection of a route's pieces, in riding order"""
+    pieces = route.pieces
+    with connection.cursor() as cursor:
+        cursor.execute(PIECES_SQL, [
+            list(range(len(pieces))), [p[0] for p in pieces],
+            [p[1] for p in pieces], [p[2] for p in pieces],
+        ])
+        rows = cursor.fetchall()
+    features = [
+        {
+            'type': 'Feature',
+            'geometry': json.loads(geometry),
+            'properties': {
+                'trail_id': trail_id, 'name': name, 'difficulty': difficulty,
+                'length_m': round(route.lengths[i]),
+            },
+        }
+        for i, trail_id, name, difficulty, geometry in rows
+    ]
+    return {
+        'type': 'FeatureCollection',
+        'features': features,
+        'distance_m': round(route.distance_m),
+        'trails': list(dict.fromkeys(piece[0] for piece in pieces)),
+        **route.extra,
+    }
@@ -0,0 +1,75 @@
+"""
+Trail search.
+
+Full-text search runs against ``Trail.search_vector``, a stored tsvector of
+the trail name, park name, difficulty and description (GIN index), and is
+combined with trigram similarity on the name (pg_trgm GIN index) so typos
+still match. Autocomplete is a prefix scan on a ``text_pattern_ops``
+index over ``UPPER(name)``, topped up with trigram matches.
+
+``search_vector`` is denormalized (it includes the park name), so it is
+refreshed by the signal handlers in signals.py on Trail/Park saves and by
+``bulk_write_finished`` after bulk imports.
+"""
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramSimilarity,
+)
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Trail, Park
+
+SEARCH_CONFIG = 'english'
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+AUTOCOMPLETE_LIMIT = 10
+
+
+def trail_search_vector():
+    """The expression stored in Trail.search_vector"""
+    park_name = Subquery(Park.objects.filter(pk=OuterRef('park_id')).order_by().values('name')[:1])
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(Coalesce(park_name, Value('')), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('difficulty', weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(trails):
+    """Recompute search_vector for the trails in ``trails`` (one UPDATE)"""
+    return trails.update(search_vector=trail_search_vector())
+
+
+def clamp_limit(value, default=DEFAULT_LIMIT):
+    try:
+        return max(1, min(int(value), MAX_LIMIT))
+    except (TypeError, ValueError):
+        return default
+
+
+def search_trails(queryset, text, limit=DEFAULT_LIMIT):
+    """Trails matching ``text``, best first, at most ``limit``"""
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+    return (
+        queryset
+        .annotate(rank=SearchRank(F('search_vector'), query) + TrigramSimilarity('name', text))
+        .filter(Q(search_vector=query) | Q(name__trigram_similar=text))
+        .order_by('-rank', 'name')[:limit]
+    )
+
+
+def autocomplete(text, limit=AUTOCOMPLETE_LIMIT):
+    """[{'id', 'name'}] of trails whose name starts with, or resembles, ``text``"""
+    suggestions = list(
+        Trail.objects.filter(name__istartswith=text)
+        .order_by('name').values('id', 'name')[:limit]
+    )
+    if len(suggestions) < limit and len(text) >= 3:
+        seen = [suggestion['id'] for suggestion in suggestions]
+        suggestions += list(
+            Trail.objects.filter(name__trigram_similar=text).exclude(id__in=seen)
+            .annotate(similarity=TrigramSimilarity('name', text))
+            .order_by('-similarity', 'name').values('id', 'name')[:limit - len(suggestions)]
+        )
+    return suggestions
@@ -1,20 +1,80 @@
 from rest_framework_gis import serializers as gis_serializers
 from rest_framework import serializers as drf_serializers
-from .models import Trail, POI, Park
+from .access import ACCESS_TYPES
+from .models import LEVEL_GEOMETRY, Trail, POI, Park, ParkStats, TrailProfile
+from . import timing
 
 
-class ParkSerializer(gis_serializers.GeoFeatureModelSerializer):
+class TimedMixin:
+    """Count to_representation() as ``serialize`` time in Server-Timing (see timing.py)"""
+    def to_representation(self, instance):
+        with timing.measure('serialize'):
+            return super().to_representation(instance)
+
+
+class GeometryLevelMixin:
+    """
+    Serve one of the precomputed simplified geometries (e.g. ``path_coarse``)
+    instead of the full one when the view passes ``geometry_level`` in the
+    serializer context; the rows must come from ``at_level(level)``. Used
+    for reads only.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        level = self.context.get('geometry_level')
+        if level:
+            field = self.fields[self.Meta.geo_field]
+            field.source = LEVEL_GEOMETRY
+            field.source_attrs = [field.source]
+
+
+class ParkStatsSerializer(TimedMixin, drf_serializers.ModelSerializer):
+    """
+    Materialized trail/POI aggregates of a park (see stats.py). Every
+    difficulty is listed, with 0 for those the park has no trails of.
+    """
+    class Meta:
+        model = ParkStats
+        fields = (
+            'trail_count', 'total_length_km', 'mean_length_km',
+            'total_elevation_gain_m', 'difficulty_counts', 'poi_counts', 'updated_at',
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        for field in ('total_length_km', 'mean_length_km', 'total_elevation_gain_m'):
+            if data[field] is not None:
+                data[field] = round(data[field], 1)
+        data['difficulty_counts'] = {
+            difficulty: instance.difficulty_counts.get(difficulty, 0)
+            for difficulty, _ in Trail._meta.get_field('difficulty').choices
+        }
+        return data
+
+
+class ParkStatsListSerializer(ParkStatsSerializer):
+    """ParkStatsSerializer plus the park, for querysets annotated with ``park_name``"""
+    park_name = drf_serializers.CharField(read_only=True)
+
+    class Meta(ParkStatsSerializer.Meta):
+        fields = ('park', 'park_name') + ParkStatsSerializer.Meta.fields
+
+
+class ParkSerializer(TimedMixin, GeometryLevelMixin, gis_serializers.GeoFeatureModelSerializer):
     """
     Serializer for Park model - returns GeoJSON with park boundaries
     """
+    # Load parks with select_related('stats') to avoid a query per park
+    stats = ParkStatsSerializer(read_only=True)
+
     class Meta:
         model = Park
         geo_field = 'boundary'
         auto_bbox = True
-        fields = ('id', 'name', 'description', 'source', 'created_at')
+        fields = ('id', 'name', 'description', 'source', 'created_at', 'stats')
 
 
-class TrailSerializer(gis_serializers.GeoFeatureModelSerializer):
+class TrailSerializer(TimedMixin, GeometryLevelMixin, gis_serializers.GeoFeatureModelSerializer):
     """
     Serializer for Trail model - returns GeoJSON with trail routes
     Includes nested park information
@@ -33,7 +93,41 @@ class TrailSerializer(gis_serializers.GeoFeatureModelSerializer):
         )
 
 
-class POISerializer(gis_serializers.GeoFeatureModelSerializer):
+class TrailDetailSerializer(TrailSerializer):
+    """
+    TrailSerializer plus ``access``: the nearest parking, trailhead and
+    toilets to each end of the trail (precomputed, see access.py), e.g.
+    ``{"parking": {"start": {"id": 4, "name": "...", "distance_m": 300}, "end": null}, ...}``
+    """
+    access = drf_serializers.SerializerMethodField()
+
+    class Meta(TrailSerializer.Meta):
+        fields = TrailSerializer.Meta.fields + ('access',)
+
+    def get_access(self, trail):
+        access = {type_: {'start': None, 'end': None} for type_ in ACCESS_TYPES}
+        points = trail.access_points.select_related('poi').only(
+            'type', 'endpoint', 'distance_m', 'poi__name'
+        )
+        for point in points:
+            access[point.type][point.endpoint] = {
+                'id': point.poi_id, 'name': point.poi.name, 'distance_m': round(point.distance_m),
+            }
+        return access
+
+
+class TrailDistanceSerializer(TrailSerializer):
+    """
+    TrailSerializer plus distance_m, for querysets annotated with a
+    ``distance`` (Distance function) from a search point
+    """
+    distance_m = drf_serializers.FloatField(source='distance.m', read_only=True)
+
+    class Meta(TrailSerializer.Meta):
+        fields = TrailSerializer.Meta.fields + ('distance_m',)
+
+
+class POISerializer(TimedMixin, gis_serializers.GeoFeatureModelSerializer):
     """
     Serializer for POI model - returns GeoJSON with POI locations
     Includes nested park information
@@ -50,3 +144,51 @@ class POISerializer(gis_serializers.GeoFeatureModelSerializer):
             'id', 'name', 'type', 'type_display', 'park', 
             'park_name', 'park_id', 'description', 'source', 'created_at'
         )
+
+
+class BulkParkField(drf_serializers.PrimaryKeyRelatedField):
+    """
+    Park by id, looked up in ``context['parks']`` (every park a bulk
+    request refers to, fetched in one query) instead of one query per item
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.context['parks'][int(data)]
+        except (KeyError, ValueError):
+            self.fail('does_not_exist', pk_value=data)
+
+
+class TrailBulkSerializer(TrailSerializer):
+    """
+    Validates one feature of a bulk trail write (see bulk.py). Rows may be
+    matched on (source, source_id), so the uniqueness validators are left
+    to the upsert.
+    """
+    park = BulkParkField(queryset=Park.objects.all(), allow_null=True, required=False)
+
+    class Meta(TrailSerializer.Meta):
+        fields = TrailSerializer.Meta.fields + ('source_id',)
+        validators = []
+
+
+class POIBulkSerializer(POISerializer):
+    """Validates one feature of a bulk POI write (see bulk.py)"""
+    park = BulkParkField(queryset=Park.objects.all(), allow_null=True, required=False)
+
+    class Meta(POISerializer.Meta):
+        fields = POISerializer.Meta.fields + ('source_id',)
+        validators = []
+
+
+class TrailProfileSerializer(TimedMixin, drf_serializers.ModelSerializer):
+    """
+    Serializer for TrailProfile - plain JSON, elevations every spacing_m
+    """
+    class Meta:
+        model = TrailProfile
+        fields = (
+            'trail', 'spacing_m', 'elevation_gain_m', 'elevation_loss_m',
+            'max_gradient_pct', 'elevations', 'dem', 'updated_at'
+        )
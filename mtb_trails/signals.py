@@ -0,0 +1,215 @@
+"""
+Model signal handlers that keep caches and derived data in step with
+Park, Trail and POI writes.
+
+Bulk writes (bulk_create, update(), COPY) do not send these signals;
+code paths that use them call ``bulk_write_finished`` instead.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import access, cache, conditional, membership, search, snapshots, stats
+from .models import Trail, POI, Park, TrailAccessPoint
+
+
+@receiver([post_save, post_delete], sender=Park)
+@receiver([post_save, post_delete], sender=Trail)
+@receiver([post_save, post_delete], sender=POI)
+def bump_model_version(sender, **kwargs):
+    # In the write's transaction, so the ETag moves exactly when it commits
+    conditional.bump(sender)
+
+
+@receiver([post_save, post_delete], sender=Park)
+@receiver([post_save, post_delete], sender=Trail)
+@receiver([post_save, post_delete], sender=POI)
+def rebuild_snapshots(sender, **kwargs):
+    snapshots.schedule_rebuild(sender)
+
+
+# Trail fields that feed Trail.search_vector
+SEARCH_FIELDS = {'name', 'park', 'difficulty', 'description'}
+
+
+@receiver(post_save, sender=Trail)
+def update_trail_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or SEARCH_FIELDS & set(update_fields):
+        search.update_search_vectors(Trail.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Park)
+def update_park_trail_search_vectors(sender, instance, created=False, **kwargs):
+    # The park name is part of its trails' search documents
+    if not created:
+        search.update_search_vectors(Trail.objects.filter(park=instance))
+
+
+@receiver(post_save, sender=Trail)
+@receiver(post_save, sender=POI)
+def update_park_membership(sender, instance, created=False, update_fields=None, **kwargs):
+    geometry = membership.MEMBERSHIPS[sender][2]
+    if created or update_fields is None or geometry in update_fields:
+        membership.refresh(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Park)
+def subdivide_park_boundary(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or update_fields is None or 'boundary' in update_fields:
+        membership.refresh_parks([instance.pk])
+
+
+# Trail/POI fields that feed ParkStats
+STATS_FIELDS = {
+    Trail: {'park', 'length_km', 'elevation_gain_m', 'difficulty'},
+    POI: {'park', 'type'},
+}
+
+
+@receiver(pre_save, sender=Trail)
+@receiver(pre_save, sender=POI)
+def remember_previous_park(sender, instance, update_fields=None, **kwargs):
+    # A row moved to another park changes the stats of the park it left too
+    instance._previous_park_id = None
+    if instance.pk and (update_fields is None or 'park' in update_fields):
+        instance._previous_park_id = (
+            sender.objects.filter(pk=instance.pk).values_list('park_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Trail)
+@receiver(post_save, sender=POI)
+def refresh_park_stats(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or STATS_FIELDS[sender] & set(update_fields):
+        stats.refresh([instance.park_id, getattr(instance, '_previous_park_id', None)])
+
+
+@receiver(post_delete, sender=Trail)
+@receiver(post_delete, sender=POI)
+def refresh_park_stats_after_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the park itself cascades here; its stats row goes with it
+    if isinstance(origin, Park) or getattr(origin, 'model', None) is Park:
+        return
+    stats.refresh([instance.park_id])
+
+
+@receiver(post_save, sender=Park)
+def create_park_stats(sender, instance, created=False, **kwargs):
+    if created:
+        stats.refresh([instance.pk])
+
+
+@receiver(post_save, sender=Trail)
+def refresh_trail_access_points(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or update_fields is None or 'path' in update_fields:
+        access.refresh([instance.pk])
+
+
+# POI fields that decide which POI is nearest to a trail end
+ACCESS_FIELDS = {'type', 'location'}
+
+
+@receiver(post_save, sender=POI)
+def refresh_poi_access_points(sender, instance, created=False, update_fields=None, **kwargs):
+    if created or update_fields is None or ACCESS_FIELDS & set(update_fields):
+        access.refresh_for_pois([instance.pk])
+
+
+@receiver(pre_delete, sender=POI)
+def remember_access_trails(sender, instance, **kwargs):
+    # The cascade deletes the access points that name this POI
+    instance._access_trail_ids = list(
+        TrailAccessPoint.objects.filter(poi=instance).values_list('trail_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=POI)
+def refresh_access_points_after_delete(sender, instance, **kwargs):
+    trail_ids = getattr(instance, '_access_trail_ids', [])
+    if trail_ids:
+        # After the commit, so trails deleted along with the POI (a park
+        # delete cascades to both) are gone rather than given new rows
+        transaction.on_commit(lambda: access.refresh(
+            Trail.objects.filter(pk__in=trail_ids).values_list('pk', flat=True)
+        ))
+
+
+# Connected last, so the callback is queued after those of the receivers
+# above. Invalidating only after the commit means a request cannot cache the
+# old rows under the new generation token (see cache.py).
+@receiver([post_save, post_delete], sender=Park)
+@receiver([post_save, post_delete], sender=Trail)
+@receiver([post_save, post_delete], sender=POI)
+def invalidate_cached_responses(sender, **kwargs):
+    transaction.on_commit(lambda: cache.invalidate(sender))
+
+
+def bulk_write_finished(*models, changed_ids=None, changed_since=None, everything=False):
+    """
+    Run the hooks above once for a bulk write to ``models``.
+
+    Name the rows written as ``changed_ids`` ({model: pks}) or, for rows
+    stamped by the database clock (SQL upserts), as ``changed_since`` (a
+    database timestamp); ``everything`` refreshes every row of ``models``.
+    Trails without a search vector are always indexed; the trails written
+    and those of parks written are re-indexed, and the park membership of
+    rows written is refreshed. Park stats are refreshed for the parks of
+    the rows written, and trail access points for the trails and POIs
+    written. Without any of the three, stats and access points are
+    refreshed everywhere and nothing else. The versions of ``models`` (see
+    conditional.py) are always bumped.
+    """
+    written = None
+    if everything:
+        written = {model: None for model in models}
+    elif changed_ids is not None or changed_since is not None:
+        written = {model: _written(model, changed_ids, changed_since) for model in models}
+
+    # One transaction, so the derived data is written all or nothing
+    with transaction.atomic():
+        conditional.bump(*models)
+        if Trail in models or Park in models:
+            stale = Q(search_vector__isnull=True)
+            if everything:
+                stale = Q()
+            elif written is not None:
+                stale |= Q(pk__in=written.get(Trail, [])) | Q(park_id__in=written.get(Park, []))
+            search.update_search_vectors(Trail.objects.filter(stale))
+        if written is not None:
+            if Park in models:
+                membership.refresh_parks(written[Park])
+            for model in membership.MEMBERSHIPS:
+                # A full refresh_parks() has already matched every row
+                if model in models and not (everything and Park in models):
+                    membership.refresh(model, written[model])
+        if {Trail, POI, Park} & set(models):
+            stats.refresh(None if written is None or everything else _parks_written(written))
+        if Trail in models or POI in models:
+            if written is None or everything:
+                access.refresh()
+            else:
+                if Trail in models:
+                    access.refresh(written[Trail])
+                if POI in models:
+                    access.refresh_for_pois(written[POI])
+        transaction.on_commit(lambda: cache.invalidate(*models))
+        for model in models:
+            snapshots.schedule_rebuild(model)
+
+
+def _written(model, changed_ids, changed_since):
+    pks = set((changed_ids or {}).get(model, ()))
+    if changed_since is not None:
+        pks.update(model.objects.filter(updated_at__gte=changed_since).values_list('pk', flat=True))
+    return sorted(pks)
+
+
+def _parks_written(written):
+    park_ids = set(written.get(Park, ()))
+    for model in (Trail, POI):
+        if written.get(model):
+            park_ids.update(
+                model.objects.filter(pk__in=written[model]).values_list('park_id', flat=True).distinct()
+            )
+    return park_ids
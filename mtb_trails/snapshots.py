@@ -0,0 +1,243 @@
+"""
+Pre-rendered GeoJSON snapshots of the full datasets.
+
+Each snapshot is written once with the streaming GeoJSON writer, named after
+a hash of its content (``trails-medium.3f2a9c81d0e4.geojson``) and stored
+next to gzip and brotli variants in ``SNAPSHOT_ROOT``. WhiteNoise serves
+them with far-future caching (see middleware.py), so the initial map load
+never reaches a Django view or the database. ``manifest.json`` maps the
+logical names (``trails-medium.geojson``) to the current hashed files.
+
+Snapshots are rebuilt by ``manage.py build_snapshots``, never inside a
+request. When a write to Park, Trail or POI commits, the signal handlers in
+signals.py only mark the layers that show it as pending (an empty file in
+``SNAPSHOT_ROOT/pending/``); ``build_snapshots --watch``, running next to
+the web workers, rebuilds the pending layers every few seconds, so a burst
+of writes costs one rebuild. Builds take an exclusive file lock, so builds
+from several processes never interleave, and the files of the previous
+manifest are kept for one more build, so a page that just read the old
+manifest can still load its snapshots.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .geojson import TRAIL_LAYOUT, POI_LAYOUT, PARK_LAYOUT, iter_feature_collection
+from .models import Trail, POI, Park, GEOMETRY_LEVELS
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within a process
+    fcntl = None
+
+MANIFEST_NAME = 'manifest.json'
+LOCK_NAME = '.build.lock'
+PENDING_DIR = 'pending'
+HASH_LENGTH = 12
+# Coordinate decimals in the snapshots: ~0.1 m, and far fewer bytes than 8
+SNAPSHOT_PRECISION = 6
+
+# layer -> (model, layout)
+LAYERS = {
+    'trails': (Trail, TRAIL_LAYOUT),
+    'parks': (Park, PARK_LAYOUT),
+    'pois': (POI, POI_LAYOUT),
+}
+
+# Layers whose snapshot shows rows of each model (park_name appears on
+# trail and POI features)
+DEPENDENT_LAYERS = {
+    Trail: ['trails'],
+    POI: ['pois'],
+    Park: ['parks', 'trails', 'pois'],
+}
+
+_lock = threading.Lock()
+
+
+def snapshot_root():
+    return Path(settings.SNAPSHOT_ROOT)
+
+
+def snapshot_variants(layer):
+    """Logical snapshot names for a layer: full resolution plus each level"""
+    _, layout = LAYERS[layer]
+    variants = [(f'{layer}.geojson', None)]
+    if layout.simplified:
+        variants += [(f'{layer}-{name}.geojson', name) for name, _, _ in GEOMETRY_LEVELS]
+    return variants
+
+
+def read_manifest():
+    try:
+        with open(snapshot_root() / MANIFEST_NAME) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_manifest(manifest):
+    root = snapshot_root()
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.tmp')
+    with os.fdopen(fd, 'w') as tmp:
+        json.dump(manifest, tmp, indent=2, sort_keys=True)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, root / MANIFEST_NAME)
+
+
+def _write_snapshot(name, queryset, layout, level):
+    """Write one snapshot plus .gz/.br variants, return its hashed file name"""
+    root = snapshot_root()
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            for chunk in iter_feature_collection(queryset, layout, level, precision=SNAPSHOT_PRECISION):
+                data = chunk.encode()
+                digest.update(data)
+                tmp.write(data)
+        stem, ext = os.path.splitext(name)
+        hashed_name = f'{stem}.{digest.hexdigest()[:HASH_LENGTH]}{ext}'
+        final_path = root / hashed_name
+        if final_path.exists():
+            # Unchanged content: the hashed file (and its variants) are current
+            os.remove(tmp_path)
+            return hashed_name
+        os.chmod(tmp_path, 0o644)
+        _write_compressed(tmp_path, final_path)
+        os.replace(tmp_path, final_path)
+        return hashed_name
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_compressed(source_path, final_path):
+    with open(source_path, 'rb') as source, gzip.open(f'{final_path}.gz', 'wb', compresslevel=9) as out:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            out.write(block)
+    if brotli is not None:
+        compressor = brotli.Compressor(quality=9)
+        with open(source_path, 'rb') as source, open(f'{final_path}.br', 'wb') as out:
+            for block in iter(lambda: source.read(1024 * 1024), b''):
+                out.write(compressor.process(block))
+            out.write(compressor.finish())
+
+
+@contextmanager
+def _build_lock():
+    """Exclusive across the threads of this process and, with fcntl, across processes"""
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        with open(snapshot_root() / LOCK_NAME, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _remove_stale(manifest, previous):
+    """Delete hashed snapshot files that neither manifest points to"""
+    current = set(manifest.values()) | set(previous.values())
+    prefixes = tuple(os.path.splitext(name)[0] + '.' for name in manifest)
+    for path in snapshot_root().iterdir():
+        base = path.name
+        for suffix in ('.gz', '.br'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if base.startswith(prefixes) and base.endswith('.geojson') and base not in current:
+            path.unlink(missing_ok=True)
+
+
+def build_snapshots(layers=None):
+    """(Re)build the snapshots for ``layers`` (default: all) and the manifest"""
+    root = snapshot_root()
+    root.mkdir(parents=True, exist_ok=True)
+    with _build_lock():
+        previous = read_manifest()
+        manifest = dict(previous)
+        for layer in layers or LAYERS:
+            model, layout = LAYERS[layer]
+            for name, level in snapshot_variants(layer):
+                manifest[name] = _write_snapshot(name, model.objects.all(), layout, level)
+        _write_manifest(manifest)
+        _remove_stale(manifest, previous)
+    return manifest
+
+
+def snapshot_urls():
+    """
+    URLs of the current snapshots for the map page, e.g.
+    ``{'trails': {'full': '/snapshots/trails.<hash>.geojson', 'medium': ...}}``
+    """
+    manifest = read_manifest()
+    urls = {}
+    for layer in LAYERS:
+        for name, level in snapshot_variants(layer):
+            if name in manifest:
+                urls.setdefault(layer, {})[level or 'full'] = settings.SNAPSHOT_URL + manifest[name]
+    return urls
+
+
+def _pending_dir():
+    return snapshot_root() / PENDING_DIR
+
+
+def schedule_rebuild(model):
+    """
+    Mark the layers that show ``model`` as pending once the current
+    transaction commits, for build_pending() to rebuild
+    """
+    if not getattr(settings, 'SNAPSHOTS_AUTO_REBUILD', True):
+        return
+    layers = DEPENDENT_LAYERS.get(model, ())
+    if layers:
+        transaction.on_commit(lambda: _mark_pending(layers))
+
+
+def _mark_pending(layers):
+    pending = _pending_dir()
+    pending.mkdir(parents=True, exist_ok=True)
+    for layer in layers:
+        (pending / layer).touch()
+
+
+def pending_layers():
+    try:
+        return sorted(path.name for path in _pending_dir().iterdir() if path.name in LAYERS)
+    except FileNotFoundError:
+        return []
+
+
+def build_pending():
+    """Rebuild the pending layers, return them"""
+    layers = pending_layers()
+    if not layers:
+        return []
+    # Cleared before reading the rows: a write committing during the build
+    # marks its layer again and is picked up by the next call
+    for layer in layers:
+        (_pending_dir() / layer).unlink(missing_ok=True)
+    try:
+        build_snapshots(layers)
+    except BaseException:
+        _mark_pending(layers)
+        raise
+    return layers
@@ -0,0 +1,67 @@
+"""
+Materialized park statistics.
+
+ParkStats holds one row of trail and POI aggregates per park. Rather than
+re-running the GROUP BYs on every request (or refreshing a materialized
+view for every park at once), ``refresh`` recomputes the rows of just the
+parks passed to it with one upsert. The signal handlers in signals.py call
+it with the old and new park of each saved or deleted trail/POI;
+``bulk_write_finished`` calls it after imports.
+"""
+from django.db import connection
+
+from .models import Trail, POI, Park, ParkStats
+
+STATS_TABLE = ParkStats._meta.db_table
+
+REFRESH_SQL = f"""
+    INSERT INTO {STATS_TABLE} (
+        park_id, trail_count, total_length_km, mean_length_km,
+        total_elevation_gain_m, difficulty_counts, poi_counts, updated_at
+    )
+    SELECT p.id, t.trail_count, COALESCE(t.total_length_km, 0), t.mean_length_km,
+           COALESCE(t.total_elevation_gain_m, 0),
+           COALESCE(d.counts, jsonb_build_object()), COALESCE(o.counts, jsonb_build_object()),
+           statement_timestamp()
+    FROM {Park._meta.db_table} p
+    CROSS JOIN LATERAL (
+        SELECT count(*) AS trail_count, sum(length_km) AS total_length_km,
+               avg(length_km) AS mean_length_km,
+               sum(elevation_gain_m) AS total_elevation_gain_m
+        FROM {Trail._meta.db_table} WHERE park_id = p.id
+    ) t
+    CROSS JOIN LATERAL (
+        SELECT jsonb_object_agg(difficulty, n) AS counts FROM (
+            SELECT difficulty, count(*) AS n FROM {Trail._meta.db_table}
+            WHERE park_id = p.id GROUP BY difficulty
+        ) x
+    ) d
+    CROSS JOIN LATERAL (
+        SELECT jsonb_object_agg(type, n) AS counts FROM (
+            SELECT type, count(*) AS n FROM {POI._meta.db_table}
+            WHERE park_id = p.id GROUP BY type
+        ) x
+    ) o
+    WHERE {{condition}}
+    ON CONFLICT (park_id) DO UPDATE SET
+        trail_count = EXCLUDED.trail_count,
+        total_length_km = EXCLUDED.total_length_km,
+        mean_length_km = EXCLUDED.mean_length_km,
+        total_elevation_gain_m = EXCLUDED.total_elevation_gain_m,
+        difficulty_counts = EXCLUDED.difficulty_counts,
+        poi_counts = EXCLUDED.poi_counts,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+def refresh(park_ids=None):
+    """Recompute the stats of ``park_ids`` (None = every park); Nones are ignored"""
+    if park_ids is None:
+        condition, params = 'TRUE', []
+    else:
+        park_ids = sorted({park_id for park_id in park_ids if park_id is not None})
+        if not park_ids:
+            return
+        condition, params = 'p.id = ANY(%s)', [park_ids]
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_SQL.format(condition=condition), params)
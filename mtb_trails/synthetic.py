@@ -0,0 +1,175 @@
+"""
+Synthetic datasets for load tests and benchmarks (``manage.py generate_synthetic``).
+
+Every value comes from one ``random.Random(seed)``, so the same seed and
+sizes always give the same rows. Parks are irregular polygons a few
+kilometres across scattered over Ireland. Trails are correlated random
+walks of a few hundred vertices that start inside a park and turn back at
+its edge, so they curve, cross and bunch up like a real trail centre; a few
+are standalone. POIs sit at trail starts (parking, trailheads, toilets)
+and elsewhere in the parks. Rows get ``source='other'`` and a
+``synthetic-<seed>-`` source_id.
+
+The generators yield unsaved model instances in order; the command writes
+them in batches, so memory stays flat at a million trails.
+"""
+import math
+from dataclasses import dataclass
+
+from django.contrib.gis.geos import LineString, Point, Polygon
+
+from .models import Trail, POI, Park
+from .tracks import haversine_km
+
+SOURCE = 'other'
+# Trail counts of the --scale presets; parks and POIs follow from them
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+TRAILS_PER_PARK = 50
+POIS_PER_TRAIL = 0.5
+STANDALONE_SHARE = 0.05
+
+IRELAND_BBOX = (-10.3, 51.5, -6.0, 55.3)
+KM_PER_DEGREE = 111.32
+
+DIFFICULTY_WEIGHTS = {'beginner': 4, 'intermediate': 5, 'expert': 2}
+# Types placed at trail starts, and everywhere else
+START_POI_TYPES = {'parking': 5, 'trailhead': 3, 'toilets': 1}
+OTHER_POI_TYPES = {'viewpoint': 3, 'cafe': 2, 'rest_area': 2, 'water': 2, 'bike_shop': 1, 'other': 1}
+
+PARK_PREFIXES = ['Bally', 'Glen', 'Slieve', 'Knock', 'Carrig', 'Derry', 'Kil', 'Lough', 'Cloon', 'Drum']
+PARK_SUFFIXES = ['more', 'beg', 'na', 'ross', 'dare', 'keel', 'houra', 'cullen', 'managh', 'avagh']
+PARK_KINDS = ['Forest', 'Woods', 'Trail Centre', 'Mountain', 'Park']
+TRAIL_COLOURS = ['Green', 'Blue', 'Red', 'Black']
+TRAIL_KINDS = ['Loop', 'Descent', 'Ridge', 'Climb', 'Flow', 'Link', 'Traverse']
+
+
+@dataclass
+class ParkArea:
+    """What trails and POIs need of a saved park"""
+    id: int
+    lng: float
+    lat: float
+    radius_km: float
+
+
+def scale_counts(trails):
+    """(parks, trails, pois) for a trail count"""
+    return max(1, trails // TRAILS_PER_PARK), trails, int(trails * POIS_PER_TRAIL)
+
+
+def _offset(lng, lat, east_km, north_km):
+    return (
+        lng + east_km / (KM_PER_DEGREE * math.cos(math.radians(lat))),
+        lat + north_km / KM_PER_DEGREE,
+    )
+
+
+def _distance_km(lng1, lat1, lng2, lat2):
+    return math.hypot(
+        (lng2 - lng1) * KM_PER_DEGREE * math.cos(math.radians(lat1)),
+        (lat2 - lat1) * KM_PER_DEGREE,
+    )
+
+
+def _weighted(rng, weights):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _point_in(rng, area, share=0.8):
+    """A random point within ``share`` of the park's radius"""
+    angle = rng.uniform(0, 2 * math.pi)
+    distance = area.radius_km * share * math.sqrt(rng.random())
+    return _offset(area.lng, area.lat, distance * math.cos(angle), distance * math.sin(angle))
+
+
+def parks(rng, count, seed):
+    """(park, area) pairs; parks are star-shaped, a wobbly radius around a center"""
+    minx, miny, maxx, maxy = IRELAND_BBOX
+    for i in range(count):
+        lng, lat = rng.uniform(minx, maxx), rng.uniform(miny, maxy)
+        radius_km = rng.uniform(2, 8)
+        vertices = rng.randint(32, 96)
+        waves = [(rng.randint(2, 6), rng.uniform(0, 2 * math.pi), rng.uniform(0.05, 0.2)) for _ in range(3)]
+        ring = []
+        for v in range(vertices):
+            angle = 2 * math.pi * v / vertices
+            r = radius_km * (1 + sum(a * math.sin(k * angle + phase) for k, phase, a in waves))
+            r *= rng.uniform(0.97, 1.03)
+            ring.append(_offset(lng, lat, r * math.cos(angle), r * math.sin(angle)))
+        ring.append(ring[0])
+        park = Park(
+            name=f'{rng.choice(PARK_PREFIXES)}{rng.choice(PARK_SUFFIXES)} {rng.choice(PARK_KINDS)}',
+            description='Synthetic park',
+            boundary=Polygon(ring, srid=4326),
+            source=SOURCE,
+            source_id=f'synthetic-{seed}-park-{i}',
+        )
+        # The id is filled in once the park is saved
+        yield park, ParkArea(None, lng, lat, radius_km)
+
+
+def _walk(rng, lng, lat, vertices, area=None):
+    """Correlated random walk from (lng, lat); turns back towards the center outside ``area``"""
+    heading = rng.uniform(0, 2 * math.pi)
+    coords = [(lng, lat)]
+    for _ in range(vertices - 1):
+        heading += rng.gauss(0, 0.25)
+        if area and _distance_km(area.lng, area.lat, lng, lat) > area.radius_km * 0.9:
+            inward = math.atan2(area.lat - lat, (area.lng - lng) * math.cos(math.radians(lat)))
+            heading += 0.5 * math.remainder(inward - heading, 2 * math.pi)
+        step_km = rng.uniform(0.015, 0.04)
+        lng, lat = _offset(lng, lat, step_km * math.cos(heading), step_km * math.sin(heading))
+        coords.append((lng, lat))
+    return coords
+
+
+def trails(rng, count, areas, seed, vertices=(100, 400)):
+    """(trail, (area, start position)) pairs; paths have ``vertices`` (min, max) points"""
+    minx, miny, maxx, maxy = IRELAND_BBOX
+    for i in range(count):
+        area = None if rng.random() < STANDALONE_SHARE else rng.choice(areas)
+        if area:
+            lng, lat = _point_in(rng, area, 0.6)
+        else:
+            lng, lat = rng.uniform(minx, maxx), rng.uniform(miny, maxy)
+        coords = _walk(rng, lng, lat, rng.randint(*vertices), area)
+        length_km = max(haversine_km(coords), 0.1)
+        trail = Trail(
+            name=f'{rng.choice(TRAIL_COLOURS)} {rng.choice(TRAIL_KINDS)} {i + 1}',
+            park_id=area.id if area else None,
+            difficulty=_weighted(rng, DIFFICULTY_WEIGHTS),
+            length_km=round(length_km, 2),
+            elevation_gain_m=round(length_km * rng.uniform(10, 60)),
+            path=LineString(coords, srid=4326),
+            description='Synthetic trail',
+            source=SOURCE,
+            source_id=f'synthetic-{seed}-trail-{i}',
+        )
+        yield trail, (area, coords[0])
+
+
+def pois(rng, count, starts, areas, seed):
+    """POIs: most next to a trail start (``starts`` from trails()), the rest anywhere in a park"""
+    for i in range(count):
+        if starts and rng.random() < 0.6:
+            area, (lng, lat) = rng.choice(starts)
+            lng, lat = _offset(lng, lat, rng.uniform(-0.1, 0.1), rng.uniform(-0.1, 0.1))
+            poi_type = _weighted(rng, START_POI_TYPES)
+        else:
+            area = rng.choice(areas)
+            lng, lat = _point_in(rng, area)
+            poi_type = _weighted(rng, OTHER_POI_TYPES)
+        yield POI(
+            name=f'{poi_type.replace("_", " ").title()} {i + 1}',
+            park_id=area.id if area else None,
+            type=poi_type,
+            location=Point(lng, lat, srid=4326),
+            description='Synthetic POI',
+            source=SOURCE,
+            source_id=f'synthetic-{seed}-poi-{i}',
+        )
+
+
+def existing(seed):
+    """Whether rows of this seed were generated before"""
+    return Park.objects.filter(source=SOURCE, source_id__startswith=f'synthetic-{seed}-').exists()
@@ -1,3 +1,1560 @@
+import io
+import json
+import os
+import random
+import struct
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.gis.geos import LineString, Point, Polygon
+from django.contrib.gis.measure import D
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from .dem import np as numpy
+from .membership import MAX_VERTICES
+from .models import LEVEL_GEOMETRY, Trail, POI, Park, TrailProfile, ParkBoundaryPart
+from .osm import osmium
+from .pagination import GeoJsonCursorPagination
+from .renderers import encode_features
+from . import benchmark, bulk, dem, routing, snapshots, synthetic, tracks, urls as mtb_urls
+
+
+def make_dataset(parks=3, trails_per_park=6, pois_per_park=4):
+    """
+    Synthetic dataset: a row of square parks around Wicklow, each with a
+    handful of trails and POIs, plus one standalone trail and POI so the
+    "no park" paths are exercised too.
+    """
+    difficulties = ['beginner', 'intermediate', 'expert']
+    poi_types = ['parking', 'trailhead', 'cafe', 'toilets']
+    created = []
+    for i in range(parks):
+        x0, y0 = -6.5 + i * 0.1, 53.0
+        park = Park.objects.create(
+            name=f'Park {i}',
+            boundary=Polygon.from_bbox((x0, y0, x0 + 0.08, y0 + 0.08)),
+        )
+        created.append(park)
+        for j in range(trails_per_park):
+            x, y = x0 + 0.01, y0 + 0.01 + j * 0.01
+            Trail.objects.create(
+                name=f'Trail {i}-{j}',
+                park=park,
+                difficulty=difficulties[j % len(difficulties)],
+                length_km=2.0 + j,
+                elevation_gain_m=50.0 * j,
+                path=LineString((x, y), (x + 0.02, y + 0.005), (x + 0.05, y), srid=4326),
+            )
+        for j in range(pois_per_park):
+            POI.objects.create(
+                name=f'POI {i}-{j}',
+                park=park,
+                type=poi_types[j % len(poi_types)],
+                location=Point(x0 + 0.005 * (j + 1), y0 + 0.005, srid=4326),
+            )
+    Trail.objects.create(
+        name='Standalone Trail',
+        difficulty='beginner',
+        length_km=1.0,
+        elevation_gain_m=10,
+        path=LineString((-6.2, 53.2), (-6.21, 53.21), srid=4326),
+    )
+    POI.objects.create(
+        name='Standalone Shop',
+        type='bike_shop',
+        location=Point(-6.26, 53.34, srid=4326),
+    )
+    return created
+
+
+# Maximum number of SQL queries per URL name, with representative arguments.
+# (url name, reverse kwargs, query params, max queries)
+# Kwargs given as a callable receive the first synthetic park.
+# Versioned endpoints spend one query on their ETag (the models' write counters).
+QUERY_BUDGETS = [
+    ('park-list', {}, {}, 1),
+    ('park-list', {}, {'tolerance': '0.001'}, 1),
+    ('park-list', {}, {'format': 'fgb'}, 1),
+    ('park-detail', lambda park: {'pk': park.pk}, {}, 1),
+    ('parks-geojson', {}, {}, 2),
+    ('parks-geojson', {}, {'stream': '1'}, 2),
+    ('parks-geojson', {}, {'zoom': '7'}, 2),
+    ('parks-geojson', {}, {'zoom': '7', 'format': 'geobuf'}, 2),
+    ('parks-geojson', {}, {'precision': '6'}, 2),
+    ('parks-geojson', {}, {'format': 'topojson'}, 2),
+    ('park-trails', lambda park: {'park_id': park.pk}, {}, 5),
+    ('park-trails', lambda park: {'park_id': park.pk}, {'zoom': '10'}, 5),
+    ('park-pois', lambda park: {'park_id': park.pk}, {}, 5),
+    ('park-stats', {}, {}, 3),
+    ('parks-containing', {}, {'lat': '53.04', 'lng': '-6.46'}, 1),
+    ('parks-containing', {}, {'lat': '53.04', 'lng': '-6.46', 'zoom': '10'}, 1),
+    ('trail-list', {}, {}, 1),
+    ('trail-list', {}, {'zoom': '10'}, 1),
+    ('trail-list', {}, {'in_bbox': '-6.6,52.9,-6.0,53.5'}, 1),
+    # Binary pages: the page's ids, then the encoding
+    ('trail-list', {}, {'format': 'fgb', 'page_size': '5'}, 2),
+    ('trail-detail', lambda park: {'pk': park.trails.first().pk}, {}, 2),
+    ('trail-profile', lambda park: {'pk': park.trails.first().pk}, {}, 1),
+    ('trails-geojson', {}, {}, 3),
+    ('trails-geojson', {}, {'stream': '1'}, 3),
+    ('trails-geojson', {}, {'zoom': '7'}, 3),
+    ('trails-geojson', {}, {'zoom': '12', 'stream': '1'}, 3),
+    ('trails-geojson', {}, {'format': 'fgb'}, 3),
+    ('trails-geojson', {}, {'format': 'geobuf'}, 3),
+    ('trails-geojson', {}, {'precision': '5'}, 3),
+    ('trails-geojson', {}, {'format': 'topojson', 'zoom': '10'}, 3),
+    ('search-trails', {}, {'q': 'Trail'}, 1),
+    ('search-trails', {}, {}, 1),
+    ('autocomplete-trails', {}, {'q': 'Tra'}, 2),
+    ('autocomplete-trails', {}, {'q': 'Standalne'}, 2),
+    ('nearest-trails', {}, {'lat': '53.02', 'lng': '-6.45', 'radius': '50'}, 1),
+    ('trails-within-radius', {}, {'lat': '53.02', 'lng': '-6.45', 'radius_km': '20'}, 1),
+    ('trails-in-park', {}, {'polygon': 'POLYGON((-6.6 52.9, -6.0 52.9, -6.0 53.5, -6.6 53.5, -6.6 52.9))'}, 1),
+    # Cold: version check, trail ids, new trails, junctions, snapping, geometry
+    ('routes', {}, {'from': '53.0101,-6.485', 'to': '53.0105,-6.445'}, 6),
+    ('loop-route', {}, {'from': '53.0101,-6.489', 'distance_km': '7'}, 6),
+    ('poi-list', {}, {}, 1),
+    ('poi-list', {}, {'dist': '5000', 'point': '-6.45,53.01'}, 1),
+    ('poi-list', {}, {'format': 'geobuf'}, 2),
+    ('poi-detail', lambda park: {'pk': park.pois.first().pk}, {}, 1),
+    ('pois-geojson', {}, {}, 3),
+    ('pois-geojson', {}, {'stream': '1'}, 3),
+    ('pois-geojson', {}, {'format': 'fgb'}, 3),
+    ('pois-geojson', {}, {'precision': '6'}, 3),
+    ('pois-geojson', {}, {'zoom': '8', 'bbox': '-7.0,52.5,-6.0,53.5'}, 3),
+    ('pois-geojson', {}, {'zoom': '16', 'bbox': '-6.5,53.0,-6.4,53.1'}, 3),
+    ('async-parks-geojson', {}, {}, 2),
+    ('async-parks-geojson', {}, {'stream': '1'}, 2),
+    ('async-park-trails', lambda park: {'park_id': park.pk}, {'zoom': '10'}, 5),
+    ('async-park-pois', lambda park: {'park_id': park.pk}, {}, 5),
+    ('async-trails-geojson', {}, {}, 3),
+    ('async-trails-geojson', {}, {'zoom': '12', 'stream': '1'}, 3),
+    ('async-nearest-trails', {}, {'lat': '53.02', 'lng': '-6.45', 'radius': '50'}, 1),
+    ('async-trails-within-radius', {}, {'lat': '53.02', 'lng': '-6.45', 'radius_km': '20'}, 1),
+    ('async-trails-in-park', {}, {'polygon': 'POLYGON((-6.6 52.9, -6.0 52.9, -6.0 53.5, -6.6 53.5, -6.6 52.9))'}, 1),
+    ('async-pois-geojson', {}, {}, 3),
+    ('async-pois-geojson', {}, {'zoom': '8', 'bbox': '-7.0,52.5,-6.0,53.5'}, 3),
+    ('vector-tile', {'layer': 'trails', 'z': 10, 'x': 493, 'y': 333}, {}, 1),
+    ('trail-map', {}, {}, 0),
+    ('trails-list', {}, {}, 1),
+    ('home', {}, {}, 0),
+]
+# POST-only endpoints; BulkWriteTests checks their query counts
+WRITE_ONLY_URLS = {'trails-bulk', 'pois-bulk'}
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every read endpoint must run a constant number of queries, however many
+    rows it returns. A budget overrun here usually means a missing
+    select_related()/prefetch_related() (an N+1 on park.name and friends).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset()
+        TrailProfile.objects.create(
+            trail=cls.parks[0].trails.first(), spacing_m=25, elevations=[100, 110, 105],
+            elevation_gain_m=10, elevation_loss_m=5, max_gradient_pct=4, path_hash='',
+        )
+
+    def setUp(self):
+        # Budgets are for cold requests, not response-cache hits
+        cache.clear()
+
+    def get_with_budget(self, name, kwargs, params, budget):
+        if callable(kwargs):
+            kwargs = kwargs(self.parks[0])
+        url = reverse(f'mtb_trails:{name}', kwargs=kwargs)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, f'{name} {params}')
+        self.assertLessEqual(
+            len(ctx.captured_queries), budget,
+            f'{name} {params} ran {len(ctx.captured_queries)} queries '
+            f'(budget {budget}):\n'
+            + '\n'.join(q['sql'] for q in ctx.captured_queries),
+        )
+        return len(ctx.captured_queries)
+
+    def test_query_budgets(self):
+        for name, kwargs, params, budget in QUERY_BUDGETS:
+            with self.subTest(name=name, params=params):
+                self.get_with_budget(name, kwargs, params, budget)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        before = {}
+        for index, (name, kwargs, params, budget) in enumerate(QUERY_BUDGETS):
+            before[index] = self.get_with_budget(name, kwargs, params, budget)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_dataset(parks=2, trails_per_park=10, pois_per_park=10)
+        for index, (name, kwargs, params, budget) in enumerate(QUERY_BUDGETS):
+            with self.subTest(name=name, params=params):
+                self.assertEqual(
+                    self.get_with_budget(name, kwargs, params, budget), before[index]
+                )
+
+    def test_every_url_has_a_budget(self):
+        named = {
+            pattern.name for pattern in mtb_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        }
+        budgeted = {name for name, *_ in QUERY_BUDGETS}
+        self.assertEqual(named - budgeted - WRITE_ONLY_URLS, set(), 'URLs without a query budget')
+
+    def test_geometry_level_keeps_other_deferrals(self):
+        expected = Trail.objects.only('path_coarse').get(name='Trail 0-0').path_coarse
+        with self.assertNumQueries(1):
+            trail = Trail.objects.with_park().at_level('coarse').get(name='Trail 0-0')
+            self.assertEqual(getattr(trail, LEVEL_GEOMETRY), expected)
+            self.assertLessEqual({'path', 'path_coarse', 'search_vector'}, trail.get_deferred_fields())
+            self.assertIn('boundary', trail.park.get_deferred_fields())
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unchanged_collection_returns_304(self):
+        url = reverse('mtb_trails:trails-geojson')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('ETag'))
+        # No Last-Modified: max(updated_at) would not change on a delete
+        self.assertFalse(first.has_header('Last-Modified'))
+
+        # Only the version query runs; the view is skipped entirely
+        with self.assertNumQueries(1):
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_changes_and_parameters_change_the_etag(self):
+        url = reverse('mtb_trails:trails-geojson')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'zoom': '7'})['ETag'], etag)
+
+        trail = Trail.objects.first()
+        trail.name = 'Renamed'
+        trail.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        etag = response['ETag']
+        Trail.objects.filter(pk=trail.pk).delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date()).status_code, 200)
+
+    def test_update_stamped_before_the_newest_row_changes_the_etag(self):
+        url = reverse('mtb_trails:trails-geojson')
+        etag = self.client.get(url)['ETag']
+        # A bulk update stamped by an app clock running behind: neither the
+        # row count nor max(updated_at) changes
+        newest = Trail.objects.order_by('-updated_at').first().updated_at
+        trail = Trail.objects.order_by('updated_at').first()
+        self.client.force_login(User.objects.create_user('field-app'))
+        with mock.patch('django.utils.timezone.now', return_value=newest - timedelta(hours=1)):
+            self.client.post(reverse('mtb_trails:trails-bulk'), {'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature', 'id': trail.pk,
+                'geometry': {'type': 'LineString', 'coordinates': [[-6.49, 53.03], [-6.47, 53.04]]},
+                'properties': {'name': 'Moved', 'difficulty': 'beginner', 'length_km': 1.5,
+                               'elevation_gain_m': 20, 'park': trail.park_id},
+            }]}, content_type='application/json')
+        self.assertEqual(Trail.objects.order_by('-updated_at').first().updated_at, newest)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Moved', response.content.decode())
+
+
+class CachedResponseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_request_is_served_from_cache(self):
+        url = reverse('mtb_trails:search-trails')
+        first = self.client.get(url, {'q': 'Trail'})
+        with self.assertNumQueries(0):
+            second = self.client.get(url, {'q': 'Trail'})
+        self.assertEqual(second.content, first.content)
+
+    def test_writes_invalidate_dependent_responses(self):
+        url = reverse('mtb_trails:search-trails')
+        self.client.get(url, {'q': 'Trail'})
+
+        park = self.parks[0]
+        park.name = 'Renamed Park'
+        with self.captureOnCommitCallbacks(execute=True):
+            park.save()
+        self.assertContains(self.client.get(url, {'q': 'Trail'}), 'Renamed Park')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Trail.objects.filter(park=park).first().delete()
+        response = self.client.get(url, {'q': 'Trail'})
+        self.assertEqual(len(response.json()['features']), Trail.objects.count())
+
+    def test_hit_has_the_headers_of_the_miss(self):
+        for url, params in [
+            (reverse('mtb_trails:trails-geojson'), {}),
+            (reverse('mtb_trails:async-trails-geojson'), {}),
+            (reverse('mtb_trails:search-trails'), {'q': 'Trail'}),
+        ]:
+            with self.subTest(url=url):
+                miss = self.client.get(url, params)
+                hit = self.client.get(url, params)
+                self.assertEqual(hit.content, miss.content)
+                self.assertIn('Accept', miss['Vary'])
+                ignored = {'Server-Timing', 'Content-Length'}
+                self.assertEqual(
+                    {name: value for name, value in hit.items() if name not in ignored},
+                    {name: value for name, value in miss.items() if name not in ignored},
+                )
+
+
+class AsyncViewsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_responses_as_the_sync_views(self):
+        park = self.parks[0]
+        for name, kwargs, params in [
+            ('parks-geojson', {}, {}),
+            ('trails-geojson', {}, {'zoom': '10'}),
+            ('pois-geojson', {}, {'zoom': '8'}),
+            ('park-trails', {'park_id': park.pk}, {}),
+            ('park-pois', {'park_id': park.pk}, {}),
+            ('nearest-trails', {}, {'lat': '53.02', 'lng': '-6.45', 'k': '3'}),
+            ('trails-within-radius', {}, {'lat': '53.02', 'lng': '-6.45', 'radius_km': '20'}),
+            ('trails-in-park', {}, {'park': str(park.pk)}),
+        ]:
+            with self.subTest(name=name):
+                sync = self.client.get(reverse(f'mtb_trails:{name}', kwargs=kwargs), params)
+                response = self.client.get(reverse(f'mtb_trails:async-{name}', kwargs=kwargs), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), sync.json())
+
+    def test_streamed_collection_matches(self):
+        url = reverse('mtb_trails:async-trails-geojson')
+        response = self.client.get(url, {'stream': '1'})
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(streamed['features']), Trail.objects.count())
+
+    def test_unchanged_collection_returns_304(self):
+        url = reverse('mtb_trails:async-trails-geojson')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_errors(self):
+        response = self.client.get(reverse('mtb_trails:async-park-trails', kwargs={'park_id': 0}))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('mtb_trails:async-trails-in-park'), {'polygon': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('mtb_trails:async-parks-geojson'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_same_errors_as_the_sync_views(self):
+        for name, params in [
+            ('nearest-trails', {'radius': 'far'}),
+            ('trails-within-radius', {'lat': 'north'}),
+            ('trails-in-park', {'polygon': 'nope'}),
+            ('trails-in-park', {'park': 'first'}),
+            ('trails-in-park', {}),
+        ]:
+            with self.subTest(name=name, params=params):
+                sync = self.client.get(reverse(f'mtb_trails:{name}'), params)
+                response = self.client.get(reverse(f'mtb_trails:async-{name}'), params)
+                self.assertEqual((sync.status_code, response.status_code), (400, 400))
+                self.assertEqual(response.json(), sync.json())
+
+
+# FlatGeobuf files start with "fgb", the major version, "fgb", the patch version
+FLATGEOBUF_MAGIC = b'fgb\x03fgb'
+
+
+class BinaryFormatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_format_parameter(self):
+        for name in ['trails-geojson', 'parks-geojson', 'pois-geojson', 'trail-list', 'park-list', 'poi-list']:
+            with self.subTest(name=name):
+                url = reverse(f'mtb_trails:{name}')
+                response = self.client.get(url, {'format': 'fgb'})
+                self.assertEqual(response['Content-Type'], 'application/flatgeobuf')
+                self.assertTrue(response.content.startswith(FLATGEOBUF_MAGIC))
+                response = self.client.get(url, {'format': 'geobuf'})
+                self.assertEqual(response['Content-Type'], 'application/x-protobuf')
+                self.assertTrue(response.content)
+
+    def test_accept_header(self):
+        url = reverse('mtb_trails:trails-geojson')
+        response = self.client.get(url, HTTP_ACCEPT='application/flatgeobuf')
+        self.assertEqual(response['Content-Type'], 'application/flatgeobuf')
+        self.assertTrue(response.content.startswith(FLATGEOBUF_MAGIC))
+        # Smaller than the same features as GeoJSON
+        self.assertLess(len(response.content), len(self.client.get(url).content))
+
+    def test_paged_list_links(self):
+        url = reverse('mtb_trails:trail-list')
+        with mock.patch('mtb_trails.views.encode_features', wraps=encode_features) as encode:
+            response = self.client.get(url, {'format': 'fgb', 'page_size': '3'})
+        self.assertIn('rel="next"', response['Link'])
+        # Features in page order
+        self.assertEqual(encode.call_args.args[1].query.order_by, ('id',))
+
+    def test_errors_stay_json(self):
+        url = reverse('mtb_trails:pois-geojson')
+        response = self.client.get(url, {'format': 'fgb', 'zoom': '99'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('error', response.json())
+
+
+def _protobuf_fields(data):
+    """(field number, value) of a protobuf message with varint and bytes fields"""
+    def varint(position):
+        value = shift = 0
+        while True:
+            byte = data[position]
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            position += 1
+            if byte < 0x80:
+                return value, position
+
+    position = 0
+    while position < len(data):
+        key, position = varint(position)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, position = varint(position)
+        elif wire_type == 2:
+            length, position = varint(position)
+            value, position = data[position:position + length], position + length
+        else:
+            raise ValueError(f'Unexpected wire type {wire_type}')
+        yield field, value
+
+
+def decode_mvt(tile):
+    """{layer name: feature count} of a Mapbox Vector Tile"""
+    layers = {}
+    for field, layer in _protobuf_fields(tile):
+        if field == 3:  # Tile.layers
+            fields = list(_protobuf_fields(layer))
+            name = next(value for number, value in fields if number == 1).decode()
+            layers[name] = sum(1 for number, _ in fields if number == 2)
+    return layers
+
+
+class VectorTileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=1)
+
+    def tile(self, layer, z, x, y):
+        return self.client.get(reverse('mtb_trails:vector-tile', kwargs={'layer': layer, 'z': z, 'x': x, 'y': y}))
+
+    def test_tile_over_a_park(self):
+        # z10 tile 493/333 covers the park (-6.5..-6.42, 53.0..53.08) but
+        # not the standalone trail and POI
+        park = self.parks[0]
+        for layer, count in [
+            ('trails', Trail.objects.filter(park=park).count()),
+            ('parks', 1),
+            ('pois', POI.objects.filter(park=park).count()),
+        ]:
+            with self.subTest(layer=layer):
+                response = self.tile(layer, 10, 493, 333)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+                self.assertEqual(decode_mvt(response.content), {layer: count})
+
+    def test_tile_outside_the_data_is_empty(self):
+        response = self.tile('trails', 8, 0, 0)
+        self.assertIn(response.status_code, (200, 204))
+        self.assertEqual(response.content, b'')
+
+    def test_unknown_layer_and_out_of_range_tiles(self):
+        self.assertEqual(self.tile('roads', 10, 493, 333).status_code, 404)
+        self.assertEqual(self.tile('trails', 10, 1024, 333).status_code, 404)
+
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="53.00" lon="-6.50" version="1"/>
+  <node id="2" lat="53.01" lon="-6.49" version="1"/>
+  <node id="3" lat="53.02" lon="-6.48" version="1"/>
+  <node id="4" lat="53.03" lon="-6.47" version="1"/>
+  <node id="10" lat="53.00" lon="-6.50" version="1"/>
+  <node id="11" lat="53.00" lon="-6.40" version="1"/>
+  <node id="12" lat="53.10" lon="-6.40" version="1"/>
+  <node id="13" lat="53.10" lon="-6.50" version="1"/>
+  <node id="20" lat="53.05" lon="-6.45" version="1"><tag k="amenity" v="parking"/></node>
+  <node id="21" lat="53.05" lon="-6.44" version="1"><tag k="amenity" v="cafe"/><tag k="name" v="{cafe}"/></node>
+  <node id="22" lat="53.05" lon="-6.43" version="1"><tag k="amenity" v="bench"/></node>
+  <way id="100" version="1"><nd ref="1"/><nd ref="2"/><nd ref="3"/></way>
+  <way id="101" version="1"><nd ref="3"/><nd ref="4"/></way>
+  <way id="200" version="1">
+    <nd ref="10"/><nd ref="11"/><nd ref="12"/><nd ref="13"/><nd ref="10"/>
+    <tag k="leisure" v="park"/><tag k="name" v="Test Park"/>
+  </way>
+  <relation id="300" version="1">
+    <member type="way" ref="100" role=""/><member type="way" ref="101" role=""/>
+    <tag k="type" v="route"/><tag k="route" v="mtb"/><tag k="name" v="Red Loop"/>
+    <tag k="mtb:scale:imba" v="3"/>
+  </relation>
+</osm>
+"""
+
+
+def decode_topology(topology, name):
+    """{feature id: rings/lines as lists of [lng, lat]} of one TopoJSON object"""
+    (scale_x, scale_y), (x0, y0) = topology['transform']['scale'], topology['transform']['translate']
+    arcs = []
+    for arc in topology['arcs']:
+        x = y = 0
+        points = []
+        for dx, dy in arc:
+            x, y = x + dx, y + dy
+            points.append([round(x0 + x * scale_x, 9), round(y0 + y * scale_y, 9)])
+        arcs.append(points)
+
+    def line(refs):
+        points = []
+        for ref in refs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            points += arc if not points else arc[1:]
+        return points
+
+    return {
+        geometry['id']: [line(refs) for refs in geometry['arcs']]
+        for geometry in topology['objects'][name]['geometries']
+    }
+
+
+class TopoJSONTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Two parks sharing their x=-6.4 edge
+        cls.west = Park.objects.create(name='West', boundary=Polygon.from_bbox((-6.5, 53.0, -6.4, 53.1)))
+        cls.east = Park.objects.create(name='East', boundary=Polygon.from_bbox((-6.4, 53.0, -6.3, 53.1)))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_shared_edge_is_one_arc(self):
+        response = self.client.get(reverse('mtb_trails:parks-geojson'), {'format': 'topojson'})
+        topology = response.json()
+        self.assertEqual(topology['type'], 'Topology')
+        # The shared edge, plus the rest of each square
+        self.assertEqual(len(topology['arcs']), 3)
+        west, east = [
+            {ref if ref >= 0 else ~ref for ring in geometry['arcs'] for ref in ring}
+            for geometry in topology['objects']['parks']['geometries']
+        ]
+        self.assertEqual(len(west & east), 1)
+
+        rings = decode_topology(topology, 'parks')
+        for park in [self.west, self.east]:
+            self.assertEqual(
+                {tuple(point) for point in rings[park.pk][0]},
+                {tuple(round(c, 9) for c in point) for point in park.boundary.coords[0]},
+            )
+
+    def test_shared_trail_section_is_one_arc(self):
+        Trail.objects.create(name='A', difficulty='beginner', length_km=1, path=LineString(
+            (-6.45, 53.01), (-6.44, 53.02), (-6.43, 53.03), (-6.42, 53.03), srid=4326,
+        ))
+        Trail.objects.create(name='B', difficulty='beginner', length_km=1, path=LineString(
+            (-6.46, 53.02), (-6.44, 53.02), (-6.43, 53.03), (-6.43, 53.05), srid=4326,
+        ))
+        topology = self.client.get(reverse('mtb_trails:trails-geojson'), {'format': 'topojson'}).json()
+        # A and B each have a piece of their own on either side of the shared one
+        self.assertEqual(len(topology['arcs']), 5)
+
+    def test_precision(self):
+        Park.objects.filter(pk=self.west.pk).update(
+            boundary=Polygon.from_bbox((-6.512345678, 53.0, -6.4, 53.1)),
+        )
+        data = self.client.get(reverse('mtb_trails:parks-geojson'), {'precision': '3'}).json()
+        coordinates = [c for f in data['features'] for ring in f['geometry']['coordinates'] for p in ring for c in p]
+        self.assertIn(-6.512, coordinates)
+        self.assertTrue(all(round(c, 3) == c for c in coordinates))
+
+        topology = self.client.get(
+            reverse('mtb_trails:parks-geojson'), {'format': 'topojson', 'precision': '3'},
+        ).json()
+        self.assertEqual(topology['transform']['scale'], [0.001, 0.001])
+        self.assertTrue(all(isinstance(c, int) for arc in topology['arcs'] for p in arc for c in p))
+
+
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=1)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        root_setting = self.settings(SNAPSHOT_ROOT=directory.name)
+        root_setting.enable()
+        self.addCleanup(root_setting.disable)
+        self.root = directory.name
+
+    def build(self, **options):
+        call_command('build_snapshots', stdout=io.StringIO(), **options)
+        return snapshots.read_manifest()
+
+    def test_build_snapshots(self):
+        manifest = self.build()
+        expected = {name for layer in snapshots.LAYERS for name, _ in snapshots.snapshot_variants(layer)}
+        self.assertEqual(set(manifest), expected)
+        for hashed_name in manifest.values():
+            self.assertTrue(os.path.exists(os.path.join(self.root, hashed_name)))
+            self.assertTrue(os.path.exists(os.path.join(self.root, hashed_name + '.gz')))
+        # Unchanged rows, unchanged names
+        self.assertEqual(self.build(), manifest)
+
+        Trail.objects.filter(pk=self.parks[0].trails.first().pk).update(name='Renamed')
+        second = self.build(layers=['trails'])
+        self.assertNotEqual(second['trails.geojson'], manifest['trails.geojson'])
+        self.assertEqual(second['parks.geojson'], manifest['parks.geojson'])
+        # The previous build's files stay for pages that read the old manifest...
+        self.assertTrue(os.path.exists(os.path.join(self.root, manifest['trails.geojson'])))
+        Trail.objects.filter(name='Renamed').update(name='Renamed again')
+        self.build(layers=['trails'])
+        # ... until the build after
+        self.assertFalse(os.path.exists(os.path.join(self.root, manifest['trails.geojson'])))
+        self.assertTrue(os.path.exists(os.path.join(self.root, second['trails.geojson'])))
+
+    def test_middleware_serves_snapshots(self):
+        manifest = self.build()
+        url = settings.SNAPSHOT_URL + manifest['trails.geojson']
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        self.assertIn('immutable', response['Cache-Control'])
+        body = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(len(body['features']), Trail.objects.count())
+
+        compressed = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        manifest_response = self.client.get(settings.SNAPSHOT_URL + snapshots.MANIFEST_NAME)
+        self.assertNotIn('immutable', manifest_response.get('Cache-Control', ''))
+
+        self.assertEqual(self.client.get(settings.SNAPSHOT_URL + 'trails.0123456789ab.geojson').status_code, 404)
+        self.assertEqual(self.client.get(settings.SNAPSHOT_URL + '../manage.py').status_code, 404)
+
+    def test_writes_mark_layers_pending(self):
+        park = self.parks[0]
+        trail = park.trails.first()
+        with self.captureOnCommitCallbacks(execute=True):
+            trail.save()
+        self.assertEqual(snapshots.pending_layers(), ['trails'])
+        with self.captureOnCommitCallbacks(execute=True):
+            park.save()
+        self.assertEqual(snapshots.pending_layers(), ['parks', 'pois', 'trails'])
+
+        manifest = self.build(pending=True)
+        self.assertEqual(snapshots.pending_layers(), [])
+        self.assertIn('trails.geojson', manifest)
+        self.assertEqual(snapshots.build_pending(), [])
+
+        with self.settings(SNAPSHOTS_AUTO_REBUILD=False), self.captureOnCommitCallbacks(execute=True):
+            trail.save()
+        self.assertEqual(snapshots.pending_layers(), [])
+
+    def test_watch_survives_a_failed_pass(self):
+        class Stop(Exception):
+            pass
+
+        command = 'mtb_trails.management.commands.build_snapshots'
+        stdout = io.StringIO()
+        with mock.patch(f'{command}.build_pending', side_effect=[OSError('disk full'), ['trails']]), \
+                mock.patch(f'{command}.time.sleep', side_effect=[None, Stop]), \
+                self.assertLogs(command, 'ERROR'), self.assertRaises(Stop):
+            call_command('build_snapshots', watch=True, interval=0, stdout=stdout)
+        self.assertIn('rebuilt trails', stdout.getvalue())
+
+
+@unittest.skipIf(osmium is None, 'pyosmium is not installed')
+class ImportOSMTests(TestCase):
+    def import_extract(self, cafe='Trail Cafe'):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'extract.osm')
+            with open(path, 'w') as extract:
+                extract.write(OSM_EXTRACT.format(cafe=cafe))
+            call_command('import_osm', path, batch_size=1, stdout=io.StringIO())
+
+    def test_import_maps_features(self):
+        self.import_extract()
+        trail = Trail.objects.get(source='osm', source_id='relation/300')
+        self.assertEqual(trail.name, 'Red Loop')
+        self.assertEqual(trail.difficulty, 'expert')
+        self.assertEqual(len(trail.path), 4)  # both member ways, merged
+        self.assertGreater(trail.length_km, 3)
+        self.assertTrue(Park.objects.filter(source_id='way/200', name='Test Park').exists())
+        self.assertEqual(
+            sorted(POI.objects.values_list('source_id', 'type')),
+            [('node/20', 'parking'), ('node/21', 'cafe')],
+        )
+
+    def test_reimport_only_touches_changed_rows(self):
+        self.import_extract()
+        before = dict(POI.objects.values_list('source_id', 'updated_at'))
+        trail_updated = Trail.objects.get().updated_at
+
+        self.import_extract(cafe='Renamed Cafe')
+        self.assertEqual(POI.objects.count(), 2)
+        after = dict(POI.objects.values_list('source_id', 'updated_at'))
+        self.assertEqual(after['node/20'], before['node/20'])
+        self.assertNotEqual(after['node/21'], before['node/21'])
+        self.assertEqual(Trail.objects.get().updated_at, trail_updated)
+        self.assertEqual(POI.objects.get(source_id='node/21').name, 'Renamed Cafe')
+
+
+GPX_TRACK = """<?xml version="1.0"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">
+  <trk><name>Club Loop</name><trkseg>
+    <trkpt lat="53.00" lon="-6.50"><ele>100</ele></trkpt>
+    <trkpt lat="53.01" lon="-6.49"><ele>130</ele></trkpt>
+    <trkpt lat="53.02" lon="-6.48"><ele>120</ele></trkpt>
+  </trkseg></trk>
+</gpx>
+"""
+# Starts a second segment far from the end of the first
+GPX_SEGMENT = """</trkseg><trkseg>
+    <trkpt lat="53.20" lon="-6.30"></trkpt>
+    <trkpt lat="53.21" lon="-6.29"></trkpt>
+  """
+GEOJSON_TRACK = (
+    '{"type": "Feature", "properties": {"name": "Club Red", "difficulty": "expert"},'
+    ' "geometry": {"type": "LineString", "coordinates": [[-6.40, 53.10], [-6.39, 53.11]]}}'
+)
+
+
+class ImportTracksTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        for name, content in [('loop.gpx', GPX_TRACK), ('red.geojson', GEOJSON_TRACK),
+                              ('broken.gpx', 'not xml')]:
+            with open(os.path.join(self.directory, name), 'w') as track:
+                track.write(content)
+
+    def import_tracks(self, workers=1, **options):
+        stdout = io.StringIO()
+        call_command('import_tracks', self.directory, workers=workers,
+                     stdout=stdout, stderr=io.StringIO(), **options)
+        return stdout.getvalue()
+
+    def test_import_computes_length_and_skips_bad_files(self):
+        park = make_dataset(parks=1, trails_per_park=0, pois_per_park=0)[0]
+        self.import_tracks(park=park.pk)
+        loop = Trail.objects.get(source_id='loop.gpx')
+        self.assertEqual(loop.name, 'Club Loop')
+        self.assertAlmostEqual(loop.length_km, 2.6, places=1)
+        self.assertEqual(loop.elevation_gain_m, 30)
+        self.assertEqual(loop.park, park)
+        self.assertEqual(Trail.objects.get(source_id='red.geojson').difficulty, 'expert')
+        self.assertFalse(Trail.objects.filter(source_id='broken.gpx').exists())
+
+    def test_reimport_skips_existing_tracks(self):
+        self.assertIn('2 trails created, 0 already imported', self.import_tracks())
+        count = Trail.objects.count()
+        self.assertIn('0 trails created, 2 already imported', self.import_tracks(batch_size=1))
+        self.assertEqual(Trail.objects.count(), count)
+
+    def test_parallel_import(self):
+        self.assertIn('2 trails created', self.import_tracks(workers=2))
+        self.assertEqual(Trail.objects.get(source_id='loop.gpx').elevation_gain_m, 30)
+        self.assertIsNotNone(Trail.objects.get(source_id='red.geojson').search_vector)
+
+    def test_segments_become_separate_trails(self):
+        with open(os.path.join(self.directory, 'loop.gpx'), 'w') as track:
+            track.write(GPX_TRACK.replace('</trkseg></trk>', GPX_SEGMENT + '</trkseg></trk>'))
+        self.import_tracks()
+        first, second = Trail.objects.filter(source_id__startswith='loop.gpx').order_by('source_id')
+        self.assertEqual((first.source_id, first.name), ('loop.gpx#1', 'Club Loop (1)'))
+        self.assertEqual((second.source_id, second.name), ('loop.gpx#2', 'Club Loop (2)'))
+        self.assertAlmostEqual(first.length_km, 2.6, places=1)
+        self.assertEqual(len(second.path), 2)
+
+    def test_limits_match_the_model(self):
+        field = Trail._meta.get_field
+        self.assertEqual(tracks.DIFFICULTIES, [value for value, _ in field('difficulty').choices])
+        self.assertEqual(tracks.NAME_LENGTH, field('name').max_length)
+        self.assertEqual(tracks.SOURCE_ID_LENGTH, field('source_id').max_length)
+
+
+@unittest.skipIf(numpy is None, 'numpy/rasterio are not installed')
+class ElevationEnrichmentTests(TestCase):
+    def setUp(self):
+        import rasterio
+        from rasterio.transform import from_origin
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache_setting = self.settings(DEM_CACHE_DIR=os.path.join(tmp.name, 'cache'))
+        cache_setting.enable()
+        self.addCleanup(cache_setting.disable)
+        self.dem = os.path.join(tmp.name, 'dem.tif')
+        # Elevation rises 1 m per 0.001 degree pixel towards the east
+        band = numpy.tile(numpy.arange(400, dtype='float32'), (400, 1))
+        with rasterio.open(
+            self.dem, 'w', driver='GTiff', height=400, width=400, count=1,
+            dtype='float32', crs='EPSG:4326', transform=from_origin(-6.6, 53.2, 0.001, 0.001),
+        ) as dem:
+            dem.write(band, 1)
+        self.trail = Trail.objects.create(
+            name='Out and back', difficulty='beginner', length_km=10, elevation_gain_m=0,
+            path=LineString((-6.55, 53.1), (-6.45, 53.1), (-6.5, 53.1), srid=4326),
+        )
+
+    def enrich(self, workers=1, force=False):
+        call_command('enrich_elevation', self.dem, workers=workers, force=force, stdout=io.StringIO())
+
+    def test_profile_metrics_and_endpoint(self):
+        self.enrich()
+        self.trail.refresh_from_db()
+        self.assertAlmostEqual(self.trail.elevation_gain_m, 100, delta=1)
+        response = self.client.get(reverse('mtb_trails:trail-profile', kwargs={'pk': self.trail.pk}))
+        self.assertEqual(response.status_code, 200)
+        profile = response.json()
+        self.assertAlmostEqual(profile['elevation_loss_m'], 50, delta=1)
+        self.assertAlmostEqual(profile['max_gradient_pct'], 1.5, delta=0.1)
+        self.assertEqual(profile['spacing_m'], 25)
+
+    def test_unchanged_trails_are_skipped(self):
+        self.enrich()
+        updated_at = TrailProfile.objects.get().updated_at
+        self.enrich()
+        self.assertEqual(TrailProfile.objects.get().updated_at, updated_at)
+
+        self.trail.path = LineString((-6.55, 53.1), (-6.5, 53.1), srid=4326)
+        self.trail.save()
+        self.enrich()
+        self.assertEqual(TrailProfile.objects.get().elevation_loss_m, 0)
+
+    def test_decoded_band_is_reused_across_runs(self):
+        self.enrich()
+        with mock.patch('mtb_trails.elevation.copy_band', wraps=dem.copy_band) as copy_band:
+            self.enrich(force=True)
+        copy_band.assert_not_called()
+        self.assertAlmostEqual(TrailProfile.objects.get().elevation_gain_m, 100, delta=1)
+
+    def test_only_enriched_trails_are_refreshed(self):
+        with mock.patch('mtb_trails.management.commands.enrich_elevation.bulk_write_finished') as finished:
+            self.enrich()
+        self.assertEqual(finished.call_args.kwargs['changed_ids'][Trail], [self.trail.pk])
+
+    def test_parallel_workers(self):
+        self.enrich(workers=2)
+        self.assertAlmostEqual(TrailProfile.objects.get().elevation_gain_m, 100, delta=1)
+
+    def test_wkb_in_either_byte_order(self):
+        for wkb in (struct.pack('<BII4d', 1, 2, 2, -6.5, 53.1, -6.4, 53.2),
+                    struct.pack('>BII4d', 0, 2, 2, -6.5, 53.1, -6.4, 53.2)):
+            self.assertEqual(dem.linestring_coords(wkb).tolist(), [[-6.5, 53.1], [-6.4, 53.2]])
+        with self.assertRaises(ValueError):
+            dem.linestring_coords(struct.pack('<BI2d', 1, 1, -6.5, 53.1))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.park = Park.objects.create(
+            name='Ballyhoura', boundary=Polygon.from_bbox((-8.5, 52.2, -8.4, 52.3)),
+        )
+        path = LineString((-8.45, 52.25), (-8.44, 52.26), srid=4326)
+        for name, description in [
+            ('Streamline Red', 'Fast flowing singletrack'),
+            ('Greenwood Loop', 'Family loop past the streamline bridge'),
+            ('Castle Descent', ''),
+        ]:
+            Trail.objects.create(
+                name=name, description=description, park=cls.park, path=path,
+                difficulty='intermediate', length_km=5, elevation_gain_m=100,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, **params):
+        response = self.client.get(reverse('mtb_trails:search-trails'), params)
+        return [feature['properties']['name'] for feature in response.json()['features']]
+
+    def test_results_are_ranked_and_limited(self):
+        self.assertEqual(self.search(q='streamline'), ['Streamline Red', 'Greenwood Loop'])
+        self.assertEqual(self.search(q='streamline', limit='1'), ['Streamline Red'])
+        self.assertEqual(self.search(), [])
+
+    def test_matches_park_name_and_typos(self):
+        self.assertEqual(len(self.search(q='ballyhoura')), 3)
+        self.assertIn('Castle Descent', self.search(q='Castel Descent'))
+
+    def test_park_rename_reindexes_its_trails(self):
+        self.park.name = 'Glenmore'
+        self.park.save()
+        self.assertEqual(len(self.search(q='glenmore')), 3)
+
+    def test_autocomplete_returns_ids_and_names(self):
+        response = self.client.get(reverse('mtb_trails:autocomplete-trails'), {'q': 'str'})
+        trail = Trail.objects.get(name='Streamline Red')
+        self.assertEqual(response.json(), [{'id': trail.pk, 'name': 'Streamline Red'}])
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=3, trails_per_park=6, pois_per_park=4)
+
+    def walk(self, name, params):
+        """Follow next links; return the feature ids and queries per page"""
+        ids, queries = [], []
+        url = reverse(f'mtb_trails:{name}')
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                page = self.client.get(url, params).json()
+            params = {}  # the next link carries the query string
+            queries.append(len(ctx.captured_queries))
+            ids += [feature['id'] for feature in page['features']]
+            url = page['next']
+        return ids, queries
+
+    def test_pages_cover_filtered_rows_in_id_order(self):
+        bbox = '-6.5,52.9,-6.3,53.5'  # the first two parks
+        ids, queries = self.walk('trail-list', {'in_bbox': bbox, 'page_size': '5'})
+        expected = list(
+            Trail.objects.filter(path__contained=Polygon.from_bbox((-6.5, 52.9, -6.3, 53.5)))
+            .order_by('id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertGreater(len(queries), 2)
+        self.assertEqual(set(queries), {1})  # deep pages cost the same
+
+    def test_distance_filter_and_page_size_cap(self):
+        with mock.patch.object(GeoJsonCursorPagination, 'max_page_size', 3):
+            ids, _ = self.walk('poi-list', {'dist': '20000', 'point': '-6.4,53.0', 'page_size': '100'})
+            page = self.client.get(reverse('mtb_trails:poi-list'), {'page_size': '100'}).json()
+        self.assertEqual(len(page['features']), 3)
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertNotIn(POI.objects.get(name='Standalone Shop').pk, ids)
+
+
+class NearestTrailsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_dataset(parks=3, trails_per_park=6, pois_per_park=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def nearest(self, **params):
+        params = {'lat': '53.0', 'lng': '-6.6', **params}
+        return self.client.get(reverse('mtb_trails:nearest-trails'), params).json()['features']
+
+    def test_k_nearest_in_distance_order(self):
+        features = self.nearest(k='4')
+        distances = [feature['properties']['distance_m'] for feature in features]
+        self.assertEqual(len(features), 4)
+        self.assertEqual(distances, sorted(distances))
+        # The first park's trails are the closest to a point west of it
+        self.assertEqual({f['properties']['park_name'] for f in features}, {'Park 0'})
+        self.assertGreater(distances[0], 0)
+
+    def test_radius_limits_results(self):
+        features = self.nearest(k='100', radius='8')
+        self.assertTrue(features)
+        self.assertTrue(all(f['properties']['distance_m'] <= 8000 for f in features))
+        self.assertLess(len(features), Trail.objects.count())
+
+    def test_ranked_by_metres_not_degrees(self):
+        # Closer in degrees to the north, closer in metres to the east
+        for name, path in [('North', ((-8.0, 54.05), (-7.999, 54.05))),
+                           ('East', ((-7.92, 54.0), (-7.92, 54.001)))]:
+            Trail.objects.create(name=name, difficulty='beginner', length_km=1,
+                                 elevation_gain_m=0, path=LineString(*path, srid=4326))
+        features = self.nearest(lat='54.0', lng='-8.0', k='1', radius='20')
+        self.assertEqual([f['properties']['name'] for f in features], ['East'])
+
+    def test_bad_parameters_are_a_400(self):
+        response = self.client.get(reverse('mtb_trails:nearest-trails'), {'lat': '53.0', 'k': 'ten'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'lat, lng, radius and k must be numbers'})
+
+
+class RadiusSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_dataset(parks=3, trails_per_park=2, pois_per_park=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_features_and_count_come_from_one_query(self):
+        params = {'lat': '53.0', 'lng': '-6.6', 'radius_km': '12'}
+        with CaptureQueriesContext(connection) as ctx:
+            body = self.client.get(reverse('mtb_trails:trails-within-radius'), params).json()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        names = {feature['properties']['name'] for feature in body['features']}
+        self.assertEqual(names, {'Trail 0-0', 'Trail 0-1'})
+        self.assertEqual(body['query']['count'], 2)
+
+    def test_geography_columns_follow_updates(self):
+        trail = Trail.objects.get(name='Standalone Trail')
+        point = Point(-6.6, 53.0, srid=4326)
+        self.assertFalse(Trail.objects.within(point, D(km=1)).filter(pk=trail.pk).exists())
+        trail.path = LineString((-6.6, 53.001), (-6.61, 53.01), srid=4326)
+        trail.save()
+        self.assertTrue(Trail.objects.within(point, D(km=1)).filter(pk=trail.pk).exists())
+
+    def test_poi_distance_filter_is_in_meters(self):
+        # 0.01 degrees of longitude is ~670 m at this latitude, not ~1.1 km
+        POI.objects.create(name='East', type='cafe', location=Point(-6.59, 53.0, srid=4326))
+        for dist, expected in [('700', ['East']), ('600', [])]:
+            page = self.client.get(
+                reverse('mtb_trails:poi-list'), {'point': '-6.6,53.0', 'dist': dist}
+            ).json()
+            self.assertEqual([f['properties']['name'] for f in page['features']], expected)
+
+
+class ParkMembershipTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=2, trails_per_park=2, pois_per_park=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def member_ids(self, park):
+        return set(park.trail_memberships.values_list('trail_id', flat=True))
+
+    def test_detailed_boundary_is_subdivided(self):
+        # A circle with many more vertices than one part may hold
+        boundary = Point(-7.0, 53.0, srid=4326).buffer(0.05, quadsegs=256)
+        park = Park.objects.create(name='Round Park', boundary=boundary)
+        parts = ParkBoundaryPart.objects.filter(park=park)
+        self.assertGreater(parts.count(), 1)
+        self.assertTrue(all(part.geom.num_points <= MAX_VERTICES for part in parts))
+        response = self.client.get(reverse('mtb_trails:parks-containing'), {'lat': '53.0', 'lng': '-7.0'})
+        self.assertEqual([f['properties']['name'] for f in response.json()['features']], ['Round Park'])
+
+    def test_membership_follows_trail_and_park_edits(self):
+        park0, park1 = self.parks
+        trail = park0.trails.first()
+        self.assertIn(trail.pk, self.member_ids(park0))
+        # Move the trail into the second park; its assigned park stays the same
+        trail.path = LineString((-6.39, 53.01), (-6.38, 53.02), srid=4326)
+        trail.save()
+        self.assertNotIn(trail.pk, self.member_ids(park0))
+        self.assertIn(trail.pk, self.member_ids(park1))
+        # Shrink the second park away from its trails
+        park1.boundary = Polygon.from_bbox((-6.32, 53.07, -6.3, 53.08))
+        park1.save()
+        self.assertEqual(self.member_ids(park1), set())
+        self.assertEqual(park1.poi_memberships.count(), 0)
+
+    def test_trails_in_park_and_containing_point(self):
+        park0, _ = self.parks
+        response = self.client.get(reverse('mtb_trails:trails-in-park'), {'park': park0.pk})
+        ids = {feature['id'] for feature in response.json()['features']}
+        self.assertEqual(ids, set(park0.trails.values_list('id', flat=True)))
+        response = self.client.get(reverse('mtb_trails:parks-containing'), {'lat': '52.0', 'lng': '-6.0'})
+        self.assertEqual(response.json()['features'], [])
+        response = self.client.get(reverse('mtb_trails:parks-containing'), {'lat': '53.0'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ParkStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.parks = make_dataset(parks=2, trails_per_park=3, pois_per_park=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, park):
+        return self.client.get(reverse('mtb_trails:park-detail', kwargs={'pk': park.pk})).json()['properties']['stats']
+
+    def test_stats_block_and_endpoint(self):
+        stats = self.stats(self.parks[0])
+        # make_dataset: lengths 2, 3, 4 km; gains 0, 50, 100 m; one of each difficulty
+        self.assertEqual(stats['trail_count'], 3)
+        self.assertEqual(stats['total_length_km'], 9.0)
+        self.assertEqual(stats['mean_length_km'], 3.0)
+        self.assertEqual(stats['total_elevation_gain_m'], 150.0)
+        self.assertEqual(stats['difficulty_counts'], {'beginner': 1, 'intermediate': 1, 'expert': 1})
+        self.assertEqual(stats['poi_counts'], {'parking': 1, 'trailhead': 1})
+        rows = self.client.get(reverse('mtb_trails:park-stats')).json()
+        self.assertEqual([row['park_name'] for row in rows], ['Park 0', 'Park 1'])
+
+    def test_stats_follow_trail_and_poi_changes(self):
+        park0, park1 = self.parks
+        trail = park0.trails.get(difficulty='expert')
+        trail.park = park1
+        trail.save()
+        self.assertEqual(self.stats(park0)['difficulty_counts']['expert'], 0)
+        self.assertEqual(self.stats(park1)['difficulty_counts']['expert'], 2)
+        park1.pois.first().delete()
+        self.assertEqual(sum(self.stats(park1)['poi_counts'].values()), 1)
+        empty = Park.objects.create(name='Empty', boundary=Polygon.from_bbox((-7, 53, -6.9, 53.1)))
+        self.assertEqual(self.stats(empty)['trail_count'], 0)
+        self.assertIsNone(self.stats(empty)['mean_length_km'])
+        park1.delete()
+        self.assertEqual(self.stats(park0)['trail_count'], 2)
+
+
+class TrailAccessPointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Trail 0-0 runs (-6.49, 53.01) -> (-6.44, 53.01); a parking POI at
+        # (-6.495, 53.005) and a trailhead at (-6.49, 53.005)
+        cls.parks = make_dataset(parks=1, trails_per_park=1, pois_per_park=2)
+        cls.trail = Trail.objects.get(name='Trail 0-0')
+
+    def access(self):
+        url = reverse('mtb_trails:trail-detail', kwargs={'pk': self.trail.pk})
+        return self.client.get(url).json()['properties']['access']
+
+    def test_detail_includes_nearest_access_points(self):
+        access = self.access()
+        self.assertEqual(access['parking']['start']['name'], 'POI 0-0')
+        self.assertAlmostEqual(access['parking']['start']['distance_m'], 649, delta=5)
+        self.assertAlmostEqual(access['trailhead']['start']['distance_m'], 556, delta=5)
+        self.assertIsNone(access['toilets']['start'])
+
+    def test_access_points_follow_poi_and_trail_changes(self):
+        car_park = POI.objects.create(
+            name='End Car Park', type='parking', location=Point(-6.44, 53.01, srid=4326)
+        )
+        self.assertEqual(self.access()['parking']['end'], {'id': car_park.pk, 'name': 'End Car Park', 'distance_m': 0})
+        car_park.location = Point(-8.0, 55.0, srid=4326)
+        car_park.save()
+        self.assertEqual(self.access()['parking']['end']['name'], 'POI 0-0')
+        with self.captureOnCommitCallbacks(execute=True):
+            POI.objects.get(name='POI 0-0').delete()
+        self.assertEqual(self.access()['parking'], {'start': None, 'end': None})
+        self.trail.path = LineString((-6.49, 53.005), (-6.44, 53.01), srid=4326)
+        self.trail.save()
+        self.assertEqual(self.access()['trailhead']['start']['distance_m'], 0)
+
+
+class POIClusteringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Four POIs (parking, trailhead, cafe, toilets) ~1 km apart in each
+        # park, parks ~7 km apart, plus the standalone shop in Dublin
+        make_dataset(parks=3, trails_per_park=1, pois_per_park=4)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **params):
+        return self.client.get(reverse('mtb_trails:pois-geojson'), params)
+
+    def test_clusters_count_every_poi_by_type(self):
+        body = self.get(zoom='5').json()
+        self.assertTrue(body['clustered'])
+        counts = [feature['properties']['count'] for feature in body['features']]
+        self.assertEqual(sum(counts), POI.objects.count())
+        types = {}
+        for feature in body['features']:
+            for type_, count in feature['properties']['types'].items():
+                types[type_] = types.get(type_, 0) + count
+        self.assertEqual(types, {'parking': 3, 'trailhead': 3, 'cafe': 3, 'toilets': 3, 'bike_shop': 1})
+
+    def test_cells_shrink_with_zoom_and_respect_bbox(self):
+        parks_bbox = '-6.6,52.9,-6.2,53.1'
+        coarse = self.get(zoom='8', bbox=parks_bbox).json()['features']
+        fine = self.get(zoom='12', bbox=parks_bbox).json()['features']
+        self.assertEqual(sum(f['properties']['count'] for f in fine), 12)
+        self.assertLess(len(coarse), len(fine))
+        self.assertLess(len(fine), 12)
+        lone = self.get(zoom='12', bbox='-6.3,53.3,-6.2,53.4').json()['features']
+        self.assertEqual(len(lone), 1)
+        self.assertEqual(lone[0]['properties']['name'], 'Standalone Shop')
+        self.assertEqual(lone[0]['geometry']['coordinates'], [-6.26, 53.34])
+
+    def test_individual_pois_above_threshold_zoom(self):
+        body = self.get(zoom='16', bbox='-6.5,52.9,-6.4,53.1').json()
+        self.assertFalse(body['clustered'])
+        self.assertEqual(sorted(f['properties']['name'] for f in body['features']),
+                         ['POI 0-0', 'POI 0-1', 'POI 0-2', 'POI 0-3'])
+        self.assertEqual(self.get(zoom='12', bbox='-6,53').status_code, 400)
+        self.assertEqual(self.get(zoom='30').status_code, 400)
+
+
+class BulkWriteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.park, = make_dataset(parks=1, trails_per_park=2, pois_per_park=1)
+        cls.user = User.objects.create_user('field-app', password='secret')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def trail_feature(self, name, **properties):
+        return {
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': [[-6.49, 53.03], [-6.47, 53.04]]},
+            'properties': {
+                'name': name, 'difficulty': 'beginner', 'length_km': 1.5,
+                'elevation_gain_m': 20, 'park': self.park.pk, **properties,
+            },
+        }
+
+    def post(self, name, features):
+        return self.client.post(
+            reverse(f'mtb_trails:{name}'),
+            {'type': 'FeatureCollection', 'features': features}, content_type='application/json',
+        )
+
+    def test_creates_and_updates_by_id_and_source_id(self):
+        existing = self.park.trails.first()
+        features = [
+            self.trail_feature('Synced 1', source='other', source_id='app/1'),
+            {**self.trail_feature('Renamed'), 'id': existing.pk},
+        ]
+        body = self.post('trails-bulk', features).json()
+        self.assertEqual((body['created'], body['updated'], body['invalid']), (1, 1, 0))
+        self.assertEqual([result['status'] for result in body['results']], ['created', 'updated'])
+        existing.refresh_from_db()
+        self.assertEqual(existing.name, 'Renamed')
+        # The same source_id again updates the row created above
+        body = self.post('trails-bulk', [self.trail_feature('Synced 1b', source='other', source_id='app/1')]).json()
+        self.assertEqual(body['results'][0]['status'], 'updated')
+        self.assertEqual(Trail.objects.get(source_id='app/1').name, 'Synced 1b')
+        # Derived data is refreshed for the whole batch
+        self.assertEqual(Trail.objects.get(name='Renamed').park_memberships.get().park, self.park)
+        self.assertTrue(Trail.objects.filter(name='Synced 1b', search_vector__isnull=False).exists())
+
+    def test_app_clock_behind_the_database(self):
+        existing = self.park.trails.first()
+        behind = timezone.now() - timedelta(hours=1)
+        with mock.patch('django.utils.timezone.now', return_value=behind):
+            self.post('trails-bulk', [self.trail_feature('Late'), {**self.trail_feature('Late 2'), 'id': existing.pk}])
+        # updated_at is an hour in the past, so only refreshing by id finds these
+        for trail in Trail.objects.filter(name__startswith='Late'):
+            self.assertIsNotNone(trail.search_vector)
+            self.assertEqual(trail.park_memberships.get().park, self.park)
+
+    def test_failed_refresh_rolls_back_the_write(self):
+        existing = self.park.trails.first()
+        with mock.patch('mtb_trails.bulk.stats.refresh', side_effect=RuntimeError), \
+                self.assertRaises(RuntimeError):
+            bulk.write(Trail, {'type': 'FeatureCollection', 'features': [
+                self.trail_feature('Orphan'), {**self.trail_feature('Renamed'), 'id': existing.pk},
+            ]})
+        self.assertFalse(Trail.objects.filter(name__in=['Orphan', 'Renamed']).exists())
+
+    def test_invalid_items_are_reported_and_skipped(self):
+        features = [
+            self.trail_feature('Fine'),
+            self.trail_feature('Bad difficulty', difficulty='extreme'),
+            {**self.trail_feature('Point'), 'geometry': {'type': 'Point', 'coordinates': [-6.4, 53.0]}},
+            self.trail_feature('No park', park=999999),
+            {**self.trail_feature('Missing'), 'id': 999999},
+            'not a feature',
+        ]
+        body = self.post('trails-bulk', features).json()
+        self.assertEqual([r['status'] for r in body['results']], ['created'] + ['invalid'] * 5)
+        self.assertIn('difficulty', body['results'][1]['errors'])
+        self.assertIn('path', body['results'][2]['errors'])
+        self.assertIn('park', body['results'][3]['errors'])
+        self.assertTrue(Trail.objects.filter(name='Fine').exists())
+        self.assertEqual(self.post('trails-bulk', {'not': 'features'}).status_code, 400)
+
+    def test_query_count_does_not_grow_with_items(self):
+        def count(n, prefix):
+            features = [{
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [-6.45 + i * 0.001, 53.01]},
+                'properties': {'name': f'{prefix} {i}', 'type': 'parking', 'park': self.park.pk},
+            } for i in range(n)]
+            with CaptureQueriesContext(connection) as ctx:
+                body = self.post('pois-bulk', features).json()
+            self.assertEqual(body['created'], n)
+            return len(ctx.captured_queries)
+        self.assertEqual(count(2, 'Small'), count(20, 'Large'))
+
+    def test_requires_authentication(self):
+        self.client.logout()
+        self.assertEqual(self.post('pois-bulk', []).status_code, 403)
+
+
+class RoutingTests(TestCase):
+    """
+    A square of trails around the crossing X = (-6.45, 53.0):
+    A runs west-east through X, B (expert) south-north through X, C goes
+    north from A's east end and D west from C's top to B's north end.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        def trail(name, difficulty, *coords):
+            return Trail.objects.create(
+                name=name, difficulty=difficulty, length_km=5, elevation_gain_m=0,
+                path=LineString(*coords, srid=4326),
+            )
+        cls.a = trail('A', 'beginner', (-6.50, 53.00), (-6.40, 53.00))
+        cls.b = trail('B', 'expert', (-6.45, 52.95), (-6.45, 53.05))
+        cls.c = trail('C', 'intermediate', (-6.40, 53.00003), (-6.40, 53.05))
+        cls.d = trail('D', 'beginner', (-6.40, 53.05), (-6.45, 53.05))
+
+    def setUp(self):
+        cache.clear()
+
+    def route(self, **params):
+        return self.client.get(reverse('mtb_trails:routes'), params)
+
+    def test_route_through_crossing(self):
+        body = self.route(**{'from': '53.0,-6.499', 'to': '53.049,-6.45'}).json()
+        self.assertEqual(body['trails'], [self.a.pk, self.b.pk])
+        # ~3.3 km along A to X, then ~5.4 km up B
+        self.assertAlmostEqual(body['distance_m'], 8730, delta=150)
+        self.assertAlmostEqual(
+            body['distance_m'], sum(f['properties']['length_m'] for f in body['features']), delta=2
+        )
+        first = body['features'][0]['geometry']['coordinates']
+        self.assertAlmostEqual(first[0][0], -6.499, places=4)
+
+    def test_difficulty_cap_and_via(self):
+        capped = self.route(**{'from': '53.0,-6.499', 'to': '53.049,-6.45', 'max_difficulty': 'intermediate'})
+        self.assertEqual(capped.json()['trails'], [self.a.pk, self.c.pk, self.d.pk])
+        via = self.route(**{'from': '53.0,-6.499', 'via': '53.025,-6.40', 'to': '53.049,-6.45'})
+        self.assertEqual(via.json()['trails'], [self.a.pk, self.c.pk, self.d.pk, self.b.pk])
+        self.assertEqual(self.route(**{'from': '53.0'}).status_code, 400)
+        self.assertEqual(self.route(**{'from': '50.0,-6.499', 'to': '53.049,-6.45'}).status_code, 404)
+
+    def test_graph_follows_trail_changes(self):
+        params = {'from': '53.0,-6.499', 'to': '53.05,-6.43', 'max_difficulty': 'intermediate'}
+        self.assertEqual(self.route(**params).json()['trails'], [self.a.pk, self.c.pk, self.d.pk])
+        # A beginner shortcut from X straight to D
+        with self.captureOnCommitCallbacks(execute=True):
+            shortcut = Trail.objects.create(
+                name='Shortcut', difficulty='beginner', length_km=1, elevation_gain_m=0,
+                path=LineString((-6.45, 53.0), (-6.449, 53.05), srid=4326),
+            )
+        self.assertEqual(self.route(**params).json()['trails'], [self.a.pk, shortcut.pk, self.d.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            shortcut.delete()
+        self.assertEqual(self.route(**params).json()['trails'], [self.a.pk, self.c.pk, self.d.pk])
+
+    def test_previous_graph_survives_an_update(self):
+        network = routing.Network()
+        graph = network.current()
+        Trail.objects.filter(pk=self.b.pk).delete()
+        self.assertIsNot(network.current(), graph)
+        # A request still planning on the old graph can look up the deleted trail
+        self.assertIn(self.b.pk, graph.trails)
+        self.assertGreater(graph.piece_length((self.b.pk, 0.0, 1.0)), 0)
+
+    def test_update_stamped_by_a_slow_clock_rebuilds_the_graph(self):
+        network = routing.Network()
+        graph = network.current()
+        # Same row count and max(updated_at): only the write counter moves
+        stamp = self.b.updated_at - timedelta(hours=1)
+        with mock.patch('django.utils.timezone.now', return_value=stamp):
+            bulk.write(Trail, {'type': 'FeatureCollection', 'features': [{
+                'type': 'Feature', 'id': self.b.pk,
+                'geometry': {'type': 'LineString', 'coordinates': [[-6.0, 52.0], [-6.01, 52.01]]},
+                'properties': {'name': 'B', 'difficulty': 'beginner', 'length_km': 1.5,
+                               'elevation_gain_m': 0},
+            }]})
+        updated = network.current()
+        self.assertIsNot(updated, graph)
+        self.assertNotEqual(updated.trails[self.b.pk].ends, graph.trails[self.b.pk].ends)
+
+    def test_loop_goes_round_the_square(self):
+        response = self.client.get(
+            reverse('mtb_trails:loop-route'), {'from': '53.0,-6.44', 'distance_km': '18'}
+        )
+        body = response.json()
+        self.assertEqual(set(body['trails']), {self.a.pk, self.b.pk, self.c.pk, self.d.pk})
+        self.assertAlmostEqual(body['distance_m'], 17800, delta=600)
+        self.assertLess(body['retraced_m'], 100)
+
+
+class SyntheticDataTests(TestCase):
+    def test_generate_synthetic(self):
+        call_command(
+            'generate_synthetic', trails=20, parks=2, pois=10, vertices=[10, 20], seed=7,
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(Park.objects.count(), 2)
+        self.assertEqual(Trail.objects.count(), 20)
+        self.assertEqual(POI.objects.count(), 10)
+        for trail in Trail.objects.all():
+            self.assertTrue(10 <= len(trail.path) <= 20)
+            self.assertTrue(trail.path.valid)
+        self.assertTrue(all(park.boundary.valid for park in Park.objects.all()))
+        # Derived data is refreshed like after any bulk write
+        self.assertFalse(Trail.objects.filter(search_vector__isnull=True).exists())
+        with self.assertRaises(CommandError):
+            call_command('generate_synthetic', trails=20, seed=7, stdout=io.StringIO())
+
+    def test_app_clock_behind_the_database(self):
+        behind = timezone.now() - timedelta(hours=1)
+        with mock.patch('django.utils.timezone.now', return_value=behind):
+            call_command('generate_synthetic', trails=10, parks=1, pois=5, vertices=[10, 20],
+                         stdout=io.StringIO())
+        park = Park.objects.get()
+        in_park = Trail.objects.filter(park=park)
+        self.assertTrue(in_park.exists())
+        self.assertEqual(in_park.filter(park_memberships__park=park).distinct().count(), in_park.count())
+        self.assertEqual(park.stats.trail_count, in_park.count())
+
+    def test_same_seed_same_rows(self):
+        def generate(seed):
+            rng = random.Random(seed)
+            areas = []
+            for park, area in synthetic.parks(rng, 3, seed):
+                area.id = len(areas) + 1
+                areas.append(area)
+            return [trail.path.wkt for trail, _ in synthetic.trails(rng, 5, areas, seed, (5, 10))]
+
+        self.assertEqual(generate(1), generate(1))
+        self.assertNotEqual(generate(1), generate(2))
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_dataset(parks=1)
+
+    def test_every_url_is_benchmarked(self):
+        named = {
+            pattern.name for pattern in mtb_urls.urlpatterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        }
+        benchmarked = {name for name, *_ in benchmark.ENDPOINTS}
+        self.assertEqual(named - benchmarked - benchmark.SKIPPED, set(), 'URLs without a benchmark')
+
+    def test_run_and_compare(self):
+        current = benchmark.run(repeat=2, warmup=0)
+        self.assertEqual(current['rows']['trails'], Trail.objects.count())
+        self.assertEqual(len(current['endpoints']), len(benchmark.ENDPOINTS))
+        result = current['endpoints']['trails-geojson?zoom=7']
+        self.assertEqual(result['status'], 200)
+        self.assertGreater(result['bytes'], 0)
+        self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        self.assertEqual(benchmark.compare(current, current), [])
+
+        slower = json.loads(json.dumps(current))
+        slower['endpoints']['trails-geojson?zoom=7']['queries'] += 1
+        slower['endpoints']['park-list']['p95_ms'] += 100
+        slower['endpoints']['home']['status'] = 500
+        regressions = benchmark.compare(slower, current)
+        self.assertEqual(len(regressions), 3, regressions)
+
+    def test_command_saves_and_gates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark', output=path, only=['park-list'], repeat=1, stdout=io.StringIO())
+            baseline = benchmark.load(path)
+            self.assertEqual(set(baseline['endpoints']), {'park-list', 'park-list?format=fgb'})
+
+            baseline['endpoints']['park-list']['queries'] = 0
+            benchmark.save(baseline, path)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'benchmark', output=os.path.join(directory, 'current.json'), compare=path,
+                    only=['park-list'], repeat=1, stdout=io.StringIO(), stderr=io.StringIO(),
+                )
+
+
+def parse_server_timing(header):
+    """{'db': {'dur': '1.2', 'desc': 'queries=1'}, ...}"""
+    phases = {}
+    for part in header.split(', '):
+        name, *params = part.split(';')
+        phases[name] = dict(param.split('=', 1) for param in params)
+        if 'desc' in phases[name]:
+            phases[name]['desc'] = phases[name]['desc'].strip('"')
+    return phases
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        make_dataset(parks=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_breaks_down_the_request(self):
+        params = {'lat': '53.02', 'lng': '-6.45', 'radius_km': '20'}
+        for name in ('trails-within-radius', 'async-trails-within-radius'):
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse(f'mtb_trails:{name}'), params)
+                phases = parse_server_timing(response['Server-Timing'])
+                self.assertEqual(list(phases), ['db', 'serialize', 'render', 'total'])
+                self.assertEqual(phases['db']['desc'], f'queries={len(ctx.captured_queries)}')
+                self.assertGreater(float(phases['serialize']['dur']), 0)
+                self.assertGreater(float(phases['render']['dur']), 0)
+                self.assertGreaterEqual(float(phases['total']['dur']), float(phases['db']['dur']))
+
+    def test_render_time_of_cached_views(self):
+        # @cached_response renders inside the view to store the bytes
+        response = self.client.get(reverse('mtb_trails:trails-geojson'), {'zoom': '10'})
+        phases = parse_server_timing(response['Server-Timing'])
+        self.assertGreater(float(phases['render']['dur']), 0)
+        self.assertGreater(float(phases['serialize']['dur']), 0)
+
+    def test_only_mtb_trails_views(self):
+        response = self.client.get('/admin/login/')
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_sampling_and_slow_requests(self):
+        url = reverse('mtb_trails:park-stats')
+        with self.settings(SERVER_TIMING_SAMPLE_RATE=0, SERVER_TIMING_SLOW_MS=None):
+            with self.assertNoLogs('mtb_trails.timing'):
+                self.assertFalse(self.client.get(url).has_header('Server-Timing'))
 
-# Create your tests here.
+        with self.settings(SERVER_TIMING_SAMPLE_RATE=0, SERVER_TIMING_SLOW_MS=0):
+            with self.assertLogs('mtb_trails.timing', 'WARNING') as logs:
+                self.client.get(url)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'mtb_trails:park-stats')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record, logs.records[0].timing)
+        self.assertEqual(
+            set(record), {'view', 'method', 'path', 'status', 'queries', 'db_ms', 'serialize_ms', 'render_ms', 'total_ms'},
+        )
@@ -0,0 +1,169 @@
+"""
+Per-request timings: a ``Server-Timing`` header and a structured log line.
+
+ServerTimingMiddleware (middleware.py) starts a RequestTiming for every
+request to an ``mtb_trails`` view and keeps it in a context variable, so
+the pieces below can add to it from wherever they run, including the
+threads of ``sync_to_async`` under ASGI:
+
+- ``db``: every SQL query, through an execute wrapper on each database
+  connection (``queries`` counts them)
+- ``serialize``: DRF serializers' ``to_representation`` (TimedMixin in
+  serializers.py) and GeoJSON features built from ``.values()`` rows
+- ``render``: turning the response data into bytes (the renderer), after
+  the view or, for @cached_response views, inside it (cache.py)
+- ``total``: the whole view, middleware below this one included
+
+Nested measurements of the same kind (a serializer nested in another) are
+only counted once. The header of ``/api/trails/within-radius/`` then reads
+e.g. ``db;dur=41.2;desc="queries=3", serialize;dur=9.8, render;dur=3.1,
+total;dur=58.0``, and its log line (logger ``mtb_trails.timing``) is a JSON
+object with the same numbers, the view name and status.
+
+Measuring is cheap (two clock reads per query or row), so it always runs;
+``SERVER_TIMING_SAMPLE_RATE`` sets the share of requests that get the
+header and an INFO log line (shown with ``SERVER_TIMING_LOG_LEVEL=INFO``),
+and requests slower than ``SERVER_TIMING_SLOW_MS`` are always logged, at
+WARNING. Streaming
+responses are timed up to their first byte: rows read while streaming are
+not in the numbers.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Phases in header order; 'total' is added last
+PHASES = ('db', 'serialize', 'render')
+
+_current = contextvars.ContextVar('mtb_trails_request_timing', default=None)
+
+
+class RequestTiming:
+    """Seconds spent per phase of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.queries = 0
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.active = set()
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def milliseconds(self):
+        durations = {phase: round(seconds * 1000, 2) for phase, seconds in self.seconds.items()}
+        durations['total'] = round(self.total * 1000, 2)
+        return durations
+
+    def header(self):
+        parts = []
+        for phase, ms in self.milliseconds().items():
+            part = f'{phase};dur={ms}'
+            if phase == 'db':
+                part += f';desc="queries={self.queries}"'
+            parts.append(part)
+        return ', '.join(parts)
+
+
+def current():
+    """The RequestTiming of the request being handled, or None"""
+    return _current.get()
+
+
+def start():
+    """Start timing a request; pass the token to stop()"""
+    for connection in connections.all(initialized_only=True):
+        instrument(connection)
+    return _current.set(RequestTiming())
+
+
+def stop(token):
+    timing = _current.get()
+    _current.reset(token)
+    timing.finish()
+    return timing
+
+
+@contextmanager
+def measure(phase):
+    """Add the time spent in the block to ``phase`` of the current request"""
+    timing = _current.get()
+    if timing is None or phase in timing.active:
+        yield
+        return
+    timing.active.add(phase)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(phase, time.perf_counter() - started)
+        timing.active.discard(phase)
+
+
+def _time_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.queries += 1
+        timing.add('db', time.perf_counter() - started)
+
+
+def instrument(connection):
+    """Time the queries of ``connection`` (once per connection object)"""
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+def sampled():
+    rate = getattr(settings, 'SERVER_TIMING_SAMPLE_RATE', 1.0)
+    return rate >= 1 or random.random() < rate
+
+
+def report(request, response, timing):
+    """Add the header and log the request, if it is sampled or slow"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None or match.app_name != 'mtb_trails':
+        return
+    durations = timing.milliseconds()
+    slow_ms = getattr(settings, 'SERVER_TIMING_SLOW_MS', None)
+    slow = slow_ms is not None and durations['total'] >= slow_ms
+    is_sampled = sampled()
+    if is_sampled:
+        response['Server-Timing'] = timing.header()
+    elif not slow:
+        return
+    record = {
+        'view': match.view_name,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'queries': timing.queries,
+        **{f'{phase}_ms': ms for phase, ms in durations.items()},
+    }
+    logger.log(
+        logging.WARNING if slow else logging.INFO,
+        json.dumps(record), extra={'timing': record},
+    )
@@ -0,0 +1,205 @@
+"""
+TopoJSON encoding of the park and trail collections (``?format=topojson``).
+
+Coordinates are first quantized to integers on a grid of ``10**-precision``
+degrees from the south-west corner of the data (the topology's
+``transform``), so vertices that agree to ``precision`` decimals become the
+same point. Every line and polygon ring is then cut at its junctions, the
+points where lines meet, fork or end, and identical pieces are stored once
+as arcs: the edge two neighbouring parks share, or a section two trails both
+follow, is written once and referenced from both geometries (as ``~index``
+when traversed backwards). Arcs are delta-encoded, so most positions are
+small integers. This is the algorithm of the reference topojson-server.
+"""
+from .geojson import feature_collection
+
+DEFAULT_PRECISION = 6
+
+
+def _positions(coordinates):
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+    else:
+        for part in coordinates:
+            yield from _positions(part)
+
+
+def _dedupe(points):
+    """Drop consecutive repeats that quantization creates"""
+    kept = points[:1]
+    for point in points[1:]:
+        if point != kept[-1]:
+            kept.append(point)
+    if len(kept) == 1:
+        kept.append(kept[0])
+    return kept
+
+
+def _junctions(lines):
+    """Points where lines meet with different neighbours, plus every line end"""
+    neighbours = {}
+    junctions = set()
+
+    def visit(point, pair):
+        seen = neighbours.setdefault(point, pair)
+        if seen != pair and seen != pair[::-1]:
+            junctions.add(point)
+
+    for points, ring in lines:
+        if ring:
+            sequence = points[:-1]
+            for i, point in enumerate(sequence):
+                visit(point, (sequence[i - 1], sequence[(i + 1) % len(sequence)]))
+        else:
+            junctions.update((points[0], points[-1]))
+            for i in range(1, len(points) - 1):
+                visit(points[i], (points[i - 1], points[i + 1]))
+    return junctions
+
+
+def _rotate(ring, start):
+    sequence = ring[:-1]
+    sequence = sequence[start:] + sequence[:start]
+    return sequence + sequence[:1]
+
+
+def _cut(points, ring, junctions):
+    """Split a line (or ring) at its interior junctions"""
+    if ring:
+        starts = [i for i, point in enumerate(points[:-1]) if point in junctions]
+        if not starts:
+            return [points]
+        points = _rotate(points, starts[0])
+    pieces, start = [], 0
+    for i in range(1, len(points) - 1):
+        if points[i] in junctions:
+            pieces.append(points[start:i + 1])
+            start = i
+    pieces.append(points[start:])
+    return pieces
+
+
+class _Arcs:
+    """Unique arcs, looked up forwards and backwards"""
+
+    def __init__(self):
+        self.arcs = []
+        self.index = {}
+
+    def ref(self, piece, free_ring=False):
+        if free_ring:
+            # A ring with no junctions may start anywhere; use a canonical start
+            piece = _rotate(piece, piece.index(min(piece[:-1])))
+            backwards = piece[::-1]
+            backwards = _rotate(backwards, backwards.index(min(backwards[:-1])))
+        else:
+            backwards = piece[::-1]
+        key = tuple(piece)
+        if key in self.index:
+            return self.index[key]
+        if tuple(backwards) in self.index:
+            return ~self.index[tuple(backwards)]
+        self.index[key] = len(self.arcs)
+        self.arcs.append(piece)
+        return self.index[key]
+
+    def encoded(self):
+        """The arcs delta-encoded: first position absolute, then offsets"""
+        encoded = []
+        for arc in self.arcs:
+            (x0, y0), deltas = arc[0], [list(arc[0])]
+            for x, y in arc[1:]:
+                deltas.append([x - x0, y - y0])
+                x0, y0 = x, y
+            encoded.append(deltas)
+        return encoded
+
+
+def topology(objects, precision=DEFAULT_PRECISION):
+    """
+    Topology of ``objects`` ({name: [GeoJSON feature dicts]}), quantized to
+    ``precision`` decimals
+    """
+    scale = 10 ** -precision
+    positions = [
+        position for features in objects.values() for feature in features
+        if feature['geometry'] for position in _positions(feature['geometry']['coordinates'])
+    ]
+    bbox = None
+    x0 = y0 = 0
+    if positions:
+        xs, ys = [p[0] for p in positions], [p[1] for p in positions]
+        bbox = [min(xs), min(ys), max(xs), max(ys)]
+        x0, y0 = bbox[0], bbox[1]
+
+    def quantize(position):
+        return (round((position[0] - x0) / scale), round((position[1] - y0) / scale))
+
+    # Geometries keep line numbers in place of their lines until the arcs exist
+    lines = []
+
+    def add(coordinates, ring=False):
+        lines.append((_dedupe([quantize(p) for p in coordinates]), ring))
+        return len(lines) - 1
+
+    def convert(geometry):
+        if not geometry:
+            return {'type': None}
+        kind, coordinates = geometry['type'], geometry['coordinates']
+        if kind == 'Point':
+            return {'type': kind, 'coordinates': list(quantize(coordinates))}
+        if kind == 'MultiPoint':
+            return {'type': kind, 'coordinates': [list(quantize(p)) for p in coordinates]}
+        if kind == 'LineString':
+            return {'type': kind, 'arcs': add(coordinates)}
+        if kind == 'MultiLineString':
+            return {'type': kind, 'arcs': [add(line) for line in coordinates]}
+        if kind == 'Polygon':
+            return {'type': kind, 'arcs': [add(ring, True) for ring in coordinates]}
+        if kind == 'MultiPolygon':
+            return {'type': kind, 'arcs': [[add(ring, True) for ring in polygon] for polygon in coordinates]}
+        raise ValueError(f'Unsupported geometry type {kind}')
+
+    geometries = {
+        name: [{**convert(f['geometry']), 'id': f['id'], 'properties': f['properties']} for f in features]
+        for name, features in objects.items()
+    }
+
+    junctions = _junctions(lines)
+    arcs = _Arcs()
+    line_arcs = []
+    for points, ring in lines:
+        pieces = _cut(points, ring, junctions)
+        free_ring = ring and len(pieces) == 1 and not any(p in junctions for p in points)
+        line_arcs.append([arcs.ref(piece, free_ring) for piece in pieces])
+
+    def resolve(value):
+        if isinstance(value, int):
+            return line_arcs[value]
+        return [resolve(part) for part in value]
+
+    for features in geometries.values():
+        for geometry in features:
+            if 'arcs' in geometry:
+                geometry['arcs'] = resolve(geometry['arcs'])
+
+    result = {
+        'type': 'Topology',
+        'transform': {'scale': [scale, scale], 'translate': [x0, y0]},
+        'objects': {
+            name: {'type': 'GeometryCollection', 'geometries': features}
+            for name, features in geometries.items()
+        },
+        'arcs': arcs.encoded(),
+    }
+    if bbox:
+        result['bbox'] = bbox
+    return result
+
+
+def collection_topology(name, queryset, layout, level=None, precision=None):
+    """The features of ``queryset`` as a one-object Topology"""
+    if precision is None:
+        precision = DEFAULT_PRECISION
+    features = feature_collection(queryset, layout, level, precision)['features']
+    return topology({name: features}, precision)
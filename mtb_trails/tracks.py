@@ -0,0 +1,186 @@
+"""
+GPX / GeoJSON track parsing for ``manage.py import_tracks``.
+
+``parse_tracks`` runs in worker processes, so it never touches the database
+and returns plain, picklable data; writing the trails is left to the single
+writer in the command. Workers may be spawned rather than forked, so this
+module does not import Django either.
+
+A file holding several segments (GPX ``trkseg``/``rte`` elements, GeoJSON
+MultiLineString parts) becomes one track per segment: joining them would
+draw a straight line across every gap.
+"""
+import json
+import math
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+
+TRACK_EXTENSIONS = ('.gpx', '.geojson', '.json')
+# Copies of the Trail field constraints (checked against the model in tests)
+DIFFICULTIES = ['beginner', 'intermediate', 'expert']
+NAME_LENGTH = 100
+SOURCE_ID_LENGTH = 100
+MIN_LENGTH_KM = 0.1  # Trail.length_km validator
+EARTH_RADIUS_KM = 6371.0088
+
+
+class TrackError(ValueError):
+    pass
+
+
+@dataclass
+class Track:
+    source_id: str
+    name: str
+    coords: list
+    length_km: float
+    elevation_gain_m: float = 0
+    difficulty: str = ''
+    description: str = ''
+    errors: list = field(default_factory=list)
+
+
+def haversine_km(coords):
+    """Length of a lon/lat coordinate sequence along the great circle, in km"""
+    total = 0.0
+    for (lon1, lat1), (lon2, lat2) in zip(coords, coords[1:]):
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        a = (math.sin((phi2 - phi1) / 2) ** 2
+             + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+        total += 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+    return total
+
+
+def elevation_gain(elevations):
+    return sum(max(b - a, 0) for a, b in zip(elevations, elevations[1:]))
+
+
+def _local(tag):
+    # GPX 1.0 and 1.1 use different namespaces; match on the local name
+    return tag.rsplit('}', 1)[-1]
+
+
+def _segment(points):
+    """(coords, elevations) of [(lon, lat, elevation or None)]"""
+    coords = [(lon, lat) for lon, lat, _ in points]
+    elevations = [ele for _, _, ele in points]
+    return coords, [] if None in elevations else elevations
+
+
+def _parse_gpx(path):
+    """Return (name, description, [(coords, elevations)]) from a GPX file"""
+    name = description = ''
+    segments, routes, points = [], [], []
+    for _, element in ET.iterparse(path):
+        tag = _local(element.tag)
+        if tag in ('trkpt', 'rtept'):
+            ele = next((child.text for child in element if _local(child.tag) == 'ele'), None)
+            points.append((
+                float(element.get('lon')), float(element.get('lat')),
+                float(ele) if ele is not None and tag == 'trkpt' else None,
+            ))
+            element.clear()
+        elif tag in ('trkseg', 'rte'):
+            if points:
+                (segments if tag == 'trkseg' else routes).append(_segment(points))
+            points = []
+            element.clear()
+        elif tag == 'name' and not name and element.text:
+            name = element.text.strip()
+        elif tag == 'desc' and not description and element.text:
+            description = element.text.strip()
+    # Prefer the recorded track; fall back to a planned route
+    return name, description, segments or routes
+
+
+def _parse_geojson(path):
+    with open(path) as geojson:
+        data = json.load(geojson)
+    if data.get('type') == 'FeatureCollection':
+        features = data.get('features') or []
+        if len(features) != 1:
+            raise TrackError(f'expected one feature, found {len(features)}')
+        data = features[0]
+    if data.get('type') == 'Feature':
+        properties, geometry = data.get('properties') or {}, data.get('geometry')
+    else:
+        properties, geometry = {}, data
+    if not geometry or geometry.get('type') not in ('LineString', 'MultiLineString'):
+        raise TrackError('geometry must be a LineString or MultiLineString')
+    lines = geometry['coordinates']
+    if geometry['type'] == 'LineString':
+        lines = [lines]
+    segments = [
+        _segment([(float(p[0]), float(p[1]), float(p[2]) if len(p) > 2 else None) for p in line])
+        for line in lines if line
+    ]
+    return (
+        properties.get('name') or '', properties.get('description') or '',
+        segments, properties.get('difficulty') or '',
+    )
+
+
+def parse_tracks(path, root=''):
+    """
+    Parse and validate one GPX/GeoJSON file into one Track per segment.
+    Never raises: problems are returned in ``Track.errors`` so one bad file
+    does not stop a batch.
+    """
+    source_id = os.path.relpath(path, root) if root else os.path.basename(path)
+    difficulty = ''
+    try:
+        if path.lower().endswith('.gpx'):
+            name, description, segments = _parse_gpx(path)
+        else:
+            name, description, segments, difficulty = _parse_geojson(path)
+    except (OSError, ET.ParseError, ValueError, KeyError, TypeError, IndexError) as exc:
+        return [Track(source_id[:SOURCE_ID_LENGTH], '', [], 0, errors=[f'unreadable: {exc}'])]
+
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    if len(segments) < 2:
+        coords, elevations = segments[0] if segments else ([], [])
+        return [_track(source_id, name, coords, elevations, difficulty, description)]
+    return [
+        # file.gpx#2, "Name (2)"
+        _track(f'{source_id[:SOURCE_ID_LENGTH - 6]}#{n}', f'{name[:NAME_LENGTH - 6]} ({n})',
+               coords, elevations, difficulty, description)
+        for n, (coords, elevations) in enumerate(segments, 1)
+    ]
+
+
+def _track(source_id, name, coords, elevations, difficulty, description):
+    # Drop repeated points (GPS loggers emit them while standing still)
+    keep = [i for i in range(len(coords)) if i == 0 or coords[i] != coords[i - 1]]
+    coords = [coords[i] for i in keep]
+    elevations = [elevations[i] for i in keep] if elevations else []
+
+    track = Track(
+        source_id=source_id[:SOURCE_ID_LENGTH],
+        name=name[:NAME_LENGTH],
+        coords=coords,
+        length_km=round(haversine_km(coords), 3),
+        elevation_gain_m=round(elevation_gain(elevations), 1),
+        difficulty=difficulty,
+        description=description,
+    )
+    if len(coords) < 2:
+        track.errors.append('fewer than two distinct points')
+    elif any(not (-180 <= lon <= 180 and -90 <= lat <= 90) for lon, lat in coords):
+        track.errors.append('coordinates out of range (expected WGS84 lon/lat)')
+    elif track.length_km < MIN_LENGTH_KM:
+        track.errors.append(f'shorter than {MIN_LENGTH_KM} km')
+    if difficulty and difficulty not in DIFFICULTIES:
+        track.errors.append(f'unknown difficulty {difficulty!r}')
+    return track
+
+
+def find_tracks(directory):
+    """Track files under ``directory``, sorted so imports are repeatable"""
+    paths = []
+    for dirpath, _, filenames in os.walk(directory):
+        paths += [
+            os.path.join(dirpath, filename) for filename in filenames
+            if filename.lower().endswith(TRACK_EXTENSIONS)
+        ]
+    return sorted(paths)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'mtb_trails'
 
@@ -8,23 +8,46 @@ urlpatterns = [
     path('api/parks/', views.ParkListCreateView.as_view(), name='park-list'),
     path('api/parks/<int:pk>/', views.ParkDetailView.as_view(), name='park-detail'),
     path('api/parks/geojson/', views.parks_geojson, name='parks-geojson'),
+    path('api/parks/containing/', views.parks_containing, name='parks-containing'),
+    path('api/parks/stats/', views.park_stats, name='park-stats'),
     path('api/parks/<int:park_id>/trails/', views.park_trails, name='park-trails'),
     path('api/parks/<int:park_id>/pois/', views.park_pois, name='park-pois'),
     
     # Trails endpoints (existing)
     path('api/trails/', views.TrailListCreateView.as_view(), name='trail-list'),
+    path('api/trails/bulk/', views.trails_bulk, name='trails-bulk'),
     path('api/trails/<int:pk>/', views.TrailDetailView.as_view(), name='trail-detail'),
+    path('api/trails/<int:pk>/profile/', views.trail_profile, name='trail-profile'),
     path('api/trails/geojson/', views.trails_geojson, name='trails-geojson'),
     path('api/trails/search/', views.search_trails, name='search-trails'),
+    path('api/trails/autocomplete/', views.autocomplete_trails, name='autocomplete-trails'),
     path('api/trails/proximity/', views.nearest_trails, name='nearest-trails'),
     path('api/trails/within-radius/', views.trails_within_radius, name='trails-within-radius'),
     path('api/trails/in-park/', views.trails_in_park, name='trails-in-park'),
     
+    # Route planning
+    path('api/routes/', views.routes, name='routes'),
+    path('api/routes/loop/', views.loop_route, name='loop-route'),
+    
     # POIs endpoints (existing)
     path('api/pois/', views.POIListCreateView.as_view(), name='poi-list'),
+    path('api/pois/bulk/', views.pois_bulk, name='pois-bulk'),
     path('api/pois/<int:pk>/', views.POIDetailView.as_view(), name='poi-detail'),
     path('api/pois/geojson/', views.pois_geojson, name='pois-geojson'),
     
+    # Async (ASGI) versions of the read-heavy endpoints, see async_views.py
+    path('api/async/parks/geojson/', async_views.parks_geojson, name='async-parks-geojson'),
+    path('api/async/parks/<int:park_id>/trails/', async_views.park_trails, name='async-park-trails'),
+    path('api/async/parks/<int:park_id>/pois/', async_views.park_pois, name='async-park-pois'),
+    path('api/async/trails/geojson/', async_views.trails_geojson, name='async-trails-geojson'),
+    path('api/async/trails/proximity/', async_views.nearest_trails, name='async-nearest-trails'),
+    path('api/async/trails/within-radius/', async_views.trails_within_radius, name='async-trails-within-radius'),
+    path('api/async/trails/in-park/', async_views.trails_in_park, name='async-trails-in-park'),
+    path('api/async/pois/geojson/', async_views.pois_geojson, name='async-pois-geojson'),
+
+    # Vector tiles
+    path('api/tiles/<slug:layer>/<int:z>/<int:x>/<int:y>.mvt', views.vector_tile, name='vector-tile'),
+    
     # Frontend views
     path('map/', views.trail_map_view, name='trail-map'),
     path('trails/', views.trails_readonly_view, name='trails-list'),
@@ -1,73 +1,168 @@
 from rest_framework import generics, permissions
-from rest_framework_gis.filters import InBBoxFilter, DistanceToPointFilter
+from rest_framework_gis.filters import InBBoxFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
-from django.contrib.gis.geos import Point, GEOSGeometry
+from django.contrib.gis.geos import Point, GEOSGeometry, GEOSException
 from django.contrib.gis.measure import D
 from django.contrib.gis.db.models.functions import Distance
-from django.db.models.functions import Cast
-from django.contrib.gis.db.models import LineStringField
-from django.shortcuts import render
-from django.db.models import Q
-import json
+from django.shortcuts import render, get_object_or_404
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse, Http404
 
 
-from .models import Trail, POI, Park
-from .serializers import TrailSerializer, POISerializer, ParkSerializer
+from .models import Trail, POI, Park, ParkStats, TrailProfile
+from .serializers import (
+    TrailSerializer, TrailDetailSerializer, TrailDistanceSerializer, POISerializer, ParkSerializer,
+    ParkStatsListSerializer, TrailProfileSerializer,
+)
+from . import bulk, clustering, membership, routing, search, topojson
+from .cache import cached_response
+from .filters import GeographyDistanceFilter
+from .pagination import GeoJsonCursorPagination
+from .conditional import versioned
+from .geojson import (
+    TRAIL_LAYOUT, POI_LAYOUT, PARK_LAYOUT,
+    feature_collection, stream_feature_collection, wants_stream, geometry_level,
+    coordinate_precision,
+)
+from .renderers import (
+    FEATURE_RENDERERS, TOPOLOGY_RENDERERS, binary_renderer, wants_topojson, encode_features,
+)
+from .snapshots import snapshot_urls
+
+
+class GeometryLevelViewMixin:
+    """Serve simplified geometry on GET when ?zoom= or ?tolerance= is given"""
+
+    def get_geometry_level(self):
+        if self.request.method != 'GET':
+            return None
+        return geometry_level(self.request)
+
+    def get_queryset(self):
+        return super().get_queryset().at_level(self.get_geometry_level())
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['geometry_level'] = self.get_geometry_level()
+        return context
+
+class BinaryFeaturesMixin:
+    """
+    Serve the list as FlatGeobuf or Geobuf when asked for (?format=fgb,
+    ?format=geobuf or Accept, see renderers.py). Pagination links go in a
+    Link header, since the body is just the features.
+    """
+    renderer_classes = FEATURE_RENDERERS
+    feature_layout = None
+
+    def list(self, request, *args, **kwargs):
+        renderer = binary_renderer(request)
+        if renderer is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.only('pk'))
+        if page is not None:
+            # In the page's order: an IN list alone leaves it to the planner
+            queryset = queryset.filter(pk__in=[row.pk for row in page]).order_by(*self.paginator.ordering)
+        response = Response(encode_features(
+            renderer, queryset, self.feature_layout, geometry_level(request),
+        ))
+        if page is not None:
+            links = [
+                f'<{url}>; rel="{rel}"' for rel, url in [
+                    ('next', self.paginator.get_next_link()),
+                    ('prev', self.paginator.get_previous_link()),
+                ] if url
+            ]
+            if links:
+                response['Link'] = ', '.join(links)
+        return response
 
 # Parks Views
-class ParkListCreateView(generics.ListCreateAPIView):
+class ParkListCreateView(BinaryFeaturesMixin, GeometryLevelViewMixin, generics.ListCreateAPIView):
     """List all parks or create a new park"""
-    queryset = Park.objects.all()
+    queryset = Park.objects.select_related('stats')
     serializer_class = ParkSerializer
+    feature_layout = PARK_LAYOUT
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 class ParkDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update or delete a specific park"""
-    queryset = Park.objects.all()
+    queryset = Park.objects.select_related('stats')
     serializer_class = ParkSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 # Trails Views 
-class TrailListCreateView(generics.ListCreateAPIView):
-    queryset = Trail.objects.all()
+class TrailListCreateView(BinaryFeaturesMixin, GeometryLevelViewMixin, generics.ListCreateAPIView):
+    queryset = Trail.objects.with_park()
     serializer_class = TrailSerializer
+    feature_layout = TRAIL_LAYOUT
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     bbox_filter_field = 'path'
+    pagination_class = GeoJsonCursorPagination
 
 class TrailDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Trail.objects.all()
-    serializer_class = TrailSerializer
+    queryset = Trail.objects.with_park()
+    serializer_class = TrailDetailSerializer  # NEW: includes precomputed access points
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+# NEW: Bulk create/update from GeoJSON features (see bulk.py)
+def _bulk_response(model, data):
+    try:
+        results = bulk.write(model, data)
+    except bulk.BulkError as exc:
+        return Response({'error': str(exc)}, status=400)
+    counts = {status: 0 for status in ('created', 'updated', 'invalid')}
+    for result in results:
+        counts[result['status']] += 1
+    return Response({**counts, 'results': results})
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def trails_bulk(request):
+    """Create or update up to bulk.MAX_ITEMS trails in one transaction"""
+    return _bulk_response(Trail, request.data)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def pois_bulk(request):
+    """Create or update up to bulk.MAX_ITEMS POIs in one transaction"""
+    return _bulk_response(POI, request.data)
+
 # POI Views (existing)
-class POIListCreateView(generics.ListCreateAPIView):
-    queryset = POI.objects.all()
+class POIListCreateView(BinaryFeaturesMixin, generics.ListCreateAPIView):
+    queryset = POI.objects.with_park()
     serializer_class = POISerializer
+    feature_layout = POI_LAYOUT
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, DistanceToPointFilter, InBBoxFilter]
+    filter_backends = [DjangoFilterBackend, GeographyDistanceFilter, InBBoxFilter]
     bbox_filter_field = 'location'
-    distance_filter_field = 'location'
-    distance_filter_convert_meters = True
+    pagination_class = GeoJsonCursorPagination
 
 class POIDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = POI.objects.all()
+    queryset = POI.objects.with_park()
     serializer_class = POISerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 # NEW: Get trails for a specific park
+@versioned(Park, Trail, POI)
+@cached_response(Park, Trail, POI)
 @api_view(['GET'])
 def park_trails(request, park_id):
-    """Get all trails for a specific park"""
+    """Get all trails for a specific park (?zoom= for simplified geometry)"""
+    level = geometry_level(request)
+    context = {'geometry_level': level}
     try:
-        park = Park.objects.get(id=park_id)
-        trails = Trail.objects.filter(park=park)
-        serializer = TrailSerializer(trails, many=True)
+        park = Park.objects.select_related('stats').at_level(level).get(id=park_id)
+        trails = Trail.objects.filter(park=park).with_park().at_level(level)
+        serializer = TrailSerializer(trails, many=True, context=context)
         return Response({
-            'park': ParkSerializer(park).data,
+            'park': ParkSerializer(park, context=context).data,
             'trails': serializer.data,
             'count': trails.count()
         })
@@ -75,12 +170,14 @@ def park_trails(request, park_id):
         return Response({'error': 'Park not found'}, status=404)
 
 # NEW: Get POIs for a specific park
+@versioned(Park, Trail, POI)
+@cached_response(Park, Trail, POI)
 @api_view(['GET'])
 def park_pois(request, park_id):
     """Get all POIs for a specific park"""
     try:
-        park = Park.objects.get(id=park_id)
-        pois = POI.objects.filter(park=park)
+        park = Park.objects.select_related('stats').get(id=park_id)
+        pois = POI.objects.filter(park=park).with_park()
         serializer = POISerializer(pois, many=True)
         return Response({
             'park': ParkSerializer(park).data,
@@ -90,133 +187,368 @@ def park_pois(request, park_id):
     except Park.DoesNotExist:
         return Response({'error': 'Park not found'}, status=404)
 
+# NEW: Trail/POI aggregates for every park
+@versioned(Park, Trail, POI)
+@cached_response(Park, Trail, POI)
+@api_view(['GET'])
+def park_stats(request):
+    """Materialized trail and POI statistics of every park (see stats.py)"""
+    stats = ParkStats.objects.annotate(park_name=F('park__name')).order_by('park_name')
+    return Response(ParkStatsListSerializer(stats, many=True).data)
+
 # Existing spatial query views (keep these)
+# The *_query helpers parse the request and build the queryset for both
+# these views and their async versions (async_views.py); bad parameters
+# raise ValueError with the message for the 400 response.
+NEAREST_DEFAULT_K = 10
+NEAREST_MAX_K = 100
+
+def nearest_trails_query(request):
+    """
+    The nearest_trails queryset for the request's lat/lng/radius/k.
+    Candidates are the trails within the radius, from the geography index;
+    only those are ranked by their exact (spheroid) distance.
+    """
+    try:
+        lat = float(request.GET.get('lat', 53.35))
+        lng = float(request.GET.get('lng', -7.5))
+        radius_km = float(request.GET.get('radius', 50))
+        k = max(1, min(int(request.GET.get('k', NEAREST_DEFAULT_K)), NEAREST_MAX_K))
+    except ValueError:
+        raise ValueError('lat, lng, radius and k must be numbers')
+    p = Point(lng, lat, srid=4326)
+    return Trail.objects.with_park().within(p, D(km=radius_km)).annotate(
+        distance=Distance('path', p, spheroid=True)
+    ).order_by('distance')[:k]
+
 @api_view(['GET'])
 def nearest_trails(request):
-    lat = float(request.GET.get('lat', 53.35))
-    lng = float(request.GET.get('lng', -7.5))
-    radius_km = float(request.GET.get('radius', 50))
-    p = Point(lng, lat, srid=4326)
-    trails = Trail.objects.filter(
-        path__distance_lte=(p, D(km=radius_km))
-    ).annotate(d=Distance('path', p)).order_by('d')[:10]
-    serializer = TrailSerializer(trails, many=True)
+    """The ?k= nearest trails to lat/lng within ?radius= km, with distance_m"""
+    try:
+        trails = nearest_trails_query(request)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
+    serializer = TrailDistanceSerializer(trails, many=True)
     return Response(serializer.data)
 
-@api_view(['GET'])
-def trails_within_radius(request):
+def trails_within_radius_query(request):
+    """(queryset, center lat, lng, radius km) of trails_within_radius"""
     try:
         lat = float(request.GET.get('lat', 53.35))
         lng = float(request.GET.get('lng', -7.5))
         radius_km = float(request.GET.get('radius_km', 10))
-        
-        p = Point(lng, lat, srid=4326)
-        
-        # 1. Cast for accurate distance
-        trails = Trail.objects.annotate(
-            geo_path=Cast('path', LineStringField(geography=True))
-        ).filter(
-            geo_path__dwithin=(p, D(km=radius_km))
-        )
-        
-        # 2. Serialize
-        # Since this is a GeoFeatureModelSerializer, .data is a FeatureCollection dict
-        serializer = TrailSerializer(trails, many=True)
-        serialized_data = serializer.data 
-        
-        # 3. Construct Response
-        # We want to return a FeatureCollection. 
-        # serialized_data['features'] is the list of features we want.
-        
-        return Response({
-            'type': 'FeatureCollection',
-            'features': serialized_data.get('features', []), # Extract just the list
-            'query': {
-                'center': {'lat': lat, 'lng': lng},
-                'radius_km': radius_km,
-                'count': trails.count()
-            }
-        })
-        
-    except Exception as e:
-        print(f"ERROR: {e}")
-        return Response({'error': str(e)}, status=500)
+    except ValueError:
+        raise ValueError('lat, lng and radius_km must be numbers')
+    p = Point(lng, lat, srid=4326)
+    # Geodesic radius search on the indexed path_geography column
+    return Trail.objects.with_park().within(p, D(km=radius_km)), lat, lng, radius_km
 
+def radius_feature_collection(trails, lat, lng, radius_km):
+    """trails_within_radius body: the features plus the query that found them"""
+    # Since this is a GeoFeatureModelSerializer, .data is a FeatureCollection dict
+    serialized_data = TrailSerializer(trails, many=True).data
+    return {
+        'type': 'FeatureCollection',
+        'features': serialized_data.get('features', []), # Extract just the list
+        'query': {
+            'center': {'lat': lat, 'lng': lng},
+            'radius_km': radius_km,
+            'count': len(trails)
+        }
+    }
 
 @api_view(['GET'])
-def trails_in_park(request):
+def trails_within_radius(request):
+    try:
+        trails, lat, lng, radius_km = trails_within_radius_query(request)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
+    # Evaluated once: the count is the length of the same result
+    return Response(radius_feature_collection(list(trails), lat, lng, radius_km))
+
+
+def trails_in_park_query(request):
+    """Trails running through park ?park=<id>, or intersecting ?polygon=<WKT>"""
+    park_id = request.GET.get('park')
+    if park_id:
+        if not park_id.isdigit():
+            raise ValueError('park must be a park id')
+        # Precomputed spatial membership (see membership.py), not a polygon test
+        return Trail.objects.with_park().filter(park_memberships__park_id=park_id)
     polygon_wkt = request.GET.get('polygon')
     if not polygon_wkt:
-        return Response({'error': 'Polygon WKT required'}, status=400)
-    park = GEOSGeometry(polygon_wkt, srid=4326)
-    trails = Trail.objects.filter(path__intersects=park)
+        raise ValueError('Polygon WKT required')
+    try:
+        park = GEOSGeometry(polygon_wkt, srid=4326)
+    except (GEOSException, ValueError):
+        raise ValueError('polygon must be WKT')
+    return Trail.objects.with_park().filter(path__intersects=park)
+
+@api_view(['GET'])
+def trails_in_park(request):
+    """Trails running through park ?park=<id>, or intersecting ?polygon=<WKT>"""
+    try:
+        trails = trails_in_park_query(request)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
     serializer = TrailSerializer(trails, many=True)
     return Response(serializer.data)
 
+# NEW: Which park is this point in?
+@cached_response(Park, Trail, POI)
+@api_view(['GET'])
+def parks_containing(request):
+    """Parks whose boundary contains ?lat=&lng= (?zoom= for simplified geometry)"""
+    try:
+        point = Point(float(request.GET['lng']), float(request.GET['lat']), srid=4326)
+    except (KeyError, ValueError):
+        return Response({'error': 'lat and lng required'}, status=400)
+    level = geometry_level(request)
+    parks = membership.parks_containing(point).select_related('stats').at_level(level)
+    serializer = ParkSerializer(parks, many=True, context={'geometry_level': level})
+    return Response(serializer.data)
+
+# NEW: Route planning on the trail network (see routing.py)
+def _route_response(plan):
+    try:
+        route = plan()
+    except routing.RouteNotFound as exc:
+        return Response({'error': str(exc)}, status=404)
+    except routing.RoutingError as exc:
+        return Response({'error': str(exc)}, status=400)
+    return Response(routing.route_geojson(route))
+
+@cached_response(Trail)
+@api_view(['GET'])
+def routes(request):
+    """Shortest route ?from=lat,lng&to=lat,lng, through any ?via=lat,lng in order"""
+    def plan():
+        waypoints = [routing.parse_latlng(request.GET.get('from'), 'from')]
+        waypoints += [routing.parse_latlng(via, 'via') for via in request.GET.getlist('via')]
+        waypoints.append(routing.parse_latlng(request.GET.get('to'), 'to'))
+        max_rank = routing.parse_max_difficulty(request.GET.get('max_difficulty'))
+        return routing.plan_route(waypoints, max_rank)
+    return _route_response(plan)
+
+@cached_response(Trail)
+@api_view(['GET'])
+def loop_route(request):
+    """A loop of about ?distance_km= from ?from=lat,lng (?max_difficulty= caps trails)"""
+    def plan():
+        origin = routing.parse_latlng(request.GET.get('from'), 'from')
+        try:
+            distance_km = float(request.GET.get('distance_km', ''))
+        except ValueError:
+            raise routing.RoutingError('distance_km must be a number')
+        if not 0 < distance_km <= routing.MAX_LOOP_KM:
+            raise routing.RoutingError(f'distance_km must be between 0 and {routing.MAX_LOOP_KM}')
+        max_rank = routing.parse_max_difficulty(request.GET.get('max_difficulty'))
+        return routing.plan_loop(origin, distance_km * 1000, max_rank)
+    return _route_response(plan)
+
+# Vector tiles (Mapbox Vector Tile, built in PostGIS)
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+MVT_MAX_ZOOM = 22
+MVT_CONTENT_TYPE = 'application/vnd.mapbox-vector-tile'
+
+# Per layer: (table, geometry column, attribute columns, extra joins)
+# Attribute columns are qualified with the table alias "t".
+TILE_LAYERS = {
+    'trails': (
+        Trail._meta.db_table, 'path',
+        't.id, t.name, t.difficulty, t.length_km, t.elevation_gain_m, t.park_id, p.name AS park_name',
+        f'LEFT JOIN {Park._meta.db_table} p ON p.id = t.park_id',
+    ),
+    'parks': (
+        Park._meta.db_table, 'boundary',
+        't.id, t.name',
+        '',
+    ),
+    'pois': (
+        POI._meta.db_table, 'location',
+        't.id, t.name, t.type, t.park_id',
+        '',
+    ),
+}
+
+
+def _tile_sql(layer):
+    table, geom_column, columns, joins = TILE_LAYERS[layer]
+    # The bbox test runs in 4326 so the GiST index on the geometry column is
+    # used; only the rows that touch the (buffered) tile are transformed.
+    return f"""
+        WITH bounds AS (
+            SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS tile,
+                   ST_Transform(
+                       ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s), 4326
+                   ) AS search
+        ),
+        mvtgeom AS (
+            SELECT ST_AsMVTGeom(
+                       ST_Transform(t.{geom_column}, 3857), bounds.tile,
+                       {MVT_EXTENT}, {MVT_BUFFER}, true
+                   ) AS geom,
+                   {columns}
+            FROM {table} t
+            {joins}
+            CROSS JOIN bounds
+            WHERE t.{geom_column} && bounds.search
+        )
+        SELECT ST_AsMVT(mvtgeom.*, %(layer)s, {MVT_EXTENT}, 'geom', 'id')
+        FROM mvtgeom
+        WHERE geom IS NOT NULL
+    """
+
+
+def vector_tile(request, layer, z, x, y):
+    """Return one Mapbox Vector Tile for the trails, parks or pois layer"""
+    if layer not in TILE_LAYERS:
+        raise Http404('Unknown tile layer')
+    if z > MVT_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        raise Http404('Tile out of range')
+
+    with connection.cursor() as cursor:
+        cursor.execute(_tile_sql(layer), {
+            'z': z, 'x': x, 'y': y,
+            'margin': MVT_BUFFER / MVT_EXTENT,
+            'layer': layer,
+        })
+        row = cursor.fetchone()
+
+    tile = bytes(row[0]) if row and row[0] is not None else b''
+    response = HttpResponse(tile, content_type=MVT_CONTENT_TYPE)
+    response['Cache-Control'] = 'public, max-age=300'
+    return response
+
 # Frontend views
 def trail_map_view(request):
-    return render(request, 'mtb_trails/trail_map.html')
+    return render(request, 'mtb_trails/trail_map.html', {
+        'snapshot_urls': snapshot_urls(),
+    })
 
 # NEW: GeoJSON endpoints for all models
+@versioned(Park)
+@cached_response(Park)
 @api_view(['GET'])
+@renderer_classes(TOPOLOGY_RENDERERS)
 def parks_geojson(request):
-    """Return all parks as GeoJSON FeatureCollection"""
+    """
+    Return all parks as GeoJSON FeatureCollection (?stream=1 to stream it,
+    ?precision= for fewer decimals, ?format=topojson for shared edges)
+    """
     parks = Park.objects.all()
-    
-    features = []
-    for park in parks:
-        try:
-            feature = {
-                'type': 'Feature',
-                'id': park.id,
-                'geometry': json.loads(park.boundary.geojson),  # ← Convert PostGIS to GeoJSON
-                'properties': {
-                    'id': park.id,
-                    'name': park.name,
-                    'description': park.description or '',
-                    'source': park.source,
-                    'created_at': park.created_at.isoformat()
-                }
-            }
-            features.append(feature)
-        except Exception as e:
-            print(f"Error serializing park {park.id}: {e}")
-            continue
-    
-    return Response({
-        'type': 'FeatureCollection',
-        'features': features
-    })
+    level = geometry_level(request)
+    precision = coordinate_precision(request)
+    renderer = binary_renderer(request)
+    if renderer:
+        return Response(encode_features(renderer, parks, PARK_LAYOUT, level))
+    if wants_topojson(request):
+        return Response(topojson.collection_topology('parks', parks, PARK_LAYOUT, level, precision))
+    if wants_stream(request):
+        return stream_feature_collection(parks, PARK_LAYOUT, level, precision=precision)
+    # Geometry arrives already encoded by PostGIS, no GEOS round-trip per park
+    return Response(feature_collection(parks, PARK_LAYOUT, level, precision))
 
+# Trail and POI features carry park_name, so a park rename changes them too
+@versioned(Trail, Park)
+@cached_response(Trail, Park)
 @api_view(['GET'])
+@renderer_classes(TOPOLOGY_RENDERERS)
 def trails_geojson(request):
-    """Return all trails as GeoJSON FeatureCollection"""
+    """
+    Return all trails as GeoJSON FeatureCollection (?stream=1 to stream it,
+    ?precision= for fewer decimals, ?format=topojson for shared sections)
+    """
     trails = Trail.objects.all()
-    data = TrailSerializer(trails, many=True).data
+    level = geometry_level(request)
+    precision = coordinate_precision(request)
+    renderer = binary_renderer(request)
+    if renderer:
+        return Response(encode_features(renderer, trails, TRAIL_LAYOUT, level))
+    if wants_topojson(request):
+        return Response(topojson.collection_topology('trails', trails, TRAIL_LAYOUT, level, precision))
+    if wants_stream(request):
+        return stream_feature_collection(trails, TRAIL_LAYOUT, level, precision=precision)
+    if precision is not None:
+        return Response(feature_collection(trails, TRAIL_LAYOUT, level, precision))
+    data = TrailSerializer(
+        trails.with_park().at_level(level), many=True,
+        context={'geometry_level': level},
+    ).data
     if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
         return Response(data)
     return Response({'type': 'FeatureCollection', 'features': data})
 
+@versioned(POI, Park)
+@cached_response(POI, Park)
 @api_view(['GET'])
+@renderer_classes(FEATURE_RENDERERS)
 def pois_geojson(request):
-    """Return all POIs as GeoJSON FeatureCollection"""
+    """
+    Return all POIs as GeoJSON FeatureCollection (?stream=1 to stream it).
+    With ?zoom= (and ?bbox=minx,miny,maxx,maxy) POIs are clustered per grid
+    cell below clustering.INDIVIDUAL_ZOOM
+    """
+    if 'zoom' in request.GET:
+        try:
+            zoom = clustering.parse_zoom(request.GET['zoom'])
+            bbox = clustering.parse_bbox(request.GET.get('bbox'))
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=400)
+        return Response(clustering.pois_in_view(zoom, bbox))
     pois = POI.objects.all()
-    serializer = POISerializer(pois, many=True)
+    precision = coordinate_precision(request)
+    renderer = binary_renderer(request)
+    if renderer:
+        return Response(encode_features(renderer, pois, POI_LAYOUT))
+    if wants_stream(request):
+        return stream_feature_collection(pois, POI_LAYOUT, precision=precision)
+    if precision is not None:
+        return Response(feature_collection(pois, POI_LAYOUT, precision=precision))
+    serializer = POISerializer(pois.with_park(), many=True)
     
     # Return data directly - already in FeatureCollection format
     return Response(serializer.data)
 
+@cached_response(Trail, Park)
 @api_view(['GET'])
 def search_trails(request):
-    query = request.GET.get('q', '')
-    qs = Trail.objects.filter(
-        Q(name__icontains=query) | Q(difficulty__icontains=query)
-    ) if query else Trail.objects.all()
-    data = TrailSerializer(qs, many=True).data
+    """
+    Ranked full-text + trigram search over trail name, park name, difficulty
+    and description. ?limit= caps the results (default 50, max 200).
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({'type': 'FeatureCollection', 'features': []})
+    level = geometry_level(request)
+    qs = search.search_trails(
+        Trail.objects.with_park().at_level(level), query,
+        limit=search.clamp_limit(request.GET.get('limit')),
+    )
+    data = TrailSerializer(qs, many=True, context={'geometry_level': level}).data
     if isinstance(data, dict) and data.get('type') == 'FeatureCollection':
         return Response(data)
     return Response({'type': 'FeatureCollection', 'features': data})
 
+# NEW: Lightweight name suggestions for the search box
+@cached_response(Trail)
+@api_view(['GET'])
+def autocomplete_trails(request):
+    """Return [{id, name}] of trails whose name starts with (or resembles) ?q="""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response([])
+    return Response(search.autocomplete(query))
+
+# NEW: Stored DEM elevation profile (computed by enrich_elevation)
+@cached_response(Trail, TrailProfile)
+@api_view(['GET'])
+def trail_profile(request, pk):
+    """Return a trail's elevation profile, gain/loss and max gradient"""
+    profile = get_object_or_404(TrailProfile, pk=pk)
+    return Response(TrailProfileSerializer(profile).data)
+
 def trails_readonly_view(request):
-    trails = Trail.objects.all().order_by('name')
+    trails = Trail.objects.with_park().order_by('name')
     return render(request, 'mtb_trails/trails_list.html', {'trails': trails})
@@ -10,12 +10,28 @@ let map;
 let allTrailsData = [];
 let allParksData = [];
 let allPOIsData = [];
+let parkStats = {};  // park id -> stats block from /api/parks/stats/
+let poiRequest = 0;  // latest POI cluster request, see fetchPOIs
 let layerGroups = {
     parks: null,
     trails: null,
     pois: null
 };
 
+// Highest zoom served by each simplified geometry level on the API
+// (GEOMETRY_LEVELS in models.py). Above the last one we get full detail.
+const GEOMETRY_LEVEL_MAX_ZOOMS = [8, 11, 14];
+const GEOMETRY_LEVEL_NAMES = ['coarse', 'medium', 'fine'];
+let currentGeometryLevel = null;
+
+// Pre-rendered, content-hashed GeoJSON snapshots (see snapshots.py), keyed
+// by layer then level ('full', 'coarse', ...). After this page writes data
+// they may lag behind, so from then on we go to the API instead.
+const SNAPSHOT_URLS = JSON.parse(
+    document.getElementById('snapshot-urls')?.textContent || '{}'
+);
+let snapshotsStale = false;
+
 // Drawing mode variables
 let drawingMode = false;
 let drawingPoints = [];        // [[lng, lat], ...]
@@ -63,6 +79,13 @@ function initMap() {
         '📍 Points of Interest': layerGroups.pois
     }, { position: 'topright' }).addTo(map);
 
+    // Reload trails/parks at a different resolution when the zoom level
+    // crosses into another simplified geometry level
+    currentGeometryLevel = geometryLevel(map.getZoom());
+    map.on('zoomend', onZoomChangeGeometryLevel);
+    // POIs are clustered for the visible area, so refetch them after every move
+    map.on('moveend', fetchPOIs);
+
     // Mouse coordinates
     map.on('mousemove', function(e) {
         const el = document.getElementById('map-coordinates');
@@ -84,7 +107,8 @@ async function loadAllData() {
         await Promise.all([
             fetchParks(),
             fetchTrails(),
-            fetchPOIs()
+            fetchPOIs(),
+            fetchParkStats()
         ]);
         populateParkFilter();
         console.log('✓ All data loaded');
@@ -95,8 +119,35 @@ async function loadAllData() {
     }
 }
 
+function geometryLevel(zoom) {
+    // Index of the simplified level for this zoom, -1 for full resolution
+    return GEOMETRY_LEVEL_MAX_ZOOMS.findIndex(maxZoom => zoom <= maxZoom);
+}
+
+async function onZoomChangeGeometryLevel() {
+    const level = geometryLevel(map.getZoom());
+    if (level === currentGeometryLevel) return;
+    currentGeometryLevel = level;
+    await Promise.all([fetchParks(), fetchTrails({ display: false })]);
+    // Leave "near me" results on screen, otherwise redraw with current filters
+    if (!(nearMeMarker && map.hasLayer(nearMeMarker))) {
+        filterTrails();
+    }
+}
+
+function layerUrl(layer, apiUrl) {
+    // Snapshot for the current geometry level if there is one, else the API
+    const snapshots = SNAPSHOT_URLS[layer];
+    if (snapshots && !snapshotsStale) {
+        const level = geometryLevel(map.getZoom());
+        const url = snapshots[level === -1 ? 'full' : GEOMETRY_LEVEL_NAMES[level]] || snapshots.full;
+        if (url) return url;
+    }
+    return apiUrl;
+}
+
 async function fetchParks() {
-    const res = await fetch('/api/parks/geojson/');
+    const res = await fetch(layerUrl('parks', `/api/parks/geojson/?zoom=${map.getZoom()}`));
     if (!res.ok) return;
     const data = await res.json();
     allParksData = data.features || [];
@@ -104,19 +155,30 @@ async function fetchParks() {
     console.log(`✓ Parks loaded: ${allParksData.length}`);
 }
 
-async function fetchTrails() {
-    const res = await fetch('/api/trails/geojson/');
+async function fetchParkStats() {
+    const res = await fetch('/api/parks/stats/');
+    if (!res.ok) return;
+    const stats = await res.json();
+    parkStats = Object.fromEntries(stats.map(s => [s.park, s]));
+}
+
+async function fetchTrails(options = {}) {
+    const res = await fetch(layerUrl('trails', `/api/trails/geojson/?zoom=${map.getZoom()}`));
     if (!res.ok) return;
     const data = await res.json();
     allTrailsData = data.features || [];
-    displayTrails(data);
+    if (options.display !== false) displayTrails(data);
     updateDataCounts();
     console.log(`✓ Trails loaded: ${allTrailsData.length}`);
 }
 
 async function fetchPOIs() {
-    const res = await fetch('/api/pois/geojson/');
-    if (!res.ok) return;
+    // Clustered per grid cell for the current view (see clustering.py),
+    // single POIs once zoomed in; a newer request supersedes this one
+    const request = ++poiRequest;
+    const bbox = map.getBounds().toBBoxString();
+    const res = await fetch(`/api/pois/geojson/?zoom=${map.getZoom()}&bbox=${bbox}`);
+    if (!res.ok || request !== poiRequest) return;
     const data = await res.json();
     allPOIsData = data.features || [];
     displayPOIs(data);
@@ -139,11 +201,33 @@ function displayParks(geojson) {
         },
         onEachFeature: (feature, layer) => {
             const props = feature.properties || {};
-            layer.bindPopup(`<h5>🏞️ ${props.name || 'Park'}</h5>`);
+            // Built on open, so it shows the latest stats
+            layer.bindPopup(() => parkPopup(props));
         }
     }).addTo(layerGroups.parks);
 }
 
+function parkPopup(props) {
+    const stats = parkStats[props.id];
+    let html = `<h5>🏞️ ${props.name || 'Park'}</h5>`;
+    if (!stats) return html;
+    const difficulties = Object.entries(stats.difficulty_counts)
+        .filter(([, count]) => count > 0)
+        .map(([difficulty, count]) => `${count} ${difficulty}`)
+        .join(', ');
+    const pois = Object.entries(stats.poi_counts)
+        .map(([type, count]) => `${count} ${type.replace('_', ' ')}`)
+        .join(', ');
+    html += `
+        <p><strong>Trails:</strong> ${stats.trail_count}${difficulties ? ` (${difficulties})` : ''}</p>
+        <p><strong>Total length:</strong> ${stats.total_length_km} km
+           (avg ${stats.mean_length_km ?? 'N/A'} km)</p>
+        <p><strong>Total climbing:</strong> ${stats.total_elevation_gain_m} m</p>
+    `;
+    if (pois) html += `<p><strong>Facilities:</strong> ${pois}</p>`;
+    return html;
+}
+
 function displayTrails(geojson) {
     // Robust handling: wrap array in FeatureCollection if needed
     if (!geojson) return;
@@ -177,18 +261,43 @@ function displayTrails(geojson) {
         onEachFeature: (feature, layer) => {
             const p = feature.properties || {};
             layer.trailId = p.id;
-            layer.bindPopup(`
-                <h5>🚵 ${p.name || 'Trail'}</h5>
-                <p><strong>Difficulty:</strong> ${p.difficulty || 'N/A'}</p>
-                <p><strong>Length:</strong> ${p.length_km ?? 'N/A'} km</p>
-                <p><strong>Elevation:</strong> ${p.elevation_gain_m ?? 'N/A'} m</p>
-            `);
+            layer.bindPopup(trailPopup(p));
+            layer.on('popupopen', () => showTrailAccess(layer, p));
         }
     }).addTo(layerGroups.trails);
 
     renderTrailCards(featuresArray);
 }
 
+function trailPopup(p) {
+    return `
+        <h5>🚵 ${p.name || 'Trail'}</h5>
+        <p><strong>Difficulty:</strong> ${p.difficulty || 'N/A'}</p>
+        <p><strong>Length:</strong> ${p.length_km ?? 'N/A'} km</p>
+        <p><strong>Elevation:</strong> ${p.elevation_gain_m ?? 'N/A'} m</p>
+    `;
+}
+
+const ACCESS_LABELS = { parking: 'car park', trailhead: 'trailhead', toilets: 'toilets' };
+
+function formatDistance(m) {
+    return m < 1000 ? `${m} m` : `${(m / 1000).toFixed(1)} km`;
+}
+
+// Adds "Nearest car park: 300 m" lines from the trail detail's precomputed access points
+async function showTrailAccess(layer, p) {
+    const res = await fetch(`/api/trails/${p.id}/`);
+    if (!res.ok || !layer.isPopupOpen()) return;
+    const access = (await res.json()).properties?.access || {};
+    const lines = Object.entries(ACCESS_LABELS).map(([type, label]) => {
+        const ends = Object.values(access[type] || {}).filter(Boolean);
+        if (!ends.length) return '';
+        const nearest = ends.reduce((a, b) => (b.distance_m < a.distance_m ? b : a));
+        return `<p><strong>Nearest ${label}:</strong> ${formatDistance(nearest.distance_m)}</p>`;
+    }).join('');
+    layer.setPopupContent(trailPopup(p) + lines);
+}
+
 function displayPOIs(geojson) {
     if (!geojson || !geojson.features) return;
     layerGroups.pois.clearLayers();
@@ -201,11 +310,23 @@ function displayPOIs(geojson) {
         default: '📍'
     };
 
+    // A cluster of one POI carries its name and a single entry in types
+    const poiType = p => p.type || Object.keys(p.types || {})[0];
+
     L.geoJSON(geojson, {
         pointToLayer: (feature, latlng) => {
             const p = feature.properties || {};
+            if (p.count > 1) {
+                const size = p.count < 10 ? 30 : p.count < 100 ? 36 : 44;
+                const icon = L.divIcon({
+                    html: `<span>${p.count}</span>`,
+                    className: 'poi-cluster',
+                    iconSize: [size, size]
+                });
+                return L.marker(latlng, { icon });
+            }
             const icon = L.divIcon({
-                html: iconMap[p.type] || iconMap.default,
+                html: iconMap[poiType(p)] || iconMap.default,
                 className: 'poi-icon',
                 iconSize: [24, 24]
             });
@@ -213,9 +334,18 @@ function displayPOIs(geojson) {
         },
         onEachFeature: (feature, layer) => {
             const p = feature.properties || {};
+            if (p.count > 1) {
+                const types = Object.entries(p.types)
+                    .map(([type, count]) => `${count} ${type.replace('_', ' ')}`)
+                    .join(', ');
+                layer.bindTooltip(types);
+                layer.on('click', () => map.setView(layer.getLatLng(), map.getZoom() + 2));
+                return;
+            }
+            const type = poiType(p);
             layer.bindPopup(`
                 <h5>${p.name || 'POI'}</h5>
-                <p><strong>Type:</strong> ${p.type_display || p.type || 'N/A'}</p>
+                <p><strong>Type:</strong> ${p.type_display || (type ? type.replace('_', ' ') : 'N/A')}</p>
             `);
         }
     }).addTo(layerGroups.pois);
@@ -540,7 +670,8 @@ async function handleSaveTrail() {
         document.getElementById('add-trail-form').reset();
         clearDrawing();
 
-        await fetchTrails();
+        snapshotsStale = true;
+        await Promise.all([fetchTrails(), fetchParkStats()]);
         alert(`Trail "${name}" created successfully!`);
     } catch (err) {
         console.error('❌ Error creating trail:', err);
@@ -582,6 +713,7 @@ function setupFilterAndSearchListeners() {
         searchInput.addEventListener('input', () => {
             clearSearchBtn.style.display = searchInput.value ? 'block' : 'none';
             filterTrails();
+            suggestTrailNames(searchInput.value.trim());
         });
         clearSearchBtn.addEventListener('click', () => {
             searchInput.value = '';
@@ -626,6 +758,41 @@ function setupFilterAndSearchListeners() {
     }
 }
 
+// Name suggestions from /api/trails/autocomplete/ (debounced; a newer
+// keystroke cancels the request still in flight)
+let suggestTimer = null;
+let suggestController = null;
+
+function suggestTrailNames(query) {
+    clearTimeout(suggestTimer);
+    const list = document.getElementById('trail-suggestions');
+    if (!list) return;
+    if (query.length < 2) {
+        list.innerHTML = '';
+        return;
+    }
+    suggestTimer = setTimeout(async () => {
+        if (suggestController) suggestController.abort();
+        suggestController = new AbortController();
+        try {
+            const res = await fetch(
+                `/api/trails/autocomplete/?q=${encodeURIComponent(query)}`,
+                { signal: suggestController.signal }
+            );
+            if (!res.ok) return;
+            const suggestions = await res.json();
+            list.innerHTML = '';
+            suggestions.forEach(s => {
+                const option = document.createElement('option');
+                option.value = s.name;
+                list.appendChild(option);
+            });
+        } catch (err) {
+            if (err.name !== 'AbortError') console.error('❌ Autocomplete failed:', err);
+        }
+    }, 150);
+}
+
 function filterTrails() {
     let filtered = allTrailsData.slice();
     const searchTerm = (document.getElementById('trail-search')?.value || '').toLowerCase();
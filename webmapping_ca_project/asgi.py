@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webmapping_ca_project.settings')
+# Read by settings.py (no persistent database connections under ASGI)
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
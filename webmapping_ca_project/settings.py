@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     # GeoDjango
     'django.contrib.gis',
+    'django.contrib.postgres',
     # Third party apps
     'rest_framework',
     'rest_framework_gis',
@@ -57,7 +58,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'mtb_trails.middleware.SnapshotWhiteNoiseMiddleware',  # WhiteNoise + GeoJSON snapshots
+    'mtb_trails.middleware.ServerTimingMiddleware',  # Server-Timing header + timing log
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +88,12 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'webmapping_ca_project.wsgi.application'
+ASGI_APPLICATION = 'webmapping_ca_project.asgi.application'
+
+# Set by asgi.py. Under ASGI each request's queries run on a fresh thread,
+# so persistent connections would pile up unused; put a pooler such as
+# pgbouncer in front of PostGIS instead.
+RUNNING_UNDER_ASGI = os.getenv('DJANGO_ASGI') == '1'
 
 
 # Database
@@ -99,7 +107,7 @@ if os.getenv("DATABASE_URL"):
     # Cloud / Render: parse DATABASE_URL
     db_from_env = dj_database_url.config(
         default=os.getenv("DATABASE_URL"),
-        conn_max_age=600,
+        conn_max_age=0 if RUNNING_UNDER_ASGI else 600,
         ssl_require=False,  # Render internal DB usually doesn’t require SSL; can set True if needed
     )
     DATABASES = {
@@ -162,6 +170,64 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = '/media/' 
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Pre-rendered GeoJSON snapshots (see mtb_trails/snapshots.py), served by
+# WhiteNoise. Rebuilt by `manage.py build_snapshots`; model writes mark their
+# layers pending for `build_snapshots --watch` unless SNAPSHOTS_AUTO_REBUILD is off.
+SNAPSHOT_ROOT = os.getenv("SNAPSHOT_ROOT", BASE_DIR / 'snapshots')
+SNAPSHOT_URL = '/snapshots/'
+WHITENOISE_MIMETYPES = {'.geojson': 'application/geo+json'}
+SNAPSHOTS_AUTO_REBUILD = os.getenv("SNAPSHOTS_AUTO_REBUILD", "True").strip().lower() in ("1", "true", "yes", "on")
+
+# Decoded DEM bands reused by `manage.py enrich_elevation` runs (see
+# mtb_trails/elevation.py); one .npy per DEM file, replaced when it changes
+DEM_CACHE_DIR = os.getenv("DEM_CACHE_DIR", BASE_DIR / 'dem_cache')
+
+
+# Cache (rendered API responses, see mtb_trails/cache.py)
+# Local memory by default; set CACHE_DIR to use a file-based cache shared by
+# all gunicorn workers, so a write in one worker invalidates them all.
+if os.getenv("CACHE_DIR"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv("CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'mtb-trails',
+        }
+    }
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 3600))
+
+
+# Per-request timings (mtb_trails/timing.py): the share of API requests that
+# get a Server-Timing header and an INFO log line, and the duration (ms)
+# above which a request is always logged, as a warning. The INFO lines are
+# only printed with SERVER_TIMING_LOG_LEVEL=INFO.
+SERVER_TIMING_SAMPLE_RATE = float(os.getenv("SERVER_TIMING_SAMPLE_RATE", 1.0))
+SERVER_TIMING_SLOW_MS = float(os.getenv("SERVER_TIMING_SLOW_MS")) if os.getenv("SERVER_TIMING_SLOW_MS") else None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'mtb_trails': {
+            'handlers': ['console'],
+            'level': os.getenv("MTB_TRAILS_LOG_LEVEL", "INFO"),
+        },
+        'mtb_trails.timing': {
+            'level': os.getenv("SERVER_TIMING_LOG_LEVEL", "WARNING"),
+        },
+    },
+}
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -179,6 +245,10 @@ REST_FRAMEWORK = {
     ], 
 }
 
+# Keyset pagination of /api/trails/ and /api/pois/ (mtb_trails/pagination.py)
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", 100))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 1000))
+
 # CORS settings for development 
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
\ No newline at end of file